@@ -0,0 +1,546 @@
+"""
+Async versions of the OTP endpoints, served under ASGI.
+
+They take the same requests and give the same responses as the DRF views
+in OTP/views.py, but wait on the cache, the database and the SMS provider
+without holding a worker thread, so one worker can keep many requests
+(including the progressive delay after a failed verification) in flight.
+OTP/urls.py routes to them when settings.ASYNC_VIEWS is set.
+
+DRF's APIView is sync only, so AsyncAPIView parses the body and renders
+JSON itself, with DRF's JSONRenderer so the bodies match; the serializers
+and the pure helpers of the DRF views are reused as they are.
+"""
+
+import json
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from .models import OTP, OTPAttempt
+from .rate_limiter import OTPRateLimiter, RateLimitExceeded
+from .sms_service import SMSProvider
+from .utils.ip_utils import get_client_ip
+from .views import (
+    OTPGenerationSerializer,
+    OTPGenerationView,
+    OTPResendSerializer,
+    OTPResendView,
+    OTPVerificationSerializer,
+    OTPVerificationView,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Base of the async JSON endpoints.
+
+    Like APIView, exempt from CSRF and accepting JSON or form bodies.
+    """
+
+    http_method_names = ['post', 'options']
+
+    @staticmethod
+    def request_data(request):
+        """
+        Body of a request.
+
+        Returns:
+            The parsed JSON or form data, or None if the JSON is malformed
+            (the serializer then reports that no data was provided)
+        """
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+        return request.POST
+
+    @staticmethod
+    def respond(data, status_code):
+        return HttpResponse(
+            JSONRenderer().render(data), status=status_code, content_type=JSONRenderer.media_type
+        )
+
+
+async def _generate_otp(mobile_number):
+    """Async version of OTPGenerationView._generate_otp()"""
+    otp_settings = getattr(settings, 'OTP_SETTINGS', {})
+    expiry_minutes = otp_settings.get('EXPIRY_MINUTES', 5)
+
+    # Delete any existing OTP, which also invalidates it
+    await OTP.objects.filter(mobile_number=mobile_number).adelete()
+
+    otp = await OTP.objects.acreate(
+        mobile_number=mobile_number,
+        expires_at=timezone.now() + timedelta(minutes=expiry_minutes)
+    )
+
+    logger.info(f"Generated OTP {otp.id} for {mobile_number}")
+    return otp
+
+
+async def _get_otp(mobile_number):
+    """OTP for mobile_number, or None"""
+    try:
+        return await OTP.objects.aget(mobile_number=mobile_number)
+    except OTP.DoesNotExist:
+        return None
+
+
+class AsyncOTPGenerationView(AsyncAPIView):
+    """
+    Async OTPGenerationView.
+
+    POST /otp/api/generate/
+    Body: {"mobile_number": "9876543210"}
+    """
+
+    serializer_class = OTPGenerationSerializer
+
+    _format_retry_after = OTPGenerationView._format_retry_after
+    _send_otp_sms = OTPGenerationView._send_otp_sms
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter = OTPRateLimiter()
+        self.sms_provider = SMSProvider()
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Generate and send OTP to the provided mobile number.
+        """
+        ip_address = get_client_ip(request)
+
+        serializer = self.serializer_class(data=self.request_data(request))
+        if not serializer.is_valid():
+            return self.respond({
+                'success': False,
+                'error': 'validation_error',
+                'message': 'Invalid mobile number',
+                'errors': serializer.errors
+            }, status.HTTP_400_BAD_REQUEST)
+
+        mobile_number = serializer.validated_data['mobile_number']
+
+        try:
+            await self.rate_limiter.acheck_generation_limit(mobile_number, ip_address)
+
+            otp = await _generate_otp(mobile_number)
+
+            # The provider's client is sync; send from a thread of its own
+            sms_sent, error_message = await sync_to_async(self._send_otp_sms, thread_sensitive=False)(
+                mobile_number, otp.code
+            )
+
+            await self.rate_limiter.arecord_generation_attempt(
+                identifier=mobile_number,
+                ip_address=ip_address,
+                success=sms_sent
+            )
+            await self.rate_limiter.arecord_ip_activity(ip_address)
+
+            if not sms_sent:
+                await otp.adelete()
+                logger.error(f"Failed to send OTP to {mobile_number}: {error_message}")
+
+                return self.respond({
+                    'success': False,
+                    'error': 'sms_send_failed',
+                    'message': 'Failed to send OTP. Please try again.',
+                    'details': error_message if settings.DEBUG else None
+                }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            logger.info(f"OTP generated and sent successfully to {mobile_number}")
+
+            return self.respond({
+                'success': True,
+                'message': 'OTP sent successfully',
+                'data': {
+                    'mobile_number': mobile_number,
+                    'expires_in_seconds': int((otp.expires_at - timezone.now()).total_seconds()),
+                    'otp_id': str(otp.id) if settings.DEBUG else None,
+                    'code': otp.code if settings.DEBUG else None
+                }
+            }, status.HTTP_200_OK)
+
+        except RateLimitExceeded as e:
+            logger.warning(f"Rate limit exceeded for {mobile_number} from IP {ip_address}")
+
+            await self.rate_limiter.arecord_generation_attempt(
+                identifier=mobile_number,
+                ip_address=ip_address,
+                success=False
+            )
+
+            return self.respond({
+                'success': False,
+                'error': 'rate_limit_exceeded',
+                'message': e.message,
+                'retry_after': e.retry_after,
+                'retry_after_formatted': self._format_retry_after(e.retry_after),
+                'limit': e.limit,
+                'window': e.window
+            }, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        except Exception as e:
+            logger.error(f"Unexpected error during OTP generation for {mobile_number}: {str(e)}", exc_info=True)
+
+            await self.rate_limiter.arecord_generation_attempt(
+                identifier=mobile_number,
+                ip_address=ip_address,
+                success=False
+            )
+
+            return self.respond({
+                'success': False,
+                'error': 'internal_error',
+                'message': 'An error occurred while generating OTP. Please try again.',
+                'details': str(e) if settings.DEBUG else None
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncOTPVerificationView(AsyncAPIView):
+    """
+    Async OTPVerificationView.
+
+    POST /otp/api/verify/
+    Body: {
+        "mobile_number": "9876543210",
+        "otp_code": "123456"
+    }
+    """
+
+    serializer_class = OTPVerificationSerializer
+
+    _validate_otp = OTPVerificationView._validate_otp
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter = OTPRateLimiter()
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Verify OTP code for the provided mobile number.
+        """
+        ip_address = get_client_ip(request)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+
+        serializer = self.serializer_class(data=self.request_data(request))
+        if not serializer.is_valid():
+            return self.respond({
+                'success': False,
+                'error': 'validation_error',
+                'message': 'Invalid request data',
+                'errors': serializer.errors
+            }, status.HTTP_400_BAD_REQUEST)
+
+        mobile_number = serializer.validated_data['mobile_number']
+        otp_code = serializer.validated_data['otp_code']
+
+        try:
+            otp = await _get_otp(mobile_number)
+            if not otp:
+                logger.warning(f"No OTP found for mobile: {mobile_number}")
+
+                await OTPAttempt.arecord_attempt(
+                    identifier=mobile_number,
+                    attempt_type=OTPAttempt.VERIFICATION,
+                    ip_address=ip_address,
+                    success=False,
+                    error_message="OTP not found",
+                    user_agent=user_agent
+                )
+
+                return self.respond({
+                    'success': False,
+                    'error': 'invalid_otp',
+                    'message': 'Invalid OTP code or OTP has expired'
+                }, status.HTTP_400_BAD_REQUEST)
+
+            try:
+                await self.rate_limiter.acheck_verification_limit(otp, ip_address)
+            except RateLimitExceeded as e:
+                logger.warning(f"Rate limit exceeded for OTP verification: {otp.id}")
+
+                await self.rate_limiter.arecord_verification_attempt(
+                    otp=otp,
+                    ip_address=ip_address,
+                    success=False,
+                    error_message="Rate limit exceeded"
+                )
+
+                return self.respond({
+                    'success': False,
+                    'error': 'rate_limit_exceeded',
+                    'message': e.message,
+                    'retry_after': e.retry_after,
+                    'limit': e.limit,
+                    'window': e.window
+                }, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            validation_result = self._validate_otp(otp, otp_code)
+
+            if not validation_result['valid']:
+                await self.rate_limiter.arecord_verification_attempt(
+                    otp=otp,
+                    ip_address=ip_address,
+                    success=False,
+                    error_message=validation_result['reason']
+                )
+                await self.rate_limiter.arecord_ip_activity(ip_address)
+
+                remaining_attempts = await self.rate_limiter.aget_remaining_attempts(otp)
+
+                logger.warning(
+                    f"Failed OTP verification for {mobile_number}. "
+                    f"Reason: {validation_result['reason']}. "
+                    f"Remaining attempts: {remaining_attempts}"
+                )
+
+                return self.respond({
+                    'success': False,
+                    'error': 'invalid_otp',
+                    'message': validation_result['message'],
+                    'remaining_attempts': remaining_attempts
+                }, status.HTTP_400_BAD_REQUEST)
+
+            # Mark this OTP, and any other for the number, as used
+            otp.is_used = True
+            await otp.asave(update_fields=['is_used'])
+            await OTP.objects.filter(mobile_number=mobile_number, is_used=False).aupdate(is_used=True)
+
+            await self.rate_limiter.arecord_verification_attempt(
+                otp=otp,
+                ip_address=ip_address,
+                success=True,
+                error_message=None
+            )
+            await self.rate_limiter.arecord_ip_activity(ip_address)
+            await self.rate_limiter.aclear_verification_attempts(otp)
+
+            logger.info(f"OTP verified successfully for mobile: {mobile_number}")
+
+            return self.respond({
+                'success': True,
+                'message': 'OTP verified successfully',
+                'data': {
+                    'mobile_number': mobile_number,
+                    'verified_at': timezone.now().isoformat()
+                }
+            }, status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(
+                f"Unexpected error during OTP verification for {mobile_number}: {str(e)}",
+                exc_info=True
+            )
+
+            try:
+                await OTPAttempt.arecord_attempt(
+                    identifier=mobile_number,
+                    attempt_type=OTPAttempt.VERIFICATION,
+                    ip_address=ip_address,
+                    success=False,
+                    error_message=str(e),
+                    user_agent=user_agent
+                )
+            except Exception:
+                pass
+
+            return self.respond({
+                'success': False,
+                'error': 'internal_error',
+                'message': 'An error occurred while verifying OTP. Please try again.',
+                'details': str(e) if settings.DEBUG else None
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncOTPResendView(AsyncAPIView):
+    """
+    Async OTPResendView.
+
+    POST /otp/api/resend/
+    Body: {"mobile_number": "9876543210"}
+    """
+
+    serializer_class = OTPResendSerializer
+
+    _check_otp_status = OTPResendView._check_otp_status
+    _format_retry_after = OTPResendView._format_retry_after
+    _send_otp_sms = OTPResendView._send_otp_sms
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter = OTPRateLimiter()
+        self.sms_provider = SMSProvider()
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Resend OTP to the provided mobile number.
+        """
+        ip_address = get_client_ip(request)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+
+        serializer = self.serializer_class(data=self.request_data(request))
+        if not serializer.is_valid():
+            return self.respond({
+                'success': False,
+                'error': 'validation_error',
+                'message': 'Invalid mobile number',
+                'errors': serializer.errors
+            }, status.HTTP_400_BAD_REQUEST)
+
+        mobile_number = serializer.validated_data['mobile_number']
+
+        try:
+            existing_otp = await _get_otp(mobile_number)
+            if not existing_otp:
+                logger.warning(f"No OTP found for resend request: {mobile_number}")
+
+                await OTPAttempt.arecord_attempt(
+                    identifier=mobile_number,
+                    attempt_type=OTPAttempt.RESEND,
+                    ip_address=ip_address,
+                    success=False,
+                    error_message="No OTP found",
+                    user_agent=user_agent
+                )
+
+                return self.respond({
+                    'success': False,
+                    'error': 'no_active_otp',
+                    'message': 'No active OTP request found. Please generate a new OTP.'
+                }, status.HTTP_400_BAD_REQUEST)
+
+            # Rate limits, including account locks, are answered below
+            await self.rate_limiter.acheck_resend_limit(mobile_number, ip_address)
+
+            if self._check_otp_status(existing_otp)['should_generate_new']:
+                logger.info(f"Invalidating old OTP and generating new for {mobile_number}")
+                # _generate_otp deletes the old OTP, which invalidates it
+                otp_to_send = await _generate_otp(mobile_number)
+                action_taken = 'generated_new'
+            else:
+                logger.info(f"Resending existing OTP for {mobile_number}")
+                otp_to_send = existing_otp
+                action_taken = 'resent_existing'
+
+            sms_sent, error_message = await sync_to_async(self._send_otp_sms, thread_sensitive=False)(
+                mobile_number, otp_to_send.code
+            )
+
+            await self.rate_limiter.arecord_resend_attempt(
+                identifier=mobile_number,
+                ip_address=ip_address,
+                success=sms_sent
+            )
+            await self.rate_limiter.arecord_ip_activity(ip_address)
+
+            if not sms_sent:
+                logger.error(f"Failed to resend OTP to {mobile_number}: {error_message}")
+
+                if action_taken == 'generated_new':
+                    await otp_to_send.adelete()
+
+                return self.respond({
+                    'success': False,
+                    'error': 'sms_send_failed',
+                    'message': 'Failed to send OTP. Please try again.',
+                    'details': error_message if settings.DEBUG else None
+                }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            resend_info = await self._get_resend_info(mobile_number)
+
+            logger.info(f"OTP resent successfully to {mobile_number} (action: {action_taken})")
+
+            return self.respond({
+                'success': True,
+                'message': 'OTP resent successfully',
+                'data': {
+                    'mobile_number': mobile_number,
+                    'expires_in_seconds': int((otp_to_send.expires_at - timezone.now()).total_seconds()),
+                    'action_taken': action_taken,
+                    'resends_remaining': resend_info['remaining'],
+                    'resends_used': resend_info['used'],
+                    'next_resend_available_in': resend_info['cooldown_remaining'],
+                    'otp_id': str(otp_to_send.id) if settings.DEBUG else None,
+                    'code': otp_to_send.code if settings.DEBUG else None
+                }
+            }, status.HTTP_200_OK)
+
+        except RateLimitExceeded as e:
+            logger.warning(f"Rate limit/lock triggered for {mobile_number} from IP {ip_address}")
+
+            await self.rate_limiter.arecord_resend_attempt(
+                identifier=mobile_number,
+                ip_address=ip_address,
+                success=False
+            )
+
+            return self.respond({
+                'success': False,
+                'error': 'rate_limit_exceeded',
+                'message': e.message,
+                'retry_after': e.retry_after,
+                'retry_after_formatted': self._format_retry_after(e.retry_after),
+                'limit': e.limit,
+                'window': e.window
+            }, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        except Exception as e:
+            logger.error(
+                f"Unexpected error during OTP resend for {mobile_number}: {str(e)}",
+                exc_info=True
+            )
+
+            try:
+                await self.rate_limiter.arecord_resend_attempt(
+                    identifier=mobile_number,
+                    ip_address=ip_address,
+                    success=False
+                )
+            except Exception:
+                pass
+
+            return self.respond({
+                'success': False,
+                'error': 'internal_error',
+                'message': 'An error occurred while resending OTP. Please try again.',
+                'details': str(e) if settings.DEBUG else None
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def _get_resend_info(self, mobile_number):
+        """Async version of OTPResendView._get_resend_info()"""
+        otp_settings = getattr(settings, 'OTP_SETTINGS', {})
+        resend_limit = otp_settings.get('RESEND_LIMIT', 3)
+        resend_cooldown = otp_settings.get('RESEND_COOLDOWN_SECONDS', 30)
+
+        used = await cache.aget(OTPRateLimiter.resend_key(mobile_number), 0)
+        last_resend_time = await cache.aget(OTPRateLimiter.last_resend_key(mobile_number))
+
+        if last_resend_time:
+            cooldown_remaining = max(0, int(resend_cooldown - (time.time() - last_resend_time)))
+        else:
+            cooldown_remaining = 0
+
+        return {
+            'used': used,
+            'remaining': max(0, resend_limit - used),
+            'limit': resend_limit,
+            'cooldown_remaining': cooldown_remaining
+        }
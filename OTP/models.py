@@ -61,7 +61,7 @@ class OTP(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"OTP for {self.application} - {self.code}"
+        return f"OTP for {self.mobile_number} - {self.code}"
 
     def save(self, *args, **kwargs):
         
@@ -253,6 +253,21 @@ class OTPAttempt(models.Model):
             metadata=metadata
         )
 
+    @classmethod
+    async def arecord_attempt(cls, identifier, attempt_type, ip_address, success=False,
+                              otp=None, error_message=None, user_agent=None, **metadata):
+        """Async version of record_attempt()"""
+        return await cls.objects.acreate(
+            identifier=identifier,
+            attempt_type=attempt_type,
+            ip_address=ip_address,
+            success=success,
+            otp=otp,
+            error_message=error_message,
+            user_agent=user_agent,
+            metadata=metadata
+        )
+
     @classmethod
     def get_recent_attempts(cls, identifier, attempt_type, minutes):
         """
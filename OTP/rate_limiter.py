@@ -1,7 +1,9 @@
+from asgiref.sync import sync_to_async
 from django.core.cache import cache
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
+import asyncio
 import time
 
 
@@ -20,6 +22,10 @@ class OTPRateLimiter:
     """
     Service class for enforcing OTP rate limits using Redis cache and database.
     Implements all security measures defined in OTP_SETTINGS.
+
+    Counters are bumped with the cache's atomic add() and incr(), and the
+    check_* methods count the attempt they allow, so concurrent requests
+    cannot all read the same count and slip past a limit together.
     """
     
     def __init__(self):
@@ -41,6 +47,56 @@ class OTPRateLimiter:
         self.account_lock_duration = self.settings.get('ACCOUNT_LOCK_DURATION_MINUTES', 60)
         self.enable_progressive_delays = self.settings.get('ENABLE_PROGRESSIVE_DELAYS', True)
 
+    # ==================== CACHE KEYS ====================
+
+    @staticmethod
+    def generation_key(identifier):
+        return f"otp:gen:{identifier}"
+
+    @staticmethod
+    def generation_timestamp_key(identifier, index):
+        return f"otp:gen:ts:{identifier}:{index}"
+
+    @staticmethod
+    def verification_key(otp):
+        return f"otp:verify:{otp.id}"
+
+    @staticmethod
+    def resend_key(identifier):
+        return f"otp:resend:{identifier}"
+
+    @staticmethod
+    def resend_timestamp_key(identifier, index):
+        return f"otp:resend:ts:{identifier}:{index}"
+
+    @staticmethod
+    def last_resend_key(identifier):
+        return f"otp:resend:last:{identifier}"
+
+    @staticmethod
+    def ip_key(ip_address):
+        return f"otp:ip:{ip_address}"
+
+    @staticmethod
+    def lock_key(identifier):
+        return f"otp:lock:{identifier}"
+
+    @staticmethod
+    def _increment(key, timeout):
+        """
+        Atomically add one to a counter, starting it at 0 with the timeout.
+        
+        Returns:
+            The new count
+        """
+        cache.add(key, 0, timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.add(key, 1, timeout)
+            return 1
+
     # ==================== GENERATION RATE LIMITING ====================
     
     def check_generation_limit(self, identifier, ip_address):
@@ -61,49 +117,32 @@ class OTPRateLimiter:
         # Check IP global limit
         self._check_ip_global_limit(ip_address)
         
-        # Check generation limit
-        cache_key = f"otp:gen:{identifier}"
-        count = cache.get(cache_key, 0)
+        # Count this attempt, then check the generation limit
+        timeout = self.generation_window * 60
+        count = self._increment(self.generation_key(identifier), timeout)
+        cache.set(self.generation_timestamp_key(identifier, count - 1), time.time(), timeout)
         
-        if count >= self.generation_limit:
+        if count > self.generation_limit:
             # Check if we're still within the time window
-            oldest_attempt_key = f"otp:gen:ts:{identifier}:0"
-            oldest_timestamp = cache.get(oldest_attempt_key)
-            
-            if oldest_timestamp:
-                time_passed = time.time() - oldest_timestamp
-                retry_after = (self.generation_window * 60) - time_passed
-                
-                if retry_after > 0:
-                    raise RateLimitExceeded(
-                        message=f"Too many OTP generation attempts. Please try again later.",
-                        retry_after=int(retry_after),
-                        limit=self.generation_limit,
-                        window=f"{self.generation_window} minutes"
-                    )
+            self._raise_if_in_window(
+                cache.get(self.generation_timestamp_key(identifier, 0)),
+                "Too many OTP generation attempts. Please try again later.",
+                self.generation_limit,
+                self.generation_window
+            )
         
         return True
 
     def record_generation_attempt(self, identifier, ip_address, success=False):
         """
-        Record an OTP generation attempt.
+        Record the outcome of an OTP generation attempt (counted by
+        check_generation_limit()).
         
         Args:
             identifier: Email or phone number
             ip_address: IP address of requester
             success: Whether generation was successful
         """
-        cache_key = f"otp:gen:{identifier}"
-        timestamp_key = f"otp:gen:ts:{identifier}:{cache.get(cache_key, 0)}"
-        timeout = self.generation_window * 60
-        
-        # Increment counter
-        count = cache.get(cache_key, 0)
-        cache.set(cache_key, count + 1, timeout)
-        
-        # Store timestamp
-        cache.set(timestamp_key, time.time(), timeout)
-        
         # Record in database for audit
         from .models import OTPAttempt
         OTPAttempt.record_attempt(
@@ -117,7 +156,7 @@ class OTPRateLimiter:
     
     def check_verification_limit(self, otp, ip_address):
         """
-        Check if OTP verification is allowed.
+        Check if OTP verification is allowed, counting the attempt.
         Enforces: Max 5 attempts per OTP.
         
         Args:
@@ -130,23 +169,33 @@ class OTPRateLimiter:
         # Check IP global limit
         self._check_ip_global_limit(ip_address)
         
-        # Check verification attempts for this OTP
-        cache_key = f"otp:verify:{otp.id}"
-        count = cache.get(cache_key, 0)
+        # Count this attempt (no expiry - tied to OTP lifecycle)
+        self._raise_if_verifications_exhausted(self._increment(self.verification_key(otp), None))
         
-        if count >= self.verification_limit:
+        return True
+
+    def _raise_if_verifications_exhausted(self, count):
+        """
+        Raise for an attempt beyond the OTP's verification attempts.
+        
+        Args:
+            count: Verification attempts made on the OTP, this one included
+            
+        Raises:
+            RateLimitExceeded: If no attempts are left
+        """
+        if count > self.verification_limit:
             raise RateLimitExceeded(
                 message="Too many verification attempts. This OTP has been locked.",
                 retry_after=None,  # Permanent lock for this OTP
                 limit=self.verification_limit,
                 window="per OTP"
             )
-        
-        return True
 
     def record_verification_attempt(self, otp, ip_address, success=False, error_message=None):
         """
-        Record an OTP verification attempt.
+        Record the outcome of an OTP verification attempt (counted by
+        check_verification_limit()).
         
         Args:
             otp: OTP instance
@@ -154,11 +203,7 @@ class OTPRateLimiter:
             success: Whether verification succeeded
             error_message: Error message if failed
         """
-        cache_key = f"otp:verify:{otp.id}"
-        
-        # Increment counter (no expiry - tied to OTP lifecycle)
-        count = cache.get(cache_key, 0) + 1
-        cache.set(cache_key, count, timeout=None)
+        count = cache.get(self.verification_key(otp), 0)
         
         # Apply progressive delays if enabled
         if not success and self.enable_progressive_delays:
@@ -169,7 +214,7 @@ class OTPRateLimiter:
         # Record in database
         from .models import OTPAttempt
         OTPAttempt.record_attempt(
-            identifier=otp.application.email if hasattr(otp.application, 'email') else str(otp.application),
+            identifier=otp.mobile_number,
             attempt_type=OTPAttempt.VERIFICATION,
             ip_address=ip_address,
             success=success,
@@ -179,9 +224,7 @@ class OTPRateLimiter:
         
         # Lock account if limit reached
         if count >= self.verification_limit and not success:
-            self._lock_account(
-                otp.application.email if hasattr(otp.application, 'email') else str(otp.application)
-            )
+            self._lock_account(otp.mobile_number)
 
     def _get_progressive_delay(self, attempt_count):
         """
@@ -220,10 +263,38 @@ class OTPRateLimiter:
         # Check IP global limit
         self._check_ip_global_limit(ip_address)
         
-        # Check cooldown period
-        last_resend_key = f"otp:resend:last:{identifier}"
-        last_resend_time = cache.get(last_resend_key)
+        # Start the cooldown, unless one is running
+        last_resend_key = self.last_resend_key(identifier)
+        current_time = time.time()
+        if not cache.add(last_resend_key, current_time, self.resend_cooldown):
+            self._raise_if_cooling_down(cache.get(last_resend_key))
         
+        # Count this attempt, then check the resend limit
+        timeout = self.resend_window * 60
+        count = self._increment(self.resend_key(identifier), timeout)
+        cache.set(self.resend_timestamp_key(identifier, count - 1), current_time, timeout)
+        
+        if count > self.resend_limit:
+            # Check if we're still within the time window
+            self._raise_if_in_window(
+                cache.get(self.resend_timestamp_key(identifier, 0)),
+                "Too many resend attempts. Please try again later.",
+                self.resend_limit,
+                self.resend_window
+            )
+        
+        return True
+
+    def _raise_if_cooling_down(self, last_resend_time):
+        """
+        Raise while the cooldown after the last resend runs.
+        
+        Args:
+            last_resend_time: time.time() of the last resend, or None
+            
+        Raises:
+            RateLimitExceeded: If the cooldown has not passed
+        """
         if last_resend_time:
             time_since_last = time.time() - last_resend_time
             if time_since_last < self.resend_cooldown:
@@ -233,53 +304,42 @@ class OTPRateLimiter:
                     limit=1,
                     window=f"{self.resend_cooldown} seconds"
                 )
+
+    def _raise_if_in_window(self, oldest_timestamp, message, limit, window_minutes):
+        """
+        Raise for a count at its limit while its oldest attempt is in the window.
         
-        # Check resend limit
-        cache_key = f"otp:resend:{identifier}"
-        count = cache.get(cache_key, 0)
-        
-        if count >= self.resend_limit:
-            # Check if we're still within the time window
-            oldest_attempt_key = f"otp:resend:ts:{identifier}:0"
-            oldest_timestamp = cache.get(oldest_attempt_key)
+        Args:
+            oldest_timestamp: time.time() of the first counted attempt, or None
+            message: Message of the exception
+            limit: The limit reached
+            window_minutes: Length of the window
             
-            if oldest_timestamp:
-                time_passed = time.time() - oldest_timestamp
-                retry_after = (self.resend_window * 60) - time_passed
-                
-                if retry_after > 0:
-                    raise RateLimitExceeded(
-                        message=f"Too many resend attempts. Please try again later.",
-                        retry_after=int(retry_after),
-                        limit=self.resend_limit,
-                        window=f"{self.resend_window} minutes"
-                    )
-        
-        return True
+        Raises:
+            RateLimitExceeded: If the window has not passed
+        """
+        if oldest_timestamp:
+            time_passed = time.time() - oldest_timestamp
+            retry_after = (window_minutes * 60) - time_passed
+            
+            if retry_after > 0:
+                raise RateLimitExceeded(
+                    message=message,
+                    retry_after=int(retry_after),
+                    limit=limit,
+                    window=f"{window_minutes} minutes"
+                )
 
     def record_resend_attempt(self, identifier, ip_address, success=False):
         """
-        Record an OTP resend attempt.
+        Record the outcome of an OTP resend attempt (counted by
+        check_resend_limit()).
         
         Args:
             identifier: Email or phone number
             ip_address: IP address of requester
             success: Whether resend was successful
         """
-        cache_key = f"otp:resend:{identifier}"
-        timestamp_key = f"otp:resend:ts:{identifier}:{cache.get(cache_key, 0)}"
-        last_resend_key = f"otp:resend:last:{identifier}"
-        timeout = self.resend_window * 60
-        
-        # Increment counter
-        count = cache.get(cache_key, 0)
-        cache.set(cache_key, count + 1, timeout)
-        
-        # Store timestamp
-        current_time = time.time()
-        cache.set(timestamp_key, current_time, timeout)
-        cache.set(last_resend_key, current_time, self.resend_cooldown)
-        
         # Record in database
         from .models import OTPAttempt
         OTPAttempt.record_attempt(
@@ -302,9 +362,18 @@ class OTPRateLimiter:
         Raises:
             RateLimitExceeded: If limit is exceeded
         """
-        cache_key = f"otp:ip:{ip_address}"
-        count = cache.get(cache_key, 0)
+        self._raise_if_ip_over_limit(cache.get(self.ip_key(ip_address), 0))
+
+    def _raise_if_ip_over_limit(self, count):
+        """
+        Raise once an IP has used up its operations.
         
+        Args:
+            count: Operations recorded for the IP in the window
+            
+        Raises:
+            RateLimitExceeded: If the limit is reached
+        """
         if count >= self.ip_global_limit:
             raise RateLimitExceeded(
                 message="Too many requests from your IP address. Please try again later.",
@@ -320,11 +389,7 @@ class OTPRateLimiter:
         Args:
             ip_address: IP address to record
         """
-        cache_key = f"otp:ip:{ip_address}"
-        timeout = self.ip_global_window * 60
-        
-        count = cache.get(cache_key, 0)
-        cache.set(cache_key, count + 1, timeout)
+        self._increment(self.ip_key(ip_address), self.ip_global_window * 60)
 
     # ==================== ACCOUNT LOCKING ====================
     
@@ -338,17 +403,31 @@ class OTPRateLimiter:
         Raises:
             RateLimitExceeded: If account is locked
         """
-        lock_key = f"otp:lock:{identifier}"
-        is_locked = cache.get(lock_key)
+        lock_key = self.lock_key(identifier)
+        if cache.get(lock_key):
+            self._raise_locked(self._lock_ttl(lock_key))
+
+    def _lock_ttl(self, lock_key):
+        # Only some backends (django-redis) report the time left
+        ttl = getattr(cache, 'ttl', None)
+        return ttl(lock_key) if ttl else None
+
+    def _raise_locked(self, ttl):
+        """
+        Raise for a locked account.
         
-        if is_locked:
-            ttl = cache.ttl(lock_key)
-            raise RateLimitExceeded(
-                message="Your account has been temporarily locked due to suspicious activity.",
-                retry_after=ttl if ttl else self.account_lock_duration * 60,
-                limit=None,
-                window=f"{self.account_lock_duration} minutes"
-            )
+        Args:
+            ttl: Seconds the lock has left, if the cache knows
+            
+        Raises:
+            RateLimitExceeded: Always
+        """
+        raise RateLimitExceeded(
+            message="Your account has been temporarily locked due to suspicious activity.",
+            retry_after=ttl if ttl else self.account_lock_duration * 60,
+            limit=None,
+            window=f"{self.account_lock_duration} minutes"
+        )
 
     def _lock_account(self, identifier):
         """
@@ -357,9 +436,7 @@ class OTPRateLimiter:
         Args:
             identifier: Email or phone number to lock
         """
-        lock_key = f"otp:lock:{identifier}"
-        timeout = self.account_lock_duration * 60
-        cache.set(lock_key, True, timeout)
+        cache.set(self.lock_key(identifier), True, self.account_lock_duration * 60)
         
         # TODO: Send notification email to user
         # self._send_account_lock_notification(identifier)
@@ -371,8 +448,7 @@ class OTPRateLimiter:
         Args:
             identifier: Email or phone number to unlock
         """
-        lock_key = f"otp:lock:{identifier}"
-        cache.delete(lock_key)
+        cache.delete(self.lock_key(identifier))
 
     def is_account_locked(self, identifier):
         """
@@ -384,8 +460,7 @@ class OTPRateLimiter:
         Returns:
             Boolean indicating if account is locked
         """
-        lock_key = f"otp:lock:{identifier}"
-        return cache.get(lock_key, False)
+        return cache.get(self.lock_key(identifier), False)
 
     # ==================== VERIFICATION HELPERS ====================
     
@@ -396,8 +471,7 @@ class OTPRateLimiter:
         Args:
             otp: OTP instance
         """
-        cache_key = f"otp:verify:{otp.id}"
-        cache.delete(cache_key)
+        cache.delete(self.verification_key(otp))
 
     def get_remaining_attempts(self, otp):
         """
@@ -409,8 +483,7 @@ class OTPRateLimiter:
         Returns:
             Integer count of remaining attempts
         """
-        cache_key = f"otp:verify:{otp.id}"
-        count = cache.get(cache_key, 0)
+        count = cache.get(self.verification_key(otp), 0)
         return max(0, self.verification_limit - count)
 
     # ==================== RATE LIMIT INFO ====================
@@ -427,24 +500,151 @@ class OTPRateLimiter:
         Returns:
             Dict with rate limit information
         """
+        used = cache.get_many([
+            self.generation_key(identifier), self.resend_key(identifier), self.ip_key(ip_address)
+        ])
+        generations = used.get(self.generation_key(identifier), 0)
+        resends = used.get(self.resend_key(identifier), 0)
+        ip_operations = used.get(self.ip_key(ip_address), 0)
         return {
             'generation': {
                 'limit': self.generation_limit,
                 'window': f"{self.generation_window} minutes",
-                'used': cache.get(f"otp:gen:{identifier}", 0),
-                'remaining': max(0, self.generation_limit - cache.get(f"otp:gen:{identifier}", 0))
+                'used': generations,
+                'remaining': max(0, self.generation_limit - generations)
             },
             'resend': {
                 'limit': self.resend_limit,
                 'window': f"{self.resend_window} minutes",
-                'used': cache.get(f"otp:resend:{identifier}", 0),
-                'remaining': max(0, self.resend_limit - cache.get(f"otp:resend:{identifier}", 0))
+                'used': resends,
+                'remaining': max(0, self.resend_limit - resends)
             },
             'ip_global': {
                 'limit': self.ip_global_limit,
                 'window': f"{self.ip_global_window} minutes",
-                'used': cache.get(f"otp:ip:{ip_address}", 0),
-                'remaining': max(0, self.ip_global_limit - cache.get(f"otp:ip:{ip_address}", 0))
+                'used': ip_operations,
+                'remaining': max(0, self.ip_global_limit - ip_operations)
             },
             'account_locked': self.is_account_locked(identifier)
-        }
\ No newline at end of file
+        }
+    # ==================== ASYNC VARIANTS ====================
+    # Used by the async views (OTP/async_views.py). Same keys and limits as
+    # the methods above, through the cache's and the ORM's async APIs; the
+    # progressive delay awaits instead of holding a worker.
+
+    @classmethod
+    async def _aincrement(cls, key, timeout):
+        """Async version of _increment()"""
+        # BaseCache.aincr() is a get() then a set() (which also drops the
+        # key's timeout), so the backend's atomic incr() runs in a thread
+        return await sync_to_async(cls._increment)(key, timeout)
+
+    async def acheck_generation_limit(self, identifier, ip_address):
+        """Async version of check_generation_limit()"""
+        await self._acheck_account_lock(identifier)
+        await self._acheck_ip_global_limit(ip_address)
+        
+        timeout = self.generation_window * 60
+        count = await self._aincrement(self.generation_key(identifier), timeout)
+        await cache.aset(self.generation_timestamp_key(identifier, count - 1), time.time(), timeout)
+        if count > self.generation_limit:
+            self._raise_if_in_window(
+                await cache.aget(self.generation_timestamp_key(identifier, 0)),
+                "Too many OTP generation attempts. Please try again later.",
+                self.generation_limit,
+                self.generation_window
+            )
+        
+        return True
+
+    async def arecord_generation_attempt(self, identifier, ip_address, success=False):
+        """Async version of record_generation_attempt()"""
+        from .models import OTPAttempt
+        await OTPAttempt.arecord_attempt(
+            identifier=identifier,
+            attempt_type=OTPAttempt.GENERATION,
+            ip_address=ip_address,
+            success=success
+        )
+
+    async def acheck_verification_limit(self, otp, ip_address):
+        """Async version of check_verification_limit()"""
+        await self._acheck_ip_global_limit(ip_address)
+        self._raise_if_verifications_exhausted(await self._aincrement(self.verification_key(otp), None))
+        return True
+
+    async def arecord_verification_attempt(self, otp, ip_address, success=False, error_message=None):
+        """Async version of record_verification_attempt()"""
+        count = await cache.aget(self.verification_key(otp), 0)
+        
+        if not success and self.enable_progressive_delays:
+            delay = self._get_progressive_delay(count)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        
+        from .models import OTPAttempt
+        await OTPAttempt.arecord_attempt(
+            identifier=otp.mobile_number,
+            attempt_type=OTPAttempt.VERIFICATION,
+            ip_address=ip_address,
+            success=success,
+            otp=otp,
+            error_message=error_message
+        )
+        
+        if count >= self.verification_limit and not success:
+            await cache.aset(self.lock_key(otp.mobile_number), True, self.account_lock_duration * 60)
+
+    async def acheck_resend_limit(self, identifier, ip_address):
+        """Async version of check_resend_limit()"""
+        await self._acheck_account_lock(identifier)
+        await self._acheck_ip_global_limit(ip_address)
+        
+        last_resend_key = self.last_resend_key(identifier)
+        current_time = time.time()
+        if not await cache.aadd(last_resend_key, current_time, self.resend_cooldown):
+            self._raise_if_cooling_down(await cache.aget(last_resend_key))
+        
+        timeout = self.resend_window * 60
+        count = await self._aincrement(self.resend_key(identifier), timeout)
+        await cache.aset(self.resend_timestamp_key(identifier, count - 1), current_time, timeout)
+        if count > self.resend_limit:
+            self._raise_if_in_window(
+                await cache.aget(self.resend_timestamp_key(identifier, 0)),
+                "Too many resend attempts. Please try again later.",
+                self.resend_limit,
+                self.resend_window
+            )
+        
+        return True
+
+    async def arecord_resend_attempt(self, identifier, ip_address, success=False):
+        """Async version of record_resend_attempt()"""
+        from .models import OTPAttempt
+        await OTPAttempt.arecord_attempt(
+            identifier=identifier,
+            attempt_type=OTPAttempt.RESEND,
+            ip_address=ip_address,
+            success=success
+        )
+
+    async def arecord_ip_activity(self, ip_address):
+        """Async version of record_ip_activity()"""
+        await self._aincrement(self.ip_key(ip_address), self.ip_global_window * 60)
+
+    async def aclear_verification_attempts(self, otp):
+        """Async version of clear_verification_attempts()"""
+        await cache.adelete(self.verification_key(otp))
+
+    async def aget_remaining_attempts(self, otp):
+        """Async version of get_remaining_attempts()"""
+        count = await cache.aget(self.verification_key(otp), 0)
+        return max(0, self.verification_limit - count)
+
+    async def _acheck_ip_global_limit(self, ip_address):
+        self._raise_if_ip_over_limit(await cache.aget(self.ip_key(ip_address), 0))
+
+    async def _acheck_account_lock(self, identifier):
+        lock_key = self.lock_key(identifier)
+        if await cache.aget(lock_key):
+            self._raise_locked(await sync_to_async(self._lock_ttl)(lock_key))
@@ -1,3 +1,169 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from test_utils.query_budget import query_budget
+
+from .models import OTP, OTPAttempt
+from .utils.ip_utils import get_client_ip
+from .views import OTPGenerationView, OTPResendView
+from .async_views import AsyncAPIView, AsyncOTPGenerationView, AsyncOTPResendView, AsyncOTPVerificationView
+from .rate_limiter import OTPRateLimiter, RateLimitExceeded
+
+
+# No progressive delay after failed verifications
+@patch('OTP.rate_limiter.time.sleep')
+@patch.object(OTPResendView, '_send_otp_sms', return_value=(True, None))
+@patch.object(OTPGenerationView, '_send_otp_sms', return_value=(True, None))
+class OTPQueryBudgetTestCase(TestCase):
+    """Query budgets of the OTP endpoints"""
+
+    mobile_number = '9876543210'
+
+    def setUp(self):
+        cache.clear()
+
+    def _post(self, path, data):
+        return self.client.post(f'/otp/api/{path}/', data, content_type='application/json')
+
+    def _generate(self):
+        self._post('generate', {'mobile_number': self.mobile_number})
+        return OTP.objects.get(mobile_number=self.mobile_number)
+
+    def test_generate(self, *mocks):
+        self._generate()
+        # collect, detach attempts, delete, insert, attempt
+        with query_budget(5, label='OTP generation'):
+            response = self._post('generate', {'mobile_number': self.mobile_number})
+        self.assertEqual(response.status_code, 200)
+
+    def test_verify(self, *mocks):
+        otp = self._generate()
+        with query_budget(2, label='Failed OTP verification'):
+            response = self._post('verify', {'mobile_number': self.mobile_number, 'otp_code': 'x' * 6})
+        self.assertEqual(response.status_code, 400)
+
+        with query_budget(2, label='Failed OTP verification'):
+            code = '000000' if otp.code != '000000' else '111111'
+            response = self._post('verify', {'mobile_number': self.mobile_number, 'otp_code': code})
+        self.assertEqual(response.status_code, 400)
+
+        with query_budget(4, label='OTP verification'):
+            response = self._post('verify', {'mobile_number': self.mobile_number, 'otp_code': otp.code})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            OTPAttempt.objects.filter(attempt_type=OTPAttempt.VERIFICATION, identifier=self.mobile_number).count(), 2
+        )
+
+    def test_resend(self, *mocks):
+        self._generate()
+        with query_budget(2, label='OTP resend'):
+            response = self._post('resend', {'mobile_number': self.mobile_number})
+        self.assertEqual(response.status_code, 200)
+
+
+class ClientIPTestCase(TestCase):
+    """Tests for the client IP behind the load balancer"""
+
+    def test_forwarded_for(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.7')
+        with override_settings(OTP_SETTINGS={'TRUSTED_PROXY_COUNT': 1}):
+            # The first entry is whatever the client claimed
+            self.assertEqual(get_client_ip(request), '203.0.113.7')
+        with override_settings(OTP_SETTINGS={}):
+            self.assertEqual(get_client_ip(request), '10.0.0.5')
+
+    def test_forwarded_for_ignored_without_proxy(self):
+        # With no proxy the header is whatever the client sent
+        request = RequestFactory().get('/', REMOTE_ADDR='203.0.113.7', HTTP_X_FORWARDED_FOR='1.1.1.1')
+        with override_settings(OTP_SETTINGS={'TRUSTED_PROXY_COUNT': 0}):
+            self.assertEqual(get_client_ip(request), '203.0.113.7')
+
+    def test_short_forwarded_for_falls_back_to_peer(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='203.0.113.7')
+        with override_settings(OTP_SETTINGS={'TRUSTED_PROXY_COUNT': 2}):
+            self.assertEqual(get_client_ip(request), '10.0.0.5')
+
+
+@patch('OTP.rate_limiter.asyncio.sleep', new_callable=AsyncMock)
+@patch.object(AsyncOTPResendView, '_send_otp_sms', return_value=(True, None))
+@patch.object(AsyncOTPGenerationView, '_send_otp_sms', return_value=(True, None))
+class AsyncOTPViewsTestCase(TestCase):
+    """Tests for the async OTP views served under ASGI"""
+
+    mobile_number = '9876543210'
+
+    def setUp(self):
+        cache.clear()
+
+    async def _post(self, view, data):
+        request = AsyncRequestFactory().post('/', data, content_type='application/json')
+        response = await view.as_view()(request)
+        return response.status_code, json.loads(response.content)
+
+    async def test_generate_verify_and_resend(self, generation_sms, resend_sms, sleep):
+        status, body = await self._post(AsyncOTPGenerationView, {'mobile_number': self.mobile_number})
+        self.assertEqual(status, 200)
+        self.assertTrue(body['success'])
+        otp = await OTP.objects.aget(mobile_number=self.mobile_number)
+        generation_sms.assert_called_once_with(self.mobile_number, otp.code)
+
+        wrong = '000000' if otp.code != '000000' else '111111'
+        for remaining in (4, 3):
+            status, body = await self._post(
+                AsyncOTPVerificationView, {'mobile_number': self.mobile_number, 'otp_code': wrong}
+            )
+            self.assertEqual((status, body['remaining_attempts']), (400, remaining))
+        # The second failure waits, without holding a thread
+        sleep.assert_awaited_once_with(2)
+
+        status, body = await self._post(
+            AsyncOTPVerificationView, {'mobile_number': self.mobile_number, 'otp_code': otp.code}
+        )
+        self.assertEqual(status, 200)
+        await otp.arefresh_from_db()
+        self.assertTrue(otp.is_used)
+        self.assertEqual(
+            await OTPAttempt.objects.filter(attempt_type=OTPAttempt.VERIFICATION, success=True).acount(), 1
+        )
+
+        # The verified OTP is used, so a resend sends a new one
+        status, body = await self._post(AsyncOTPResendView, {'mobile_number': self.mobile_number})
+        self.assertEqual((status, body['data']['action_taken']), (200, 'generated_new'))
+        self.assertEqual(body['data']['resends_used'], 1)
+        status, body = await self._post(AsyncOTPResendView, {'mobile_number': self.mobile_number})
+        self.assertEqual((status, body['error']), (429, 'rate_limit_exceeded'))
+
+    async def test_generation_limit_and_validation(self, *mocks):
+        for _ in range(3):
+            status, body = await self._post(AsyncOTPGenerationView, {'mobile_number': self.mobile_number})
+            self.assertEqual(status, 200)
+        status, body = await self._post(AsyncOTPGenerationView, {'mobile_number': self.mobile_number})
+        self.assertEqual(status, 429)
+        self.assertEqual(body['retry_after_formatted'], '14 minutes')
+
+        status, body = await self._post(AsyncOTPGenerationView, {'mobile_number': '12345'})
+        self.assertEqual((status, body['error']), (400, 'validation_error'))
+
+    async def test_concurrent_verifications_share_the_limit(self, *mocks):
+        otp = await OTP.objects.acreate(mobile_number=self.mobile_number, expires_at=timezone.now())
+        limiter = OTPRateLimiter()
+
+        results = await asyncio.gather(
+            *(limiter.acheck_verification_limit(otp, '203.0.113.7') for _ in range(10)), return_exceptions=True
+        )
+
+        self.assertEqual(results.count(True), limiter.verification_limit)
+        self.assertTrue(all(isinstance(result, RateLimitExceeded) for result in results if result is not True))
+
+    def test_responses_render_like_drf(self, *mocks):
+        # DjangoJSONEncoder cannot encode bytes; DRF's encoder decodes them
+        data = {'pdf_bytes': b'JVBERi0=', 'name': 'आवेदक'}
+        response = AsyncAPIView.respond(data, 200)
+        self.assertEqual(response.content, JSONRenderer().render(data))
+        self.assertEqual(response['Content-Type'], 'application/json')
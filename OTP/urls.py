@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
@@ -7,6 +8,14 @@ from .views import (
     OTPResendView,
 )
 
+# Under ASGI the async versions serve the same URLs
+if getattr(settings, 'ASYNC_VIEWS', False):
+    from .async_views import (
+        AsyncOTPGenerationView as OTPGenerationView,
+        AsyncOTPVerificationView as OTPVerificationView,
+        AsyncOTPResendView as OTPResendView,
+    )
+
 # App name for namespacing
 app_name = 'otp'
 
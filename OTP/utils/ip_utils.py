@@ -0,0 +1,25 @@
+from django.conf import settings
+
+
+def get_client_ip(request):
+    """
+    IP address of the client that sent a request.
+
+    Behind a load balancer REMOTE_ADDR is the balancer; each trusted proxy
+    appends the address it received the request from to X-Forwarded-For, so
+    the client is the entry TRUSTED_PROXY_COUNT places from the end. Entries
+    before it are supplied by the client and are not trusted.
+
+    Args:
+        request: Django HttpRequest
+
+    Returns:
+        IP address string
+    """
+    proxies = getattr(settings, 'OTP_SETTINGS', {}).get('TRUSTED_PROXY_COUNT', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
@@ -147,10 +147,8 @@ class OTPGenerationView(APIView):
             # # Step 2: Check if applicant exists, if not create one
             # applicant, created = self._get_or_create_applicant(mobile_number)
             
-            # Step 3: Invalidate any existing valid OTP for this mobile number
-            self._invalidate_existing_otp(mobile_number)
-            
-            # Step 4: Generate new OTP
+            # Step 3-4: Generate new OTP (deletes any existing OTP for this
+            # mobile number, which also invalidates it)
             otp = self._generate_otp(mobile_number)
             
             # Step 5: Send OTP via SMS
@@ -251,26 +249,6 @@ class OTPGenerationView(APIView):
         #     return applicant, True
         pass
     
-    def _invalidate_existing_otp(self, mobile_number):
-        """
-        Invalidate any existing valid OTP for the mobile number.
-        
-        Args:
-            mobile_number: mobile_number 
-        """
-        try:
-            existing_otp = OTP.objects.get(mobile_number=mobile_number)
-            
-            # Check if it's still valid
-            if existing_otp.is_valid():
-                # Mark as used to invalidate
-                existing_otp.is_used = True
-                existing_otp.save(update_fields=['is_used'])
-                logger.info(f"Invalidated existing OTP for {mobile_number}")
-        except OTP.DoesNotExist:
-            # No existing OTP, nothing to invalidate
-            pass
-    
     def _generate_otp(self, mobile_number):
         """
         Generate new OTP for mobile_number.
@@ -1038,12 +1016,12 @@ class OTPResendView(APIView):
         resend_cooldown = otp_settings.get('RESEND_COOLDOWN_SECONDS', 30)
         
         # Get current resend count
-        cache_key = f"otp:resend:{mobile_number}"
+        cache_key = OTPRateLimiter.resend_key(mobile_number)
         used = cache.get(cache_key, 0)
         remaining = max(0, resend_limit - used)
         
         # Get time until next resend is available
-        last_resend_key = f"otp:resend:last:{mobile_number}"
+        last_resend_key = OTPRateLimiter.last_resend_key(mobile_number)
         last_resend_time = cache.get(last_resend_key)
         
         if last_resend_time:
@@ -32,6 +32,11 @@ if DEBUG:
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY =  os.environ.get('SECRET_KEY')  
 
+# Key of the HMAC digests stored in IdentityKey (scheme/identity.py). Keep it
+# apart from SECRET_KEY; after changing it, run `manage.py link_identities
+# --rebuild`. Development falls back to SECRET_KEY.
+IDENTITY_HASH_KEY = os.environ.get('IDENTITY_HASH_KEY') or (SECRET_KEY if DEBUG else None)
+
 
 
 ALLOWED_HOSTS = ['.elasticbeanstalk.com', '.amazonaws.com', '*']
@@ -57,6 +62,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it measures the rest of the stack too
+    'scheme.metrics.RequestMetricsMiddleware',
+    # Before anything reads the database (sessions, auth)
+    'scheme.routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'scheme.validators.ValidationScopeMiddleware',
 ]
 
 ROOT_URLCONF = 'Reyasat_LIG_EWS_backend.urls'
@@ -95,7 +105,10 @@ if DATABASES == "SQLITE":
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Take the write lock when a transaction starts, and wait for it,
+            # so concurrent submissions queue instead of failing as "locked"
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
         }
     }
 elif DATABASES == "rds":
@@ -138,6 +151,65 @@ else:
         },
     }
 
+# PostgreSQL connection handling, by DATABASES_POOL:
+#   unset      one persistent connection per thread, checked before reuse
+#   psycopg    one pool per process shared by its threads (psycopg 3 with
+#              psycopg-pool); at most workers x DATABASES_POOL_MAX_SIZE
+#              connections in all
+#   pgbouncer  connections to PgBouncer in transaction mode, which pools
+#              them; set statement_timeout and lock_timeout on the database
+#              role, as PgBouncer does not pass startup options on
+# Every select_for_update() runs inside transaction.atomic(), so row locks
+# hold on one server connection in all three modes.
+DATABASES_POOL = os.environ.get('DATABASES_POOL', '')
+
+# How gunicorn serves the app (gunicorn.conf.py): 'wsgi' with threads, or
+# 'asgi' with uvicorn workers, where async views answer the OTP endpoints
+# and the applicant status and PDF lookups
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
+
+if DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+    if DATABASES_POOL == 'psycopg':
+        # Django checks each connection as the pool hands it out
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool keeps them instead
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DATABASES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DATABASES_POOL_MAX_SIZE', 10)),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.environ.get('DATABASES_POOL_TIMEOUT', 10)),
+        }
+    else:
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+        if SERVER_MODE == 'asgi':
+            # Async requests each run their queries on a new thread, which
+            # would leave a persistent connection behind; use a pool instead
+            DATABASES['default']['CONN_MAX_AGE'] = 0
+        if DATABASES_POOL == 'pgbouncer':
+            DATABASES['default']['OPTIONS'].pop('options', None)
+            # Named cursors and prepared statements live on a server
+            # connection, which the next transaction may not get
+            DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+            DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+
+# Optional read replica (scheme/routing.py): a second SQLite file kept in
+# sync outside Django, or the same PostgreSQL database on a replica host.
+# Tests read the replica through the default test database.
+if os.environ.get('SQLITE_REPLICA_PATH') and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['replica'] = dict(
+        DATABASES['default'], NAME=os.environ['SQLITE_REPLICA_PATH'], TEST={'MIRROR': 'default'},
+    )
+elif os.environ.get('DATABASES_REPLICA_HOST'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'], HOST=os.environ['DATABASES_REPLICA_HOST'], TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['scheme.routing.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it wrote, to cover
+# the replica's lag
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -180,6 +252,25 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Background export files (scheme.ExportJob) go to S3 under exports/;
+# EXPORT_STORAGE=local keeps them in MEDIA_ROOT/exports instead
+if os.environ.get('EXPORT_STORAGE') == 'local':
+    EXPORTS_STORAGE = {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': MEDIA_ROOT / 'exports'},
+    }
+else:
+    EXPORTS_STORAGE = {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {'location': 'exports'},
+    }
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'exports': EXPORTS_STORAGE,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -206,8 +297,21 @@ OTP_SETTINGS = {
     'EXPIRY_MINUTES': 5,
     
     'ENABLE_PROGRESSIVE_DELAYS': True,
+
+    # Proxies in front of the app whose X-Forwarded-For entries are trusted
+    # when finding the client IP. Set to 1 behind the Elastic Beanstalk load
+    # balancer; with no proxy a client could otherwise pick its own address
+    # and evade the per-IP limits, so the header is ignored by default
+    'TRUSTED_PROXY_COUNT': int(os.environ.get('TRUSTED_PROXY_COUNT', 0)),
 }
 
+# Request instrumentation (scheme/metrics.py): per-view histograms served at
+# /scheme/internal/metrics/ to requests sending
+# "Authorization: Bearer <METRICS_TOKEN>"; without METRICS_TOKEN it is closed
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'True').lower() == 'true'
+REQUEST_METRICS_SLOW_SECONDS = float(os.environ.get('REQUEST_METRICS_SLOW_SECONDS', 2))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -217,6 +321,10 @@ LOGGING = {
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'django-error.log'),
         },
+        'console': {
+            'level': 'WARNING',
+            'class': 'logging.StreamHandler',
+        },
     },
     'loggers': {
         'django': {
@@ -224,6 +332,11 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        # Slow requests, with their query, cache and storage counts
+        'scheme.metrics': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
     },
 }
 
@@ -237,6 +350,13 @@ AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
 AWS_REGION_NAME = os.environ.get('AWS_REGION_NAME', "ap-south-1")
 
 AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
+
+# An S3-compatible endpoint instead of AWS, e.g. the load test's stand-in
+# (loadtest/s3stub.py); such endpoints are addressed by path
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL')
+if AWS_S3_ENDPOINT_URL:
+    AWS_S3_CUSTOM_DOMAIN = None
+    AWS_S3_ADDRESSING_STYLE = 'path'
 AWS_DEFAULT_ACL = None # Don't set default ACL (keeps files private)
 AWS_QUERYSTRING_AUTH = True
 AWS_QUERYSTRING_EXPIRE = 3600
@@ -23,6 +23,7 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('scheme/', include('scheme.urls')),
+    path('otp/', include('OTP.urls')),
 
     
 ]
@@ -0,0 +1,152 @@
+"""
+Shared setup for the benchmark scripts.
+
+Importing this module configures Django, so the benchmark modules can import
+models right after it. Benchmarks run against a throwaway test database
+(``test_database()``), time each call with ``measure()`` and write their
+results with ``write_results()`` as JSON:
+
+    {"meta": {"git_commit": "d615c92", ...},
+     "results": [{"name": "application_save", "median_ms": 1.9, ...}, ...]}
+
+``compare()`` prints the change in median time against an earlier results
+file, so a regression between two commits shows up as a large positive delta.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Reyasat_LIG_EWS_backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+
+@contextlib.contextmanager
+def test_database():
+    """Create a test database for the block and destroy it afterwards"""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow stdout, for code paths that print debug lines"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(name, func, rounds, setup=None, **info):
+    """
+    Time ``func`` over ``rounds`` calls.
+
+    Args:
+        name: Benchmark name in the results
+        func: Called once per round with the value ``setup`` returned
+              (or with no arguments without ``setup``)
+        rounds: Number of timed calls
+        setup: Called before each round, outside the timing
+        **info: Extra keys for the result, e.g. the row count
+
+    Returns:
+        Result dict with per-call min/median/mean/max/stdev in milliseconds
+    """
+    timings = []
+    for _ in range(rounds):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    median = statistics.median(timings)
+    return {
+        'name': name,
+        'rounds': rounds,
+        'min_ms': round(min(timings) * 1000, 4),
+        'median_ms': round(median * 1000, 4),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 4),
+        'max_ms': round(max(timings) * 1000, 4),
+        'stdev_ms': round(statistics.stdev(timings) * 1000, 4) if rounds > 1 else 0.0,
+        'ops_per_second': round(1 / median, 2) if median else None,
+        **info,
+    }
+
+
+def print_results(results):
+    for result in results:
+        print(f"{result['name']:<36} median {result['median_ms']:>10.3f} ms  "
+              f"min {result['min_ms']:>10.3f} ms  ({result['rounds']} rounds)")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, results, **meta):
+    """Write results as JSON, with the commit and environment they were measured on"""
+    document = {
+        'meta': {
+            'git_commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            **meta,
+        },
+        'results': results,
+    }
+    with open(path, 'w') as fh:
+        json.dump(document, fh, indent=2)
+        fh.write('\n')
+
+
+def compare(results, path, threshold=None):
+    """
+    Print the change in median time against an earlier results file.
+
+    Args:
+        results: Results of this run
+        path: Results file written by an earlier run
+        threshold: Percent slowdown of the median that counts as a regression
+
+    Returns:
+        Names of the benchmarks that regressed by more than ``threshold``
+    """
+    with open(path) as fh:
+        baseline = json.load(fh)
+    before = {result['name']: result for result in baseline['results']}
+
+    regressions = []
+    print(f"\nAgainst {path} ({baseline['meta'].get('git_commit')}, {baseline['meta'].get('created_at')}):")
+    for result in results:
+        previous = before.get(result['name'])
+        if not previous or not previous['median_ms']:
+            print(f"{result['name']:<36} {'new':>10}")
+            continue
+        change = (result['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100
+        print(f"{result['name']:<36} {previous['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms  {change:+6.1f}%")
+        if threshold is not None and change > threshold:
+            regressions.append(result['name'])
+    return regressions
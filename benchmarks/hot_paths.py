@@ -0,0 +1,206 @@
+"""
+Micro-benchmarks of the model, serializer, OTP and admin hot paths.
+
+Times, against a throwaway test database:
+    application_save             Application.save() of a new application,
+                                 including the locked number allocation
+    scheme_serializer_list       SchemeSerializer(many=True) over the scheme
+                                 list queryset, as SchemeListView runs it
+    rate_limiter_generation      OTPRateLimiter.check_generation_limit() of a
+                                 first attempt
+    otp_suspicious_activity      OTPAttempt.has_suspicious_activity() with
+                                 a realistic attempt history
+    admin_get_status             SchemeAdmin.get_status() for a changelist
+                                 page of schemes
+    application_resource_export  ApplicationResource().export() of
+                                 --export-rows applications (admin export)
+    application_export_rows      export_rows() of the same rows (streaming
+                                 export)
+
+Usage:
+    DATABASES=SQLITE SECRET_KEY=x python benchmarks/hot_paths.py --rounds 200 --json hot_paths.json
+"""
+
+import argparse
+from datetime import date, timedelta
+from decimal import Decimal
+
+import common  # configures Django; keep before the Django imports
+from django.contrib.admin.sites import AdminSite
+from django.utils import timezone
+
+from OTP.models import OTPAttempt
+from OTP.rate_limiter import OTPRateLimiter
+from scheme.exports import export_rows
+from scheme.models import Application, Scheme
+from scheme.serializers import SchemeSerializer
+
+
+SCHEME_COUNT = 50
+ATTEMPT_HISTORY = 500
+EXPORT_ROUNDS = 3
+
+
+def create_schemes(count):
+    now = timezone.now()
+    return [
+        Scheme.objects.create(
+            name=f'Benchmark Scheme {index}', company='riyasat-infra', ews_plot_count=10, Lig_plot_count=10,
+            reserved_price=Decimal(5000), application_number_start=(index + 1) * 1_000_000,
+            application_open_date=now + timedelta(days=index - count // 2),
+            application_close_date=now + timedelta(days=index - count // 2 + 30),
+        )
+        for index in range(count)
+    ]
+
+
+def application(scheme, serial, annual_income='3L_6L'):
+    return Application(
+        scheme=scheme,
+        mobile_number=f'9{serial:09d}',
+        applicant_name=f'Applicant {serial}',
+        father_or_husband_name='Father',
+        dob=date(1990, 1, 1),
+        id_type='VOTER_ID',
+        id_number='ABC1234567',
+        aadhar_number=f'{serial:012d}',
+        permanent_address='Address',
+        permanent_address_pincode='302001',
+        postal_address='Address',
+        postal_address_pincode='302001',
+        email=f'applicant{serial}@example.com',
+        annual_income=annual_income,
+        sub_category='un-reserved',
+        payment_mode='UPI',
+        dd_id_or_transaction_id=f'UPI{serial}',
+        dd_date_or_transaction_date=date.today(),
+        dd_amount_or_transaction_amount=Decimal('20500.00'),
+        payer_account_holder_name='Applicant',
+        payer_bank_name='Bank',
+        applicant_account_holder_name='Applicant',
+        applicant_account_number=f'ACC{serial}',
+        applicant_bank_name='Bank',
+        applicant_bank_branch_address='Branch',
+        applicant_bank_ifsc='SBIN0001234',
+    )
+
+
+def bulk_applications(scheme, count, first_serial):
+    """Insert ``count`` applications without going through save()"""
+    applications = []
+    for offset in range(count):
+        instance = application(scheme, first_serial + offset, '0L_3L' if offset % 3 else '3L_6L')
+        instance.apply_income_rules()
+        instance.application_number = scheme.application_number_start + offset
+        applications.append(instance)
+    Application.objects.bulk_create(applications, batch_size=1000)
+
+
+def bench_application_save(scheme, rounds):
+    serials = iter(range(1, rounds + 1))
+
+    def save(instance):
+        # save() prints debug lines; keep them out of the output
+        with common.quiet():
+            instance.save()
+
+    return common.measure('application_save', save, rounds, setup=lambda: application(scheme, next(serials)))
+
+
+def bench_scheme_serializer_list(rounds):
+    queryset = Scheme.objects.all().order_by('application_open_date')
+    return common.measure(
+        'scheme_serializer_list', lambda: SchemeSerializer(queryset.all(), many=True).data, rounds,
+        schemes=queryset.count(),
+    )
+
+
+def bench_rate_limiter(rounds):
+    limiter = OTPRateLimiter()
+    # The check counts every attempt it allows: use a new number and IP each
+    # round so the limits are not reached
+    clients = ((f'9{index:09d}', f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}')
+               for index in range(1, rounds + 1))
+    return common.measure(
+        'rate_limiter_generation', lambda client: limiter.check_generation_limit(*client), rounds,
+        setup=lambda: next(clients),
+    )
+
+
+def bench_suspicious_activity(rounds):
+    # Most attempts belong to other numbers, as in production
+    OTPAttempt.objects.bulk_create(
+        OTPAttempt(
+            identifier=f'9{index % 100:09d}',
+            attempt_type=(OTPAttempt.GENERATION, OTPAttempt.VERIFICATION, OTPAttempt.RESEND)[index % 3],
+            ip_address=f'10.0.{index % 7}.{index % 250 + 1}',
+            success=index % 4 != 0,
+        )
+        for index in range(ATTEMPT_HISTORY)
+    )
+    return common.measure(
+        'otp_suspicious_activity', lambda: OTPAttempt.has_suspicious_activity('9000000001'), rounds,
+        attempts=ATTEMPT_HISTORY,
+    )
+
+
+def bench_admin_get_status(schemes, rounds):
+    # Imported here: scheme.admin pulls in the admin site and import-export
+    from scheme.admin import SchemeAdmin
+
+    model_admin = SchemeAdmin(Scheme, AdminSite())
+
+    def changelist_column():
+        for scheme in schemes:
+            model_admin.get_status(scheme)
+
+    return common.measure('admin_get_status', changelist_column, rounds, schemes=len(schemes))
+
+
+def bench_exports(scheme, rows, rounds):
+    from scheme.admin import ApplicationResource
+
+    bulk_applications(scheme, rows, first_serial=500_000_000)
+    queryset = Application.objects.filter(scheme=scheme)
+    return [
+        common.measure(
+            'application_resource_export', lambda: ApplicationResource().export(queryset.all()), rounds, rows=rows,
+        ),
+        common.measure(
+            'application_export_rows', lambda: sum(1 for _ in export_rows(ApplicationResource(), queryset.all())),
+            rounds, rows=rows,
+        ),
+    ]
+
+
+def run_suite(rounds, export_row_count=10_000, export_rounds=EXPORT_ROUNDS):
+    """Hot path benchmarks; needs a test database"""
+    schemes = create_schemes(SCHEME_COUNT)
+    return [
+        bench_application_save(schemes[0], rounds),
+        bench_scheme_serializer_list(rounds),
+        bench_rate_limiter(rounds),
+        bench_suspicious_activity(rounds),
+        bench_admin_get_status(schemes, rounds),
+        *bench_exports(schemes[1], export_row_count, export_rounds),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--export-rows', type=int, default=10_000)
+    parser.add_argument('--export-rounds', type=int, default=EXPORT_ROUNDS)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    with common.test_database():
+        results = run_suite(args.rounds, args.export_rows, args.export_rounds)
+
+    common.print_results(results)
+    if args.json:
+        common.write_results(args.json, results, suite='hot_paths')
+
+
+if __name__ == '__main__':
+    main()
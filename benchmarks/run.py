@@ -0,0 +1,58 @@
+"""
+Run all benchmark suites and write one results file.
+
+Each suite runs against the same throwaway test database. Compare two
+commits by saving the results of one and passing them to ``--compare`` on
+the other; ``--fail-over PCT`` exits 1 when any median slowed down by more
+than PCT percent.
+
+Usage:
+    DATABASES=SQLITE SECRET_KEY=x python benchmarks/run.py --json benchmarks/results.json
+    DATABASES=SQLITE SECRET_KEY=x python benchmarks/run.py --compare benchmarks/results.json --fail-over 20
+"""
+
+import argparse
+import sys
+
+import common  # configures Django; keep before the suites
+import hot_paths
+import validation
+
+
+SUITES = {
+    'hot_paths': lambda args: hot_paths.run_suite(args.rounds, args.export_rows, args.export_rounds),
+    'validation': lambda args: validation.run_suite(args.rounds),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite', action='append', choices=SUITES, help='Suite to run (default: all)')
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--export-rows', type=int, default=10_000)
+    parser.add_argument('--export-rounds', type=int, default=hot_paths.EXPORT_ROUNDS)
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+    parser.add_argument('--fail-over', type=float, metavar='PCT',
+                        help='With --compare, exit 1 if a median is more than PCT percent slower')
+    args = parser.parse_args()
+
+    suites = args.suite or list(SUITES)
+    results = []
+    with common.test_database():
+        for name in suites:
+            results.extend(SUITES[name](args))
+
+    common.print_results(results)
+    if args.json:
+        common.write_results(args.json, results, suites=suites, rounds=args.rounds, export_rows=args.export_rows)
+    if args.compare:
+        regressions = common.compare(results, args.compare, args.fail_over)
+        if regressions:
+            print(f"\nSlower than allowed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
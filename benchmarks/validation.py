@@ -0,0 +1,113 @@
+"""
+Micro-benchmark of application validation throughput.
+
+Times ApplicationSerializer.is_valid() on valid and invalid submissions, and
+is_valid() followed by the model's clean_fields() (what a request that
+validates in both layers pays), against a throwaway test database.
+
+Usage:
+    DATABASES=SQLITE SECRET_KEY=x python benchmarks/validation.py --iterations 500
+"""
+
+import argparse
+import io
+from datetime import date
+from decimal import Decimal
+
+import common  # configures Django; keep before the Django imports
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from scheme.models import Application, Scheme
+from scheme.serializers import ApplicationSerializer
+from scheme.validators import validation_scope
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def payload(scheme, image, **overrides):
+    data = {
+        'scheme': scheme.pk,
+        'mobile_number': '9800000001',
+        'applicant_name': 'Benchmark Applicant',
+        'father_or_husband_name': 'Father',
+        'dob': date(1990, 1, 1).isoformat(),
+        'id_type': 'VOTER_ID',
+        'id_number': 'ABC1234567',
+        'aadhar_number': '123456789012',
+        'permanent_address': 'Address',
+        'permanent_address_pincode': '302001',
+        'postal_address': 'Address',
+        'postal_address_pincode': '302001',
+        'email': 'applicant@example.com',
+        'annual_income': '3L_6L',
+        'sub_category': 'un-reserved',
+        'payment_mode': 'UPI',
+        'dd_id_or_transaction_id': 'UPI123456',
+        'dd_date_or_transaction_date': date.today().isoformat(),
+        'dd_amount_or_transaction_amount': '20500.00',
+        'payer_account_holder_name': 'Applicant',
+        'payer_bank_name': 'Bank',
+        'applicant_account_holder_name': 'Applicant',
+        'applicant_account_number': '1234567890',
+        'applicant_bank_name': 'Bank',
+        'applicant_bank_branch_address': 'Branch',
+        'applicant_bank_ifsc': 'SBIN0001234',
+        'payment_proof': SimpleUploadedFile('proof.png', image, content_type='image/png'),
+    }
+    data.update(overrides)
+    return data
+
+
+def is_valid(data):
+    ApplicationSerializer(data=data).is_valid()
+
+
+def is_valid_then_clean_fields(data):
+    with validation_scope():
+        serializer = ApplicationSerializer(data=data)
+        serializer.is_valid()
+        validated = serializer.validated_data
+        Application(**validated).clean_fields(
+            exclude=[field.name for field in Application._meta.fields
+                     if field.name not in validated or field.name in ('scheme', 'payment_proof')]
+        )
+
+
+def run_suite(rounds):
+    """Validation benchmarks; needs a test database"""
+    scheme = Scheme.objects.create(
+        name='Validation Benchmark Scheme', company='riyasat-infra', ews_plot_count=10, Lig_plot_count=10,
+        reserved_price=Decimal(5000), application_number_start=1_000_000,
+    )
+    image = png_bytes()
+    # payload() runs as setup so only validation is timed
+    return [
+        common.measure('is_valid', is_valid, rounds, setup=lambda: payload(scheme, image)),
+        common.measure('is_valid_invalid', is_valid, rounds,
+                       setup=lambda: payload(scheme, image, mobile_number='98000', applicant_bank_ifsc='bad')),
+        common.measure('is_valid_then_clean_fields', is_valid_then_clean_fields, rounds,
+                       setup=lambda: payload(scheme, image)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    with common.test_database():
+        results = run_suite(args.iterations)
+
+    common.print_results(results)
+    if args.json:
+        common.write_results(args.json, results, suite='validation')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for the container.
+
+SERVER_MODE picks the app and workers:
+    wsgi   Reyasat_LIG_EWS_backend.wsgi with threaded workers (default)
+    asgi   Reyasat_LIG_EWS_backend.asgi with uvicorn workers, where the OTP
+           endpoints and applicant lookups run as async views (one worker
+           holds many waiting requests)
+
+Settings (environment):
+    PORT             Port to bind (default 8000)
+    WEB_CONCURRENCY  Worker processes (default 2 x CPUs + 1)
+    GUNICORN_THREADS Threads per WSGI worker (default 4)
+    GUNICORN_TIMEOUT Seconds before a silent worker is restarted (default 60)
+
+With DATABASES_POOL=psycopg each worker keeps its own pool, so the database
+sees up to WEB_CONCURRENCY x DATABASES_POOL_MAX_SIZE connections.
+"""
+
+import multiprocessing
+import os
+
+
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+accesslog = '-'
+
+if server_mode == 'asgi':
+    wsgi_app = 'Reyasat_LIG_EWS_backend.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'Reyasat_LIG_EWS_backend.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
@@ -0,0 +1,525 @@
+"""
+Load test for the applicant flow.
+
+Each virtual user runs OTP generate -> OTP verify -> application submit ->
+PDF fetch against a running portal, as one iteration per applicant. The
+report gives per-endpoint request counts, errors, p50/p95/p99 latency and
+throughput; ``--save`` writes it as JSON and ``--compare`` diffs a run
+against a saved baseline.
+
+The OTP code is read from the generate response, which the portal only
+returns with DEBUG=True. Each applicant sends its own X-Forwarded-For: the
+OTP limiter counts every allowed attempt per mobile number and per IP, so
+the limits see distinct clients rather than a few users reaching the per-IP
+limit (needs TRUSTED_PROXY_COUNT=1, which --serve sets).
+
+Against a running server:
+    python loadtest/harness.py --base-url http://127.0.0.1:8000 --scheme 1 \\
+        --users 20 --duration 60 --save loadtest/baseline.json
+
+Self-contained (SQLite or DATABASES=POSTGRES from the environment, local S3
+stand-in, runserver on a free port, a fresh scheme):
+    python loadtest/harness.py --serve --users 10 --rate 5 --duration 30 \\
+        --compare loadtest/baseline.json
+
+loadtest/baseline.json is the committed baseline; its ``meta`` holds the
+command, commit and environment it was recorded with. Re-record it with the
+same command after a change that is meant to move the numbers.
+
+``--rate`` sets an open-loop Poisson arrival rate (iterations per second,
+shared by all users); without it each user starts its next iteration as
+soon as the last one finishes.
+"""
+
+import argparse
+import html
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import s3stub
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENDPOINTS = {
+    'otp_generate': '/otp/api/generate/',
+    'otp_verify': '/otp/api/verify/',
+    'application_submit': '/scheme/api/application/',
+    'application_pdf': '/scheme/api/application/pdf',
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def tiny_png():
+    """A valid 1x1 PNG, so the ImageField accepts the payment proof"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(b'\x00\xff\xff\xff'))
+        + chunk(b'IEND', b'')
+    )
+
+
+PAYMENT_PROOF = tiny_png()
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def application_fields(scheme, serial):
+    """A valid LIG application; serial makes the mobile, Aadhar and account unique"""
+    return {
+        'scheme': scheme,
+        'mobile_number': f'9{serial:09d}',
+        'applicant_name': f'Load Test {serial}',
+        'father_or_husband_name': 'Load Test Father',
+        'dob': '1990-01-01',
+        'id_type': 'VOTER_ID',
+        'id_number': f'LDT{serial % 10 ** 7:07d}',
+        'aadhar_number': f'{serial:012d}',
+        'permanent_address': 'Load Test Address',
+        'permanent_address_pincode': '302001',
+        'postal_address': 'Load Test Address',
+        'postal_address_pincode': '302001',
+        'email': f'loadtest{serial}@example.com',
+        'annual_income': '3L_6L',
+        'payment_mode': 'UPI',
+        'dd_id_or_transaction_id': f'LT{serial}',
+        'dd_date_or_transaction_date': datetime.now().date().isoformat(),
+        'dd_amount_or_transaction_amount': '20500.00',
+        'payer_account_holder_name': f'Load Test {serial}',
+        'payer_bank_name': 'Load Test Bank',
+        'applicant_account_holder_name': f'Load Test {serial}',
+        'applicant_account_number': f'LT{serial}',
+        'applicant_bank_name': 'Load Test Bank',
+        'applicant_bank_branch_address': 'Load Test Branch',
+        'applicant_bank_ifsc': 'SBIN0001234',
+    }
+
+
+def describe(payload):
+    """Short form of an error body; the exception from a Django debug page"""
+    text = payload.decode('utf-8', 'replace')
+    match = re.search(r'<title>\s*(.*?)\s+at .*?</title>.*?<pre class="exception_value">(.*?)</pre>', text, re.S)
+    if match:
+        return html.unescape(f'{match.group(1)}: {match.group(2)}')[:200]
+    return text[:200]
+
+
+class EndpointStats:
+    """Latencies and outcomes for one endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.sample_errors = []
+
+    def add(self, seconds, status, error=None):
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if error is not None:
+            self.errors += 1
+            if len(self.sample_errors) < 5:
+                self.sample_errors.append(error)
+
+    def summary(self, elapsed):
+        ordered = sorted(self.latencies)
+        summary = {
+            'requests': len(ordered),
+            'errors': self.errors,
+            'error_rate': round(self.errors / len(ordered), 4) if ordered else 0,
+            'throughput_rps': round(len(ordered) / elapsed, 2) if elapsed else 0,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+            'sample_errors': self.sample_errors,
+        }
+        for pct in PERCENTILES:
+            value = percentile(ordered, pct)
+            summary[f'p{pct}_ms'] = round(value * 1000, 1) if value is not None else None
+        return summary
+
+
+class Run:
+    """Shared state of one load test"""
+
+    def __init__(self, args):
+        self.args = args
+        parts = urlsplit(args.base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.stats = {name: EndpointStats() for name in ENDPOINTS}
+        self.lock = threading.Lock()
+        # Start serials from the clock so reruns against one database don't collide
+        self.next_serial = int(time.time()) % 10 ** 6 * 1000
+        self.iterations = 0
+        self.completed = 0
+        self.stop = threading.Event()
+        self.tickets = None
+
+    def take_serial(self):
+        with self.lock:
+            if self.args.iterations and self.iterations >= self.args.iterations:
+                return None
+            self.iterations += 1
+            self.next_serial += 1
+            return self.next_serial
+
+    def record(self, name, seconds, status, error=None):
+        with self.lock:
+            self.stats[name].add(seconds, status, error)
+
+
+def client_ip(serial):
+    return f'10.{serial // 65536 % 256}.{serial // 256 % 256}.{serial % 256 or 1}'
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, run):
+        super().__init__(daemon=True)
+        self.run_state = run
+        self.client_ip = None
+        self.connection = None
+
+    def request(self, name, body, content_type):
+        run = self.run_state
+        headers = {'Content-Type': content_type, 'X-Forwarded-For': self.client_ip}
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(run.host, run.port, timeout=run.args.timeout)
+            self.connection.request('POST', ENDPOINTS[name], body=body, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            run.record(name, time.perf_counter() - started, 'exception', f'{type(e).__name__}: {e}')
+            self.connection.close()
+            self.connection = None
+            return None
+        elapsed = time.perf_counter() - started
+        try:
+            data = json.loads(payload) if payload else {}
+        except ValueError:
+            data = {}
+        error = None if 200 <= response.status < 300 else f'{response.status}: {describe(payload)}'
+        run.record(name, elapsed, response.status, error)
+        return data if error is None else None
+
+    def json_request(self, name, data):
+        return self.request(name, json.dumps(data).encode(), 'application/json')
+
+    def iteration(self, serial):
+        scheme = self.run_state.args.scheme
+        fields = application_fields(scheme, serial)
+        self.client_ip = client_ip(serial)
+        mobile = fields['mobile_number']
+
+        generated = self.json_request('otp_generate', {'mobile_number': mobile})
+        code = ((generated or {}).get('data') or {}).get('code')
+        if not code:
+            return False
+        if self.json_request('otp_verify', {'mobile_number': mobile, 'otp_code': code}) is None:
+            return False
+
+        body, content_type = multipart(fields, {'payment_proof': ('proof.png', PAYMENT_PROOF, 'image/png')})
+        submitted = self.request('application_submit', body, content_type)
+        if submitted is None:
+            return False
+        pdf = self.json_request('application_pdf', {
+            'application_number': str(submitted.get('application_number')),
+            'mobile_number': mobile,
+        })
+        return pdf is not None
+
+    def run(self):
+        run = self.run_state
+        while not run.stop.is_set():
+            if run.tickets is not None:
+                # Open loop: wait for the next arrival
+                try:
+                    if not run.tickets.acquire(timeout=0.2):
+                        continue
+                except ValueError:
+                    return
+            serial = run.take_serial()
+            if serial is None:
+                return
+            if self.iteration(serial):
+                with run.lock:
+                    run.completed += 1
+        if self.connection is not None:
+            self.connection.close()
+
+
+def arrivals(run):
+    """Release iterations at a Poisson rate until the run stops"""
+    rng = random.Random()
+    while not run.stop.is_set():
+        run.stop.wait(rng.expovariate(run.args.rate))
+        run.tickets.release()
+
+
+def execute(args):
+    run = Run(args)
+    if args.rate:
+        run.tickets = threading.Semaphore(0)
+        threading.Thread(target=arrivals, args=(run,), daemon=True).start()
+
+    users = [VirtualUser(run) for _ in range(args.users)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+
+    deadline = started + args.duration if args.duration else None
+    while any(user.is_alive() for user in users):
+        if deadline is not None and time.perf_counter() >= deadline:
+            run.stop.set()
+        time.sleep(0.1)
+    run.stop.set()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'command': ' '.join(['python', 'loadtest/harness.py', *sys.argv[1:]]),
+            'environment': environment(args),
+            'base_url': args.base_url,
+            'users': args.users,
+            'rate': args.rate,
+            'duration': args.duration,
+            'iterations': run.iterations,
+            'completed_iterations': run.completed,
+            'elapsed_seconds': round(elapsed, 2),
+        },
+        'endpoints': {name: stats.summary(elapsed) for name, stats in run.stats.items()},
+    }
+
+
+def environment(args):
+    """Where the run happened, so baselines are only compared like for like"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        # Only known when --serve starts the server here
+        'database': os.environ.get('DATABASES', 'SQLITE') if args.serve else None,
+        'server': 'runserver (--serve)' if args.serve else args.base_url,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    meta = result['meta']
+    print(f"\n{meta['completed_iterations']}/{meta['iterations']} iterations completed "
+          f"in {meta['elapsed_seconds']}s ({meta['users']} users, rate {meta['rate'] or 'closed loop'})")
+    print(f"{'endpoint':<20} {'reqs':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>7}")
+    for name, summary in result['endpoints'].items():
+        print(f"{name:<20} {summary['requests']:>6} {summary['errors']:>6} "
+              f"{fmt(summary['p50_ms']):>9} {fmt(summary['p95_ms']):>9} {fmt(summary['p99_ms']):>9} "
+              f"{summary['throughput_rps']:>7}")
+    for name, summary in result['endpoints'].items():
+        for error in summary['sample_errors']:
+            print(f"  {name}: {error}")
+
+
+def fmt(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def compare(result, baseline, threshold=None):
+    """
+    Print per-endpoint deltas against a baseline.
+
+    Returns:
+        Names of endpoints whose p95 grew by more than ``threshold`` percent,
+        or whose error rate grew at all
+    """
+    regressions = []
+    print(f"\nAgainst baseline {baseline['meta'].get('git_commit')} ({baseline['meta'].get('started_at')}):")
+    print(f"{'endpoint':<20} {'p50':>16} {'p95':>16} {'p99':>16} {'error rate':>18}")
+    for name, summary in result['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            continue
+        cells = []
+        for pct in PERCENTILES:
+            now, then = summary[f'p{pct}_ms'], before[f'p{pct}_ms']
+            cells.append(f"{fmt(now)} ({change(now, then)})")
+            if pct == 95 and threshold is not None and now and then and (now - then) / then * 100 > threshold:
+                regressions.append(name)
+        print(f"{name:<20} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16} "
+              f"{summary['error_rate']:>8} ({before['error_rate']})")
+        if threshold is not None and summary['error_rate'] > before['error_rate'] and name not in regressions:
+            regressions.append(name)
+    return regressions
+
+
+def change(now, then):
+    if now is None or not then:
+        return 'n/a'
+    return f'{(now - then) / then * 100:+.0f}%'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def manage(env, *args, **kwargs):
+    return subprocess.run([sys.executable, 'manage.py', *args], cwd=ROOT, env=env, check=True, **kwargs)
+
+
+def serve(args):
+    """
+    Start the S3 stand-in and a runserver, and create a scheme open for applications.
+
+    Returns:
+        (runserver process, S3 server)
+    """
+    storage = s3stub.start()
+    env = dict(os.environ)
+    env.setdefault('DATABASES', 'SQLITE')
+    if env['DATABASES'] == 'SQLITE':
+        env.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'db.sqlite3'))
+    env.update({
+        'DEBUG': 'True',
+        'SECRET_KEY': env.get('SECRET_KEY', 'loadtest'),
+        'TRUSTED_PROXY_COUNT': '1',
+        'AWS_S3_ENDPOINT_URL': f'http://127.0.0.1:{storage.server_address[1]}',
+        'AWS_STORAGE_BUCKET_NAME': 'loadtest',
+        'AWS_ACCESS_KEY_ID': 'loadtest',
+        'AWS_SECRET_ACCESS_KEY': 'loadtest',
+        'AWS_REGION_NAME': 'us-east-1',
+    })
+    manage(env, 'migrate', '--noinput', stdout=subprocess.DEVNULL)
+    created = manage(env, 'shell', '-c', (
+        "from datetime import timedelta\n"
+        "from django.utils import timezone\n"
+        "from scheme.models import Scheme\n"
+        "now = timezone.now()\n"
+        "scheme = Scheme.objects.create(name=f'Load test {now:%Y%m%d%H%M%S%f}', company='riyasat-infra',"
+        " application_number_start=1, ews_plot_count=100, Lig_plot_count=100, reserved_price=1000,"
+        " application_open_date=now - timedelta(days=1), application_close_date=now + timedelta(days=30))\n"
+        "print(scheme.pk)"
+    ), capture_output=True, text=True)
+    args.scheme = int(created.stdout.strip().splitlines()[-1])
+
+    port = free_port()
+    args.base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    else:
+        server.terminate()
+        raise SystemExit('runserver did not start')
+    return server, storage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--scheme', type=int, help='Scheme id to apply to (created with --serve)')
+    parser.add_argument('--serve', action='store_true', help='Start a local server and S3 stand-in for the run')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--rate', type=float, default=0, help='Arrivals per second (0: closed loop)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run (0: until --iterations)')
+    parser.add_argument('--iterations', type=int, default=0, help='Stop after this many applicants')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--save', help='Write the results as JSON here')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PCT',
+                        help='With --compare, exit 1 if any p95 grows by more than PCT percent '
+                             'or any error rate grows')
+    parser.add_argument('--verbose', action='store_true', help='Show runserver output with --serve')
+    args = parser.parse_args(argv)
+
+    if not args.duration and not args.iterations:
+        parser.error('set --duration or --iterations')
+
+    server = storage = None
+    if args.serve:
+        server, storage = serve(args)
+    elif args.scheme is None:
+        parser.error('--scheme is required without --serve')
+
+    try:
+        result = execute(args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            storage.shutdown()
+
+    print_report(result)
+    if args.save:
+        Path(args.save).write_text(json.dumps(result, indent=2) + '\n')
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(result, baseline, args.fail_on_regression)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
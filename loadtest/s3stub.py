@@ -0,0 +1,137 @@
+"""
+Local S3 stand-in for load tests.
+
+Serves the object calls django-storages makes (PutObject, GetObject,
+HeadObject, DeleteObject) with path-style addressing, keeping objects under
+a local directory. Signatures are not checked. Point the app at it with:
+
+    AWS_S3_ENDPOINT_URL=http://127.0.0.1:9000 AWS_STORAGE_BUCKET_NAME=loadtest \\
+        AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x python manage.py runserver
+
+Usage:
+    python loadtest/s3stub.py --port 9000 --root /tmp/s3
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+NOT_FOUND = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>'
+)
+
+
+def decode_aws_chunked(body):
+    """Payload of an aws-chunked body (chunk sizes in hex, trailing checksums)"""
+    data = bytearray()
+    position = 0
+    while True:
+        end = body.index(b'\r\n', position)
+        size = int(body[position:end].split(b';', 1)[0], 16)
+        if size == 0:
+            return bytes(data)
+        start = end + 2
+        data += body[start:start + size]
+        position = start + size + 2
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    root = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _path(self):
+        # /<bucket>/<key>; keys may contain slashes
+        path = unquote(urlsplit(self.path).path).lstrip('/')
+        if '/' not in path:
+            return None
+        path = os.path.normpath(os.path.join(self.root, path))
+        return path if path.startswith(self.root + os.sep) else None
+
+    def _reply(self, status, body=b'', headers=None, send_body=True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+    def do_PUT(self):
+        path = self._path()
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if path is None:
+            return self._reply(400)
+        if 'aws-chunked' in self.headers.get('Content-Encoding', '') or self.headers.get('x-amz-decoded-content-length'):
+            body = decode_aws_chunked(body)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(body)
+        self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+
+    def _object(self, send_body):
+        path = self._path()
+        if path is None or not os.path.isfile(path):
+            return self._reply(404, NOT_FOUND, {'Content-Type': 'application/xml'}, send_body)
+        with open(path, 'rb') as fh:
+            body = fh.read()
+        headers = {'Content-Type': 'application/octet-stream', 'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+        if send_body:
+            return self._reply(200, body, headers)
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+    def do_GET(self):
+        self._object(send_body=True)
+
+    def do_HEAD(self):
+        self._object(send_body=False)
+
+    def do_DELETE(self):
+        path = self._path()
+        if path is not None and os.path.isfile(path):
+            os.remove(path)
+        self._reply(204)
+
+
+def start(port=0, root=None):
+    """
+    Serve in a background thread.
+
+    Returns:
+        The server; ``server.server_address`` has the bound port
+    """
+    handler = type('Handler', (S3Handler,), {'root': os.path.abspath(root or tempfile.mkdtemp(prefix='s3stub-'))})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--root', help='Directory for the objects (default: a temporary directory)')
+    args = parser.parse_args()
+
+    server = start(args.port, args.root)
+    print(f"S3 stand-in on http://127.0.0.1:{server.server_address[1]} storing in {server.RequestHandlerClass.root}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 
 from django.contrib import admin
-from .models import Scheme, SchemeFiles, Application
+from .models import (
+    Scheme, SchemeFiles, Application, LotteryDraw, SchemeQuota, ExportJob, SchemeStatusCount, StatusTransitionBatch,
+)
 from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget
 from .models import SchemeFiles, Scheme
@@ -8,15 +10,28 @@ from .models import SchemeFiles, Scheme
 from import_export.admin import ImportExportModelAdmin
 
 from django.utils import timezone
+from django.db.models import Case, CharField, Count, F, Q, Value, When
 from datetime import date, timedelta
 from decimal import Decimal
 from .tests import SchemeFactory
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
 from django.urls import path, reverse
 from django.shortcuts import redirect
 from django.conf import settings
 from s3Manager import S3Manager 
+from .paginators import EstimatedCountPaginator, ExactCountChangeList, wants_exact_count
+from .search import search_applications
+from .exports import export_filename, export_rows, streaming_csv_response, xlsx_response
+from .export_jobs import export_storage, presigned_url, queue_export
+from django.http import FileResponse
+from django import forms
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.template.response import TemplateResponse
+from .identity import linked_applications, linked_clusters
+from .workflow import TRANSITIONS, apply_transition, parse_application_numbers, updated_numbers
 
 class S3SignedUrlAdminMixin:
     """
@@ -111,6 +126,33 @@ class S3SignedUrlAdminMixin:
         )
 
 
+class QueuedExportMixin:
+    """
+    Admin actions that hand the export of the selected rows to
+    `manage.py run_export_worker` instead of building it in the request.
+    """
+
+    def _queue_export(self, request, queryset, format):
+        job = queue_export(self.resource_class, queryset, format, user=request.user)
+        url = reverse('admin:scheme_exportjob_change', args=[job.pk])
+        self.message_user(request, format_html(
+            'Export job <a href="{}">#{}</a> queued for {} row(s). The download link appears there when it finishes.',
+            url, job.pk, queryset.count()
+        ))
+
+    def queue_export_csv(self, request, queryset):
+        self._queue_export(request, queryset, ExportJob.FORMAT_CHOICES.CSV)
+    queue_export_csv.short_description = "Export selected as CSV (background)"
+
+    def queue_export_xlsx(self, request, queryset):
+        self._queue_export(request, queryset, ExportJob.FORMAT_CHOICES.XLSX)
+    queue_export_xlsx.short_description = "Export selected as Excel (background)"
+
+    def queue_export_parquet(self, request, queryset):
+        self._queue_export(request, queryset, ExportJob.FORMAT_CHOICES.PARQUET)
+    queue_export_parquet.short_description = "Export selected as Parquet (background, for analytics)"
+
+
 class SchemeFilesResource(resources.ModelResource):
 
     scheme = fields.Field(
@@ -155,16 +197,57 @@ class SchemeFilesInline(admin.TabularInline):
     # readonly_fields = ('name',)  # Auto-populated based on file_choice
 
 
+class SchemeQuotaInline(admin.TabularInline):
+    """Plots reserved per sub-category; unassigned plots are un-reserved"""
+    model = SchemeQuota
+    extra = 1
+    fields = ('plot_category', 'sub_category', 'plots')
+
+
 from import_export import resources, fields
 from import_export.widgets import DateTimeWidget
 from .models import Scheme
 
 
+def scheme_status_expression(now):
+    """Scheme status from its date ladder as a SQL expression (see SchemeResource)"""
+    return Case(
+        When(application_open_date__isnull=True, then=Value("Coming Soon")),
+        When(close_date__lt=now, then=Value("Closed")),
+        When(lottery_result_date__lt=now, then=Value("Lottery Announced")),
+        When(appeal_end_date__lt=now, then=Value("Lottery Yet to Announce")),
+        When(successful_applicants_publish_date__lt=now, then=Value("Appeal Period")),
+        When(application_close_date__lt=now, then=Value("Applications Under Review")),
+        When(application_open_date__lte=now, then=Value("Application Open")),
+        default=Value("Coming Soon"),
+        output_field=CharField(),
+    )
+
+
 class SchemeResource(resources.ModelResource):
     """
     Resource class for exporting Scheme data
     Configured for export-only operations
     """
+
+    # Computed columns are annotated by filter_export (one query for all rows);
+    # the annotated_ prefix keeps them clear of the Scheme count properties
+    lig_plot_count = fields.Field(column_name='lig_plot_count', attribute='Lig_plot_count')
+    total_plot_count = fields.Field(column_name='total_plot_count', attribute='annotated_total_plot_count')
+    total_applications = fields.Field(column_name='total_applications', attribute='annotated_total_applications')
+    pending_applications = fields.Field(column_name='pending_applications', attribute='annotated_pending_applications')
+    accepted_applications = fields.Field(column_name='accepted_applications', attribute='annotated_accepted_applications')
+    rejected_applications = fields.Field(column_name='rejected_applications', attribute='annotated_rejected_applications')
+    payment_verified_applications = fields.Field(
+        column_name='payment_verified_applications', attribute='annotated_payment_verified_applications'
+    )
+    lottery_selected_applications = fields.Field(
+        column_name='lottery_selected_applications', attribute='annotated_lottery_selected_applications'
+    )
+    lottery_waitlisted_applications = fields.Field(
+        column_name='lottery_waitlisted_applications', attribute='annotated_lottery_waitlisted_applications'
+    )
+    current_status = fields.Field(column_name='current_status', attribute='annotated_current_status')
     
     # # Custom fields with better labels and formatting
     # company = fields.Field(
@@ -291,6 +374,12 @@ class SchemeResource(resources.ModelResource):
             'application_number_start',
             'next_application_number',
             'total_applications',
+            'pending_applications',
+            'accepted_applications',
+            'rejected_applications',
+            'payment_verified_applications',
+            'lottery_selected_applications',
+            'lottery_waitlisted_applications',
             'created_at',
             'application_open_date',
             'application_close_date',
@@ -305,43 +394,27 @@ class SchemeResource(resources.ModelResource):
         export_order = fields
         use_natural_foreign_keys = True
     
-    def dehydrate_total_plot_count(self, scheme):
-        """Calculate total plot count"""
-        return scheme.ews_plot_count + scheme.Lig_plot_count
-    
-    def dehydrate_total_applications(self, scheme):
-        """Get total number of applications for this scheme"""
-        return scheme.applications.count()
-    
-    def dehydrate_current_status(self, scheme):
-        """Determine current status based on dates"""
-        from django.utils import timezone
-        now = timezone.now()
-        
-        if not scheme.application_open_date:
-            return "Coming Soon"
-        
-        if scheme.close_date and now > scheme.close_date:
-            return "Closed"
-        
-        if scheme.lottery_result_date and now > scheme.lottery_result_date:
-            return "Lottery Announced"
-        
-        if scheme.appeal_end_date and now > scheme.appeal_end_date:
-            return "Lottery Yet to Announce"
-        
-        if scheme.successful_applicants_publish_date and now > scheme.successful_applicants_publish_date:
-            return "Appeal Period"
-        
-        if scheme.application_close_date and now > scheme.application_close_date:
-            return "Applications Under Review"
-        
-        if scheme.application_open_date and now >= scheme.application_open_date:
-            return "Application Open"
-        
-        return "Coming Soon"
+    def filter_export(self, queryset, **kwargs):
+        """Compute plot totals, application counts and status in the export query itself"""
+        applications = Application.APPLICATION_STATUS_CHOICES
+        return super().filter_export(queryset, **kwargs).annotate(
+            annotated_total_plot_count=F('ews_plot_count') + F('Lig_plot_count'),
+            annotated_total_applications=Count('applications'),
+            annotated_pending_applications=Count('applications', filter=Q(applications__application_status=applications.PENDING)),
+            annotated_accepted_applications=Count('applications', filter=Q(applications__application_status=applications.ACCEPTED)),
+            annotated_rejected_applications=Count('applications', filter=Q(applications__application_status=applications.REJECTED)),
+            annotated_payment_verified_applications=Count(
+                'applications', filter=Q(applications__payment_status=Application.PAYMENT_STATUS_CHOICES.VERIFIED)
+            ),
+            annotated_lottery_selected_applications=Count(
+                'applications', filter=Q(applications__lottery_status=Application.LOTTERY_STATUS_CHOICES.SELECTED)
+            ),
+            annotated_lottery_waitlisted_applications=Count(
+                'applications', filter=Q(applications__lottery_status=Application.LOTTERY_STATUS_CHOICES.WAITLISTED)
+            ),
+            annotated_current_status=scheme_status_expression(timezone.now()),
+        )
     
-    # Prevent any import operations
     def before_import_row(self, row, **kwargs):
         """Block all import operations"""
         raise NotImplementedError("Import operations are disabled for this resource")
@@ -351,16 +424,17 @@ class SchemeResource(resources.ModelResource):
         return True
 
 @admin.register(Scheme)
-class SchemeAdmin(ImportExportModelAdmin):
+class SchemeAdmin(QueuedExportMixin, ImportExportModelAdmin):
     resource_class = SchemeResource
+    actions = ['queue_export_csv', 'queue_export_xlsx']
     list_display = ('id', 'name', 'company', 'get_status', 'ews_plot_count', 'Lig_plot_count', 'created_at', 
         'next_application_number',)
     list_filter = ('company', 'created_at', 'application_open_date')
     search_fields = ('name', 'address', 'phone')
     readonly_fields = ('created_at', 'id')
     
-    # Add inline for files
-    inlines = [SchemeFilesInline]
+    # Add inline for files and reserved quotas
+    inlines = [SchemeFilesInline, SchemeQuotaInline]
     
     # Organize fields into fieldsets
     fieldsets = (
@@ -404,23 +478,7 @@ This ensures that application numbers do not overlap and remain uniquely identif
 
     def get_status(self, obj):
         """Calculate current status based on dates"""
-        from django.utils import timezone
-        now = timezone.now()
-        
-        if obj.close_date and now > obj.close_date:
-            return "Closed"
-        elif obj.lottery_result_date and now > obj.lottery_result_date:
-            return "Lottery Announced"
-        elif obj.appeal_end_date and now > obj.appeal_end_date:
-            return "Lottery Pending"
-        elif obj.successful_applicants_publish_date and now > obj.successful_applicants_publish_date:
-            return "Appeal Period"
-        elif obj.application_close_date and now > obj.application_close_date:
-            return "Applications Under Review"
-        elif obj.application_open_date and now >= obj.application_open_date:
-            return "Applications Open"
-        else:
-            return "Coming Soon"
+        return obj.current_status()
     
     get_status.short_description = 'Current Status'
     
@@ -506,15 +564,81 @@ class ApplicationResource(resources.ModelResource):
     # Prevent any import operations
     def before_import_row(self, row, **kwargs):
         """Block all import operations"""
-        raise NotImplementedError("Import operations are disabled for this resource")
+        # Imports go through the bulk pipeline: manage.py import_applications
+        raise NotImplementedError("Import operations are disabled for this resource; use manage.py import_applications")
     
     def skip_row(self, instance, original):
         """Skip all rows during import"""
         return True
 
 
-class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
+class TransitionActionForm(ActionForm):
+    """Changelist action bar with a remark for the status transition actions"""
+    remark = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'placeholder': 'Remark (required for rejection)', 'size': 40}),
+    )
+
+
+class BulkTransitionForm(forms.Form):
+    """Status transition for a list of application numbers of one scheme"""
+    transition = forms.ChoiceField(choices=[(name, t.label) for name, t in TRANSITIONS.items()])
+    scheme = forms.ModelChoiceField(queryset=Scheme.objects.order_by('-created_at'))
+    numbers_file = forms.FileField(
+        required=False, label='Application numbers file',
+        help_text='Text or single column CSV file of application numbers',
+    )
+    numbers = forms.CharField(
+        required=False, widget=forms.Textarea(attrs={'rows': 6}), label='Application numbers',
+        help_text='Separated by commas, spaces or new lines',
+    )
+    remark = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 2}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        text = cleaned_data.get('numbers') or ''
+        upload = cleaned_data.get('numbers_file')
+        if upload:
+            text += '\n' + upload.read().decode('utf-8-sig', errors='replace')
+
+        numbers, invalid = parse_application_numbers(text)
+        if invalid:
+            raise ValidationError(f"Not application numbers: {', '.join(invalid[:10])}")
+        if not numbers:
+            raise ValidationError("Give the application numbers in the text box or as a file")
+        cleaned_data['application_numbers'] = numbers
+
+        transition = TRANSITIONS.get(cleaned_data.get('transition'))
+        if transition and transition.requires_remark and not (cleaned_data.get('remark') or '').strip():
+            self.add_error('remark', f"{transition.label} requires a remark")
+        return cleaned_data
+
+
+class IdentityLinkFilter(admin.SimpleListFilter):
+    """Applications whose applicant also appears in other applications"""
+    title = 'identity links'
+    parameter_name = 'identity_links'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('linked', 'Linked to other applications'),
+            ('cross_scheme', 'Linked across schemes'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'linked':
+            clusters = linked_clusters()
+        elif self.value() == 'cross_scheme':
+            clusters = linked_clusters(min_schemes=2)
+        else:
+            return queryset
+        return queryset.filter(identity_cluster__in=clusters.values('identity_cluster'))
+
+
+class ApplicationAdmin(S3SignedUrlAdminMixin, QueuedExportMixin, ImportExportModelAdmin):
     resource_class = ApplicationResource
+    action_form = TransitionActionForm
+    import_export_change_list_template = 'admin/scheme/application/change_list.html'
     # List display
     list_display = [
         'application_number',
@@ -531,6 +655,7 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
         'application_status',
         'payment_status',
         'lottery_status',
+        'transaction_reused',
         'payment_proof_link',
         # 'payment_proof',
     ]
@@ -545,6 +670,8 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
         'payment_status',
         'lottery_status',
         'payment_mode',
+        'transaction_reused',
+        IdentityLinkFilter,
         'id_type',
         'application_submission_date',
         
@@ -571,7 +698,7 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
     # Fieldsets for organized form view
     fieldsets = (
         ('Scheme Information', {
-            'fields': ('scheme',)
+            'fields': ('scheme', 'linked_applications_link')
         }),
         ('Basic Details', {
             'fields': ('application_number', 'applicant_name', 'father_or_husband_name', 'dob', 'mobile_number', 'email')
@@ -598,6 +725,7 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
             'fields': (
                 'payment_mode',
                 'dd_id_or_transaction_id',
+                'transaction_reused',
                 'dd_date_or_transaction_date',
                 'dd_amount_or_transaction_amount',
                 'payer_account_holder_name',
@@ -638,6 +766,8 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
         'processing_fees',
         'total_payable_amount',
         'application_submission_date',
+        'transaction_reused',
+        'linked_applications_link',
         'created_at',
         'updated_at',
     ]
@@ -647,6 +777,13 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
     
     # Items per page
     list_per_page = 50
+    # __str__ and the scheme column read the scheme of every row
+    list_select_related = ('scheme',)
+
+    # Large result sets are counted from planner estimates ("about N"), and
+    # the unfiltered total is never counted; ?exact_count=1 forces COUNT(*)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     # Date hierarchy
     date_hierarchy = 'application_submission_date'
@@ -655,11 +792,81 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
     actions = [
         # 'export_as_csv',
         # 'export_as_excel',
+        'stream_export_csv',
+        'stream_export_xlsx',
+        'queue_export_csv',
+        'queue_export_xlsx',
+        'queue_export_parquet',
         'mark_payment_verified',
+        'mark_payment_failed',
         'mark_application_accepted',
         'mark_application_rejected',
     ]
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'bulk-transition/',
+                self.admin_site.admin_view(self.bulk_transition_view),
+                name='scheme_application_bulk_transition',
+            ),
+        ]
+        return custom_urls + urls
+
+    def bulk_transition_view(self, request):
+        """Apply a status transition to uploaded application numbers"""
+        if not self.has_change_permission(request):
+            return redirect(reverse('admin:scheme_application_changelist'))
+
+        form = BulkTransitionForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            numbers = form.cleaned_data['application_numbers']
+            queryset = Application.objects.filter(
+                scheme=form.cleaned_data['scheme'], application_number__in=numbers,
+            )
+            batch = apply_transition(
+                form.cleaned_data['transition'], queryset,
+                remark=form.cleaned_data['remark'], user=request.user, source='upload',
+            )
+            # Numbers that matched no application of the scheme count as skipped
+            batch.requested = len(numbers)
+            batch.skipped = batch.requested - batch.updated
+            batch.save(update_fields=['requested', 'skipped'])
+            self._report_batch(request, batch)
+            return redirect(reverse('admin:scheme_statustransitionbatch_change', args=[batch.pk]))
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Bulk status transition',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/scheme/application/bulk_transition.html', context)
+
+    def get_changelist(self, request, **kwargs):
+        return ExactCountChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # Identifier-shaped terms go to B-tree lookups and names to the text
+        # index instead of icontains over every search field
+        return search_applications(queryset, search_term), False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            exact=wants_exact_count(request),
+        )
+
+    def linked_applications_link(self, obj):
+        """Changelist of the applications in the same identity cluster"""
+        linked = linked_applications(obj).count()
+        if not linked:
+            return "-"
+        url = reverse('admin:scheme_application_changelist') + f'?identity_cluster={obj.identity_cluster}'
+        return format_html('<a href="{}">{} linked application(s)</a>', url, linked)
+    linked_applications_link.short_description = 'Linked applications'
+
     def payment_proof_link(self, obj):
         """Generate secure signed URL link for payment proof"""
         return self.create_signed_link(obj, 'payment_proof')
@@ -786,23 +993,55 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
     #     return response
     # # export_as_excel.short_description = "Export selected as Excel"
     
-    # Bulk action: Mark payment as verified
+    # Streaming exports: constant memory for any number of selected rows
+    def stream_export_csv(self, request, queryset):
+        rows = export_rows(self.resource_class(), queryset)
+        return streaming_csv_response(rows, export_filename('applications', 'csv'))
+    stream_export_csv.short_description = "Export selected as CSV (streaming)"
+
+    def stream_export_xlsx(self, request, queryset):
+        rows = export_rows(self.resource_class(), queryset)
+        try:
+            return xlsx_response(rows, export_filename('applications', 'xlsx'))
+        except ImportError:
+            self.message_user(request, "Please install openpyxl: pip install openpyxl", level='error')
+    stream_export_xlsx.short_description = "Export selected as Excel (streaming)"
+
+    # Status transition actions: chunked, validated UPDATEs with an audit batch
+    def _apply_transition(self, request, queryset, name):
+        try:
+            batch = apply_transition(
+                name, queryset, remark=request.POST.get('remark', ''), user=request.user, source='admin action',
+            )
+        except ValidationError as e:
+            self.message_user(request, e.messages[0], level='error')
+            return
+        self._report_batch(request, batch)
+
+    def _report_batch(self, request, batch):
+        label = TRANSITIONS[batch.transition].label.lower()
+        self.message_user(request, f'{label}: {batch.updated} application(s) updated.')
+        if batch.skipped:
+            self.message_user(
+                request, f'{batch.skipped} application(s) skipped: not found or not in a state that allows this.',
+                level='warning',
+            )
+
     def mark_payment_verified(self, request, queryset):
-        updated = queryset.update(payment_status='VERIFIED')
-        self.message_user(request, f'{updated} application(s) marked as payment verified.')
+        self._apply_transition(request, queryset, 'verify_payment')
     mark_payment_verified.short_description = "Mark payment as verified"
-    
-    # Bulk action: Mark application as accepted
+
+    def mark_payment_failed(self, request, queryset):
+        self._apply_transition(request, queryset, 'fail_payment')
+    mark_payment_failed.short_description = "Mark payment as failed"
+
     def mark_application_accepted(self, request, queryset):
-        updated = queryset.update(application_status='ACCEPTED')
-        self.message_user(request, f'{updated} application(s) marked as accepted.')
+        self._apply_transition(request, queryset, 'accept')
     mark_application_accepted.short_description = "Mark application as accepted"
-    
-    # Bulk action: Mark application as rejected
+
     def mark_application_rejected(self, request, queryset):
-        updated = queryset.update(application_status='REJECTED')
-        self.message_user(request, f'{updated} application(s) marked as rejected.')
-    mark_application_rejected.short_description = "Mark application as rejected"
+        self._apply_transition(request, queryset, 'reject')
+    mark_application_rejected.short_description = "Mark application as rejected (needs a remark)"
     
     # Custom save behavior
     def save_model(self, request, obj, form, change):
@@ -814,6 +1053,120 @@ class ApplicationAdmin(S3SignedUrlAdminMixin, ImportExportModelAdmin):
 admin.site.register(Application, ApplicationAdmin)
 
 
+@admin.register(LotteryDraw)
+class LotteryDrawAdmin(admin.ModelAdmin):
+    """Read-only view of conducted draws; draws are created by `manage.py conduct_lottery`"""
+    list_display = ('id', 'scheme', 'seed', 'algorithm_version', 'artefact_digest', 'conducted_at')
+    list_filter = ('scheme',)
+    readonly_fields = ('scheme', 'seed', 'algorithm_version', 'redraw_reason', 'artefact', 'artefact_digest',
+                       'conducted_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StatusTransitionBatch)
+class StatusTransitionBatchAdmin(admin.ModelAdmin):
+    """Audit trail of bulk status transitions"""
+    list_display = ('id', 'transition', 'to_value', 'updated', 'skipped', 'source', 'performed_by', 'performed_at')
+    list_filter = ('transition', 'source')
+    list_select_related = ('performed_by',)
+    readonly_fields = ('transition', 'field', 'to_value', 'remark', 'source', 'requested', 'updated', 'skipped',
+                       'performed_by', 'performed_at', 'application_number_list')
+
+    def application_number_list(self, obj):
+        numbers = updated_numbers(obj)
+        names = dict(Scheme.objects.filter(pk__in=numbers).values_list('pk', 'name'))
+        return format_html_join(
+            mark_safe('<br>'), '{}: {}',
+            ((names.get(scheme_id, 'Unknown scheme'), ', '.join(map(str, scheme_numbers)))
+             for scheme_id, scheme_numbers in numbers.items()),
+        )
+    application_number_list.short_description = 'Updated application numbers'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SchemeStatusCount)
+class SchemeStatusCountAdmin(admin.ModelAdmin):
+    """Per-scheme status totals; rebuilt with `manage.py rebuild_status_counts`"""
+    list_display = ('scheme', 'field', 'value', 'count')
+    list_filter = ('field', 'scheme')
+    list_select_related = ('scheme',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """Progress and downloads of background exports; jobs are queued from the export actions"""
+    list_display = ('id', 'resource_name', 'format', 'status', 'progress_display', 'requested_by',
+                    'created_at', 'finished_at', 'download_link')
+    list_filter = ('status', 'format')
+    list_select_related = ('requested_by',)
+    readonly_fields = ('resource_path', 'format', 'status', 'total_rows', 'processed_rows', 'file_name',
+                       'error', 'requested_by', 'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'attempts',
+                       'download_link')
+    exclude = ('object_ids',)
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='scheme_exportjob_download',
+            ),
+        ]
+        return custom_urls + urls
+
+    def download_view(self, request, pk):
+        job = self.get_object(request, pk)
+        if not job or not job.file_name:
+            self.message_user(request, "Export file not found", level='error')
+            return redirect(reverse('admin:scheme_exportjob_changelist'))
+
+        # S3 exports go through a short-lived presigned link, anything else
+        # (local storage) is served from here
+        signed_url = presigned_url(job, expiration=300)
+        if signed_url:
+            return redirect(signed_url)
+        return FileResponse(export_storage().open(job.file_name), as_attachment=True,
+                            filename=job.file_name.rsplit('/', 1)[-1])
+
+    def resource_name(self, obj):
+        return obj.resource_path.rsplit('.', 1)[-1]
+    resource_name.short_description = 'Resource'
+
+    def progress_display(self, obj):
+        return f"{obj.progress}% ({obj.processed_rows}/{obj.total_rows})"
+    progress_display.short_description = 'Progress'
+
+    def download_link(self, obj):
+        if obj.status != ExportJob.STATUS_CHOICES.DONE:
+            return "-"
+        url = reverse('admin:scheme_exportjob_download', args=[obj.pk])
+        return format_html('<a href="{}">Download</a>', url)
+    download_link.short_description = 'File'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 
 
 
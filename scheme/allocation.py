@@ -0,0 +1,183 @@
+from .models import Application, SchemeQuota
+
+
+UN_RESERVED = Application.SUB_CATEGORY_CHOICES.UN_RESERVED.value
+
+# Seats of a reserved quota that its own applicants cannot fill are released to
+# the un-reserved pool in this order. When the pool cannot be filled either,
+# the seats released last are the ones left vacant.
+SPILLOVER_ORDER = (
+    Application.SUB_CATEGORY_CHOICES.SC.value,
+    Application.SUB_CATEGORY_CHOICES.ST.value,
+    Application.SUB_CATEGORY_CHOICES.SOLDIER_WIDOW_DEPENDENT.value,
+    Application.SUB_CATEGORY_CHOICES.SOLDIER_HANDICAPPED.value,
+    Application.SUB_CATEGORY_CHOICES.OTHER_SOLDIERS.value,
+    Application.SUB_CATEGORY_CHOICES.UN_RESERVED_HANDICAP.value,
+    Application.SUB_CATEGORY_CHOICES.UN_RESERVED_DLS.value,
+    Application.SUB_CATEGORY_CHOICES.GOV_EMPLOYEES.value,
+    Application.SUB_CATEGORY_CHOICES.JOURNALIST.value,
+    Application.SUB_CATEGORY_CHOICES.TRANSGENDER.value,
+)
+
+
+def quota_table(scheme):
+    """
+    Plots per (plot_category, sub_category) for a scheme.
+
+    Plots of a category that are not assigned to any quota row go to the
+    un-reserved quota, so a scheme without quota rows behaves as fully
+    un-reserved.
+
+    Returns:
+        Dict like {'EWS': {'sc': 2, 'un-reserved': 8}, 'LIG': {...}}
+    """
+    table = {
+        Application.PLOT_CATEGORY_CHOICES.EWS.value: {},
+        Application.PLOT_CATEGORY_CHOICES.LIG.value: {},
+    }
+    for plot_category, sub_category, plots in SchemeQuota.objects.filter(scheme=scheme).values_list(
+        'plot_category', 'sub_category', 'plots'
+    ):
+        table[plot_category][sub_category] = plots
+
+    totals = {
+        Application.PLOT_CATEGORY_CHOICES.EWS.value: scheme.ews_plot_count,
+        Application.PLOT_CATEGORY_CHOICES.LIG.value: scheme.Lig_plot_count,
+    }
+    for plot_category, quotas in table.items():
+        unassigned = totals[plot_category] - sum(quotas.values())
+        if unassigned > 0:
+            quotas[UN_RESERVED] = quotas.get(UN_RESERVED, 0) + unassigned
+    return table
+
+
+def _release_order(quotas):
+    listed = [category for category in SPILLOVER_ORDER if category in quotas]
+    others = sorted(category for category in quotas if category not in SPILLOVER_ORDER and category != UN_RESERVED)
+    return listed + others
+
+
+class Allocation:
+    """
+    Result of allocating one plot category.
+
+    Attributes:
+        selected: List of (application_number, quota) in rank order; quota is
+            the sub-category whose seat the applicant got
+        unseated: Application numbers that got no seat, in rank order
+        spillover: List of (sub_category, released, filled) in release order
+        vacant: Dict of sub_category -> seats left empty
+    """
+
+    def __init__(self, selected, unseated, spillover, vacant):
+        self.selected = selected
+        self.unseated = unseated
+        self.spillover = spillover
+        self.vacant = vacant
+
+
+def _spill(quotas, reserved_filled, open_demand):
+    """
+    Release unfilled reserved seats into the un-reserved pool.
+
+    Args:
+        quotas: Dict of sub_category -> plots
+        reserved_filled: Dict of sub_category -> seats filled by own applicants
+        open_demand: Applicants competing for un-reserved seats
+
+    Returns:
+        Tuple of (seats taken from the pool, spillover list, vacant dict)
+    """
+    pool = quotas.get(UN_RESERVED, 0)
+    taken = min(pool, open_demand)
+    vacant = {UN_RESERVED: pool - taken}
+    open_demand -= taken
+
+    spillover = []
+    for category in _release_order(quotas):
+        released = quotas[category] - reserved_filled.get(category, 0)
+        if released <= 0:
+            continue
+        filled = min(released, open_demand)
+        open_demand -= filled
+        taken += filled
+        spillover.append((category, released, filled))
+        vacant[category] = released - filled
+    return taken, spillover, vacant
+
+
+def allocate(quotas, ranked_applicants):
+    """
+    Allocate the plots of one plot category.
+
+    Each reserved quota is first filled by its own applicants in rank order.
+    Everyone left over (un-reserved applicants and reserved applicants beyond
+    their quota) then competes in rank order for the un-reserved seats plus
+    any reserved seats that spilled over. Runs in O(n) over the applicants.
+
+    Args:
+        quotas: Dict of sub_category -> plots
+        ranked_applicants: Iterable of (application_number, sub_category),
+            best rank first
+
+    Returns:
+        Allocation
+    """
+    remaining = {category: plots for category, plots in quotas.items() if category != UN_RESERVED}
+    reserved_filled = {}
+    ranked = []
+    seated = {}
+    waiting = []
+
+    for application_number, sub_category in ranked_applicants:
+        ranked.append(application_number)
+        if sub_category != UN_RESERVED and remaining.get(sub_category, 0) > 0:
+            remaining[sub_category] -= 1
+            reserved_filled[sub_category] = reserved_filled.get(sub_category, 0) + 1
+            seated[application_number] = sub_category
+        else:
+            waiting.append(application_number)
+
+    taken, spillover, vacant = _spill(quotas, reserved_filled, len(waiting))
+    for application_number in waiting[:taken]:
+        seated[application_number] = UN_RESERVED
+
+    return Allocation(
+        selected=[(number, seated[number]) for number in ranked if number in seated],
+        unseated=waiting[taken:],
+        spillover=spillover,
+        vacant=vacant,
+    )
+
+
+def seat_summary(quotas, demand):
+    """
+    Count-only version of ``allocate`` for the "seats remaining" API.
+
+    Args:
+        quotas: Dict of sub_category -> plots
+        demand: Dict of sub_category -> number of eligible applicants
+
+    Returns:
+        List of dicts with quota, applicants, filled and remaining per
+        sub-category (``filled`` includes seats taken through spillover)
+    """
+    reserved_filled = {
+        category: min(plots, demand.get(category, 0))
+        for category, plots in quotas.items() if category != UN_RESERVED
+    }
+    open_demand = sum(demand.values()) - sum(reserved_filled.values())
+    _, _, vacant = _spill(quotas, reserved_filled, open_demand)
+
+    rows = []
+    for category in sorted(set(quotas) | set(demand)):
+        plots = quotas.get(category, 0)
+        remaining = vacant.get(category, 0)
+        rows.append({
+            'sub_category': category,
+            'quota': plots,
+            'applicants': demand.get(category, 0),
+            'filled': plots - remaining,
+            'remaining': remaining,
+        })
+    return rows
@@ -5,5 +5,7 @@ class SchemeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scheme'
 
-    # def ready(self):
-    #     import scheme.signals
+    def ready(self):
+        import scheme.signals
+        from scheme.metrics import instrument
+        instrument()
@@ -0,0 +1,99 @@
+"""
+Async versions of the applicant status and PDF lookups, served under ASGI.
+
+Same requests and responses as ApplicationStatusView and
+ApplicationPDFGetter, through the async cache and ORM APIs; scheme/urls.py
+routes to them when settings.ASYNC_VIEWS is set. See OTP/async_views.py.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from rest_framework import status
+
+from OTP.async_views import AsyncAPIView
+
+from .models import Application
+from .serializers import ApplicationStatusRequestSerializer, PDFRequestSerializer
+from .views import ApplicationStatusView, application_pdf_bytes
+
+
+class AsyncApplicationStatusView(AsyncAPIView):
+    """
+    Async ApplicationStatusView.
+
+    POST /scheme/api/application/status/
+    Body: {
+        "scheme": 3,
+        "application_number": 4000012,
+        "mobile_number": "9876543210"
+    }
+    """
+
+    async def post(self, request):
+        serializer = ApplicationStatusRequestSerializer(data=self.request_data(request))
+        if not serializer.is_valid():
+            return self.respond(
+                {"error": "Invalid input", "details": serializer.errors},
+                status.HTTP_400_BAD_REQUEST
+            )
+        key = serializer.validated_data
+
+        cache_key = ApplicationStatusView.cache_key(key)
+        statuses = await cache.aget(cache_key)
+        if statuses is None:
+            statuses = await anext(aiter(ApplicationStatusView.lookup(key)), None) or ApplicationStatusView.NOT_FOUND
+            await cache.aset(cache_key, statuses, ApplicationStatusView.cache_seconds())
+
+        if statuses == ApplicationStatusView.NOT_FOUND:
+            return self.respond(
+                {"error": "Application not found"},
+                status.HTTP_404_NOT_FOUND
+            )
+
+        return self.respond(ApplicationStatusView.payload(key, statuses), status.HTTP_200_OK)
+
+
+class AsyncApplicationPDFGetter(AsyncAPIView):
+    """
+    Async ApplicationPDFGetter.
+
+    POST /scheme/api/application/pdf
+    Body: {
+        "application_number": "09098123456",
+        "mobile_number": "9876543210"
+    }
+    """
+
+    async def post(self, request):
+        serializer = PDFRequestSerializer(data=self.request_data(request))
+        if not serializer.is_valid():
+            return self.respond(
+                {"error": "Invalid input", "details": serializer.errors},
+                status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            application = await Application.objects.aget(
+                application_number=serializer.validated_data['application_number']
+            )
+        except Application.DoesNotExist:
+            return self.respond(
+                {"error": "Application not found"},
+                status.HTTP_404_NOT_FOUND
+            )
+
+        if application.mobile_number != serializer.validated_data['mobile_number']:
+            return self.respond(
+                {"error": "Mobile number does not match"},
+                status.HTTP_403_FORBIDDEN
+            )
+
+        # Rendering is CPU and storage work; keep it off the event loop
+        pdf_bytes = await sync_to_async(application_pdf_bytes)(application)
+        return self.respond(
+            {
+                'message': 'Application retrieved successfully',
+                'pdf_bytes': pdf_bytes
+            },
+            status.HTTP_200_OK
+        )
@@ -0,0 +1,232 @@
+"""
+Background export jobs.
+
+Admin actions queue an ExportJob holding the primary keys of the selected
+rows. ``manage.py run_export_worker`` claims queued jobs, writes the file with
+the streaming writers from scheme/exports.py into the ``exports`` storage and
+records progress on the job as rows are written. Rows are read back by key in
+chunks, in key order, so a job does not depend on how the query that picked
+them was built.
+"""
+
+import io
+import logging
+import posixpath
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from s3Manager import S3Manager
+
+from .exports import (
+    EXPORT_CHUNK_SIZE, export_filename, export_rows, parquet_columns, write_csv, write_parquet, write_xlsx,
+)
+from .models import ExportJob
+from .workflow import chunked, pack_numbers, unpack_numbers
+
+logger = logging.getLogger(__name__)
+
+
+# Rows written between progress updates
+PROGRESS_EVERY = EXPORT_CHUNK_SIZE
+
+
+def export_storage():
+    return storages['exports']
+
+
+def queue_export(resource_class, queryset, format, user=None):
+    """
+    Queue an export of a queryset.
+
+    Args:
+        resource_class: import-export Resource class
+        queryset: Rows to export
+        format: ExportJob.FORMAT_CHOICES value
+        user: User who asked for the export
+
+    Returns:
+        The queued ExportJob
+    """
+    pks = queryset.order_by().values_list('pk', flat=True).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return ExportJob.objects.create(
+        resource_path=f'{resource_class.__module__}.{resource_class.__qualname__}',
+        format=format,
+        object_ids=pack_numbers(list(pks)),
+        requested_by=user,
+    )
+
+
+def sweep_stale_jobs():
+    """
+    Deal with running jobs whose worker went away.
+
+    A job is stale when its heartbeat is older than EXPORT_JOB_STALE_SECONDS.
+    It is queued again, or failed once it has had EXPORT_JOB_MAX_ATTEMPTS
+    runs.
+
+    Returns:
+        Tuple of (requeued, failed) counts
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'EXPORT_JOB_STALE_SECONDS', 900))
+    max_attempts = getattr(settings, 'EXPORT_JOB_MAX_ATTEMPTS', 3)
+    stale = ExportJob.objects.filter(status=ExportJob.STATUS_CHOICES.RUNNING, heartbeat_at__lt=cutoff)
+
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=ExportJob.STATUS_CHOICES.FAILED,
+        error=f'The worker stopped responding on each of {max_attempts} attempts',
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=ExportJob.STATUS_CHOICES.QUEUED,
+        processed_rows=0,
+    )
+    if failed or requeued:
+        logger.warning(f"Export jobs with a stale worker: {requeued} requeued, {failed} failed")
+    return requeued, failed
+
+
+def claim_next_job():
+    """
+    Mark the oldest queued job as running and return it.
+
+    Locked rows are skipped, so several workers can poll the same table.
+
+    Returns:
+        ExportJob, or None when nothing is queued
+    """
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ExportJob.STATUS_CHOICES.QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ExportJob.STATUS_CHOICES.RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+
+def _this_run(job):
+    """
+    The job's row while this worker's run still owns it.
+
+    Once sweep_stale_jobs() requeues the job, or another worker claims it
+    again, the status or attempt count differs and updates match nothing.
+    """
+    return ExportJob.objects.filter(pk=job.pk, status=ExportJob.STATUS_CHOICES.RUNNING, attempts=job.attempts)
+
+
+def _heartbeat(job, **fields):
+    return _this_run(job).update(heartbeat_at=timezone.now(), **fields)
+
+
+def _track_progress(job, rows, header=True):
+    rows = iter(rows)
+    if header:
+        yield next(rows)
+    processed = 0
+    for row in rows:
+        yield row
+        processed += 1
+        if processed % PROGRESS_EVERY == 0:
+            _heartbeat(job, processed_rows=processed)
+    job.processed_rows = processed
+
+
+def _export_rows(resource, pks):
+    """export_rows() over the given keys, one chunk of keys per query"""
+    yield resource.get_export_headers()
+    for chunk in chunked(pks, EXPORT_CHUNK_SIZE):
+        rows = export_rows(resource, resource.get_queryset().filter(pk__in=chunk).order_by('pk'))
+        next(rows)
+        yield from rows
+
+
+def _export_values(resource, pks, columns):
+    for chunk in chunked(pks, EXPORT_CHUNK_SIZE):
+        yield from resource.get_queryset().filter(pk__in=chunk).order_by('pk').values_list(*columns)
+
+
+def run_job(job):
+    """
+    Build the export file of a claimed job.
+
+    Failures are recorded on the job instead of raised. The heartbeat is
+    refreshed around the file save and upload, which write no rows, and the
+    result is only written while this run still owns the job; if the job was
+    requeued meanwhile the result, and the uploaded file, are dropped.
+    """
+    try:
+        resource = import_string(job.resource_path)()
+        pks = unpack_numbers(job.object_ids)
+
+        job.total_rows = len(pks)
+        _heartbeat(job, total_rows=job.total_rows)
+
+        filename = export_filename(f'{resource._meta.model._meta.model_name}s', job.format)
+        with tempfile.TemporaryFile() as fh:
+            if job.format == ExportJob.FORMAT_CHOICES.PARQUET:
+                columns = parquet_columns(resource)
+                values = _export_values(resource, pks, columns)
+                write_parquet(_track_progress(job, values, header=False), fh, resource._meta.model, columns)
+            elif job.format == ExportJob.FORMAT_CHOICES.XLSX:
+                write_xlsx(_track_progress(job, _export_rows(resource, pks)), fh)
+            else:
+                text = io.TextIOWrapper(fh, encoding='utf-8', newline='')
+                write_csv(_track_progress(job, _export_rows(resource, pks)), text)
+                text.flush()
+                text.detach()
+            _heartbeat(job)
+            fh.seek(0)
+            job.file_name = export_storage().save(f'{job.pk}/{filename}', File(fh))
+            _heartbeat(job)
+        job.status = ExportJob.STATUS_CHOICES.DONE
+    except Exception as e:
+        logger.exception(f"Export job {job.pk} failed")
+        job.status = ExportJob.STATUS_CHOICES.FAILED
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    written = _this_run(job).update(
+        status=job.status,
+        error=job.error,
+        file_name=job.file_name,
+        processed_rows=job.processed_rows,
+        finished_at=job.finished_at,
+    )
+    if not written:
+        logger.warning(f"Export job {job.pk} was requeued while attempt {job.attempts} ran; dropping its result")
+        if job.file_name:
+            export_storage().delete(job.file_name)
+    return job
+
+
+def presigned_url(job, expiration=300):
+    """
+    Presigned S3 link to a finished export.
+
+    Returns:
+        URL string, or None when the exports storage is not S3 (the file is
+        then served by the admin itself)
+    """
+    storage = export_storage()
+    if not job.file_name or not isinstance(storage, S3Boto3Storage):
+        return None
+    key = posixpath.join(storage.location, job.file_name) if storage.location else job.file_name
+    return S3Manager().generate_presigned_url(
+        bucket_name=storage.bucket_name,
+        object_name=key,
+        expiration=expiration,
+    )
@@ -0,0 +1,295 @@
+"""
+Applicant identity linking across schemes.
+
+Applications that share a normalised Aadhaar number, mobile number, bank
+account (with IFSC) or email address belong to the same identity cluster.
+Clusters are a union-find kept in the database:
+
+    IdentityKey           one row per (kind, keyed hash of the value) -> cluster
+    Application.identity_cluster
+                          the cluster of each application
+
+A cluster is named by the smallest application pk in it. Linking a batch of
+applications looks up the IdentityKey rows of their keys, unions them in
+memory with the clusters found, and relabels merged clusters with two
+UPDATEs. Memory is bounded by the batch size, not by the table, so the
+full rebuild (``manage.py link_identities --rebuild``) runs the same code
+over the table in chunks.
+
+Values are hashed with HMAC-SHA256 under settings.IDENTITY_HASH_KEY: a plain
+hash of a 10 digit mobile or 12 digit Aadhaar number is reversed by trying
+every value.
+"""
+
+import hashlib
+import hmac
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Application, IdentityKey
+
+
+LINK_CHUNK_SIZE = 2000
+
+IDENTITY_FIELDS = (
+    'aadhar_number', 'mobile_number', 'applicant_account_number', 'applicant_bank_ifsc', 'email',
+)
+
+# Providers that ignore dots in the local part of an address
+DOTLESS_EMAIL_DOMAINS = ('gmail.com', 'googlemail.com')
+
+
+def normalise_mobile(value):
+    digits = re.sub(r'\D', '', value or '')
+    # Drop the country code or trunk prefix (+91, 091, 0)
+    return digits[-10:] if len(digits) >= 10 else ''
+
+
+def normalise_aadhaar(value):
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+
+
+def normalise_account(account_number, ifsc):
+    account = re.sub(r'[^0-9A-Z]', '', (account_number or '').upper()).lstrip('0')
+    ifsc = re.sub(r'[^0-9A-Z]', '', (ifsc or '').upper())
+    # The account number is unique within a bank, i.e. the IFSC's first
+    # four letters
+    return f'{ifsc[:4]}:{account}' if account and ifsc else ''
+
+
+def normalise_email(value):
+    value = (value or '').strip().lower()
+    if '@' not in value:
+        return ''
+    local, domain = value.rsplit('@', 1)
+    local = local.split('+', 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace('.', '')
+        domain = 'gmail.com'
+    return f'{local}@{domain}'
+
+
+def identity_digest(kind, value):
+    """HMAC-SHA256 hex digest of a normalised identifier"""
+    if not settings.IDENTITY_HASH_KEY:
+        raise ImproperlyConfigured("IDENTITY_HASH_KEY must be set to link applicant identities")
+    return hmac.new(settings.IDENTITY_HASH_KEY.encode(), f'{kind}:{value}'.encode(), hashlib.sha256).hexdigest()
+
+
+def identity_keys(row):
+    """
+    Hashed identity keys of an application.
+
+    Args:
+        row: Mapping with the IDENTITY_FIELDS
+
+    Returns:
+        Set of (kind, digest); values are stored as keyed hashes so IdentityKey
+        cannot be reversed without IDENTITY_HASH_KEY
+    """
+    values = {
+        IdentityKey.KIND_CHOICES.AADHAAR: normalise_aadhaar(row['aadhar_number']),
+        IdentityKey.KIND_CHOICES.MOBILE: normalise_mobile(row['mobile_number']),
+        IdentityKey.KIND_CHOICES.BANK_ACCOUNT: normalise_account(
+            row['applicant_account_number'], row['applicant_bank_ifsc']
+        ),
+        IdentityKey.KIND_CHOICES.EMAIL: normalise_email(row['email']),
+    }
+    return {
+        (kind, identity_digest(kind, value))
+        for kind, value in values.items() if value
+    }
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, node):
+        root = self.parent.setdefault(node, node)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression
+        while node != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            # Keep the smaller id as the root so clusters are named by their
+            # oldest application
+            if b < a:
+                a, b = b, a
+            self.parent[b] = a
+
+
+def link_rows(rows):
+    """
+    Link a batch of applications into identity clusters.
+
+    Args:
+        rows: Dicts with pk, identity_cluster and the IDENTITY_FIELDS
+
+    Returns:
+        Number of existing clusters merged into others
+    """
+    if not rows:
+        return 0
+    keys_by_pk = {row['pk']: identity_keys(row) for row in rows}
+    wanted = defaultdict(set)
+    for keys in keys_by_pk.values():
+        for kind, digest in keys:
+            wanted[kind].add(digest)
+
+    with transaction.atomic():
+        query = Q(pk__in=[])
+        for kind, digests in wanted.items():
+            query |= Q(kind=kind, digest__in=digests)
+        existing = dict(
+            ((kind, digest), cluster)
+            for kind, digest, cluster in IdentityKey.objects.select_for_update()
+            .filter(query).values_list('kind', 'digest', 'cluster')
+        )
+
+        # Nodes are application pks; existing clusters are named by a pk too
+        union_find = _UnionFind()
+        first_holder = {}
+        for row in rows:
+            pk = row['pk']
+            union_find.find(pk)
+            if row['identity_cluster']:
+                union_find.union(pk, row['identity_cluster'])
+            for key in keys_by_pk[pk]:
+                if key in existing:
+                    union_find.union(pk, existing[key])
+                holder = first_holder.setdefault(key, pk)
+                union_find.union(pk, holder)
+
+        known_clusters = set(existing.values()) | {row['identity_cluster'] for row in rows if row['identity_cluster']}
+        merged = _relabel(union_find, known_clusters)
+
+        Application.objects.bulk_update(
+            [Application(pk=row['pk'], identity_cluster=union_find.find(row['pk'])) for row in rows],
+            ['identity_cluster'],
+            batch_size=500,
+        )
+        new_keys = {key: pk for key, pk in first_holder.items() if key not in existing}
+        IdentityKey.objects.bulk_create(
+            [IdentityKey(kind=key[0], digest=key[1], cluster=union_find.find(pk)) for key, pk in new_keys.items()],
+            ignore_conflicts=True,
+        )
+
+        # A concurrent first submission may have inserted one of the new keys
+        # first, with its own cluster; the conflicting insert was dropped, so
+        # join that cluster instead
+        inserted = defaultdict(set)
+        for kind, digest in new_keys:
+            inserted[kind].add(digest)
+        query = Q(pk__in=[])
+        for kind, digests in inserted.items():
+            query |= Q(kind=kind, digest__in=digests)
+        roots = {union_find.find(row['pk']) for row in rows}
+        conflicts = set()
+        for kind, digest, cluster in IdentityKey.objects.filter(query).values_list('kind', 'digest', 'cluster'):
+            if cluster != union_find.find(new_keys[(kind, digest)]):
+                union_find.union(new_keys[(kind, digest)], cluster)
+                conflicts.add(cluster)
+        if conflicts:
+            merged += _relabel(union_find, conflicts | roots)
+    return merged
+
+
+def _relabel(union_find, clusters):
+    """
+    Move the applications and keys of merged clusters to their new root.
+
+    Returns:
+        Number of clusters merged into others
+    """
+    by_root = defaultdict(list)
+    for cluster in clusters:
+        root = union_find.find(cluster)
+        if root != cluster:
+            by_root[root].append(cluster)
+    for root, merged in by_root.items():
+        Application.objects.filter(identity_cluster__in=merged).update(identity_cluster=root)
+        IdentityKey.objects.filter(cluster__in=merged).update(cluster=root)
+    return sum(len(merged) for merged in by_root.values())
+
+
+def _rows(queryset):
+    return queryset.order_by('pk').values('pk', 'identity_cluster', *IDENTITY_FIELDS)
+
+
+def link_application(application):
+    """Link one application, e.g. a new submission"""
+    return link_rows(list(_rows(Application.objects.filter(pk=application.pk))))
+
+
+def link_all(queryset=None, chunk_size=LINK_CHUNK_SIZE, progress=None):
+    """
+    Link applications in chunks.
+
+    Args:
+        queryset: Applications to link (default: those not linked yet)
+        chunk_size: Applications per batch
+        progress: Optional callable receiving the running count
+
+    Returns:
+        Tuple of (applications linked, clusters merged)
+    """
+    if queryset is None:
+        queryset = Application.objects.filter(identity_cluster__isnull=True)
+
+    linked = merged = 0
+    last_pk = 0
+    while True:
+        # Keyset pagination: the chunk's UPDATEs do not shift later pages
+        chunk = list(_rows(queryset.filter(pk__gt=last_pk))[:chunk_size])
+        if not chunk:
+            break
+        merged += link_rows(chunk)
+        linked += len(chunk)
+        last_pk = chunk[-1]['pk']
+        if progress:
+            progress(linked)
+    return linked, merged
+
+
+def reset_identities():
+    """Forget every cluster, before a full rebuild"""
+    with transaction.atomic():
+        IdentityKey.objects.all().delete()
+        Application.objects.exclude(identity_cluster__isnull=True).update(identity_cluster=None)
+
+
+def linked_applications(application):
+    """Other applications in the same identity cluster"""
+    if not application.identity_cluster:
+        return Application.objects.none()
+    return Application.objects.filter(identity_cluster=application.identity_cluster).exclude(pk=application.pk)
+
+
+def linked_clusters(min_schemes=1):
+    """
+    Clusters with more than one application.
+
+    Args:
+        min_schemes: Only clusters spanning at least this many schemes
+
+    Returns:
+        Queryset of dicts with identity_cluster, applications and schemes
+    """
+    return (
+        Application.objects.exclude(identity_cluster__isnull=True)
+        .order_by()
+        .values('identity_cluster')
+        .annotate(applications=Count('id'), schemes=Count('scheme', distinct=True))
+        .filter(applications__gt=1, schemes__gte=min_schemes)
+    )
@@ -0,0 +1,267 @@
+"""
+Offline import of legacy applicant lists from CSV.
+
+The CSV has one column per Application field, named as in the export
+(``mobile_number``, ``dob``, ...); other columns such as ``scheme_name`` or
+``age`` are ignored. ``import_csv``:
+
+1. counts the rows and reserves that many application numbers with one
+   scheme lock;
+2. streams the file in chunks, validating each chunk's rows with the model
+   fields' own validators in a process pool;
+3. rejects rows that repeat a unique key (mobile, Aadhar, account number) of
+   an earlier row of the file, or of an application already in the scheme,
+   looked up with one query per chunk;
+4. bulk_creates each chunk and does the bookkeeping of the skipped save()
+   (see intake.record_created); the identity link runs after the chunk's
+   commit, and a failure there leaves the rows for
+   ``manage.py link_identities`` instead of stopping the import.
+
+Rejected rows are written, with their line and errors, to a rejected-rows
+CSV so they can be fixed and imported again. Numbers left over by rejected
+rows are handed back if no application was numbered meanwhile. Imported
+applications have no payment proof.
+"""
+
+import csv
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import F, Q
+
+from .intake import BATCH_UNIQUE_FIELDS, insert_applications, record_created, reserve_numbers
+from .models import Application, Scheme, normalise_reference
+from .validators import validate_id_number, validation_scope
+from .workflow import chunked
+
+
+CHUNK_SIZE = 1000
+
+# Derived, file or lottery columns that an import never sets
+NOT_IMPORTED_FIELDS = ('scheme', 'plot_category', 'payment_proof', 'application_pdf', 'lottery_status')
+
+IMPORT_FIELDS = tuple(
+    field.name for field in Application._meta.concrete_fields
+    if field.editable and not field.primary_key and field.name not in NOT_IMPORTED_FIELDS
+)
+
+# Legacy lists write dates day first
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y')
+
+REJECTED_EXTRA_HEADERS = ('line', 'errors')
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return value
+
+
+def clean_row(row):
+    """
+    Field values of a CSV row, validated like Application.full_clean.
+
+    Args:
+        row: Mapping of column -> raw string
+
+    Returns:
+        Tuple of (values, errors); errors maps field -> list of messages
+    """
+    values, errors = {}, {}
+    for name in IMPORT_FIELDS:
+        field = Application._meta.get_field(name)
+        raw = (row.get(name) or '').strip()
+        if not raw and field.has_default():
+            values[name] = field.get_default()
+            continue
+        if not raw and not field.blank:
+            errors[name] = [field.error_messages['blank']]
+            continue
+        if isinstance(field, models.DateField):
+            raw = _parse_date(raw)
+        elif isinstance(field, models.DecimalField):
+            raw = raw.replace(',', '')
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    if 'id_type' in values and 'id_number' in values:
+        try:
+            validate_id_number(values['id_type'], values['id_number'])
+        except ValidationError as e:
+            errors['id_number'] = e.messages
+    return values, errors
+
+
+def clean_rows(rows):
+    """clean_row over a slice of a chunk; the process pool's unit of work"""
+    with validation_scope():
+        return [clean_row(row) for row in rows]
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones already have it
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+class ImportResult:
+    """
+    Outcome of an import.
+
+    Attributes:
+        total: Data rows in the file
+        created: Applications inserted
+        rejected: Rows written to the rejected-rows file
+        first_number, last_number: Application numbers of the first and last
+            inserted row, or None
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.created = 0
+        self.rejected = 0
+        self.first_number = None
+        self.last_number = None
+
+
+def count_rows(path):
+    """Data rows of a CSV file (quoted new lines included, blank lines not)"""
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        return max(sum(1 for row in csv.reader(fh) if row) - 1, 0)
+
+
+def _validate_chunk(chunk, executor, workers):
+    rows = [row for _, row in chunk]
+    if executor is None:
+        return clean_rows(rows)
+    size = -(-len(rows) // workers)
+    results = []
+    for part in executor.map(clean_rows, [rows[i:i + size] for i in range(0, len(rows), size)]):
+        results.extend(part)
+    return results
+
+
+def _existing_keys(scheme, candidates):
+    """Unique key values already used in the scheme, with one query"""
+    query = Q()
+    for field in BATCH_UNIQUE_FIELDS:
+        query |= Q(**{f'{field}__in': {values[field] for _, _, values in candidates}})
+    taken = {field: set() for field in BATCH_UNIQUE_FIELDS}
+    for row in Application.objects.filter(scheme=scheme).filter(query).values_list(*BATCH_UNIQUE_FIELDS):
+        for field, value in zip(BATCH_UNIQUE_FIELDS, row):
+            taken[field].add(value)
+    return taken
+
+
+def _format_errors(errors):
+    return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in errors.items())
+
+
+def import_csv(path, scheme, rejected=None, workers=None, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Import the applications of a CSV file into a scheme.
+
+    Args:
+        path: CSV file
+        scheme: Scheme the applications belong to
+        rejected: Text file object for the rejected-rows CSV, or None
+        workers: Validation processes (default: CPU count; 1 validates in
+            this process)
+        chunk_size: Rows validated, checked and inserted together
+        dry_run: Validate and check only, insert nothing
+
+    Returns:
+        ImportResult
+    """
+    result = ImportResult(count_rows(path))
+    workers = workers or os.cpu_count() or 1
+    if not result.total:
+        return result
+
+    first = next_number = None
+    if not dry_run:
+        first = next_number = reserve_numbers(scheme.pk, result.total)
+
+    seen = {field: {} for field in BATCH_UNIQUE_FIELDS}
+    writer = None
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers > 1 else None
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as fh:
+            reader = csv.DictReader(fh)
+            if rejected is not None:
+                writer = csv.DictWriter(
+                    rejected, fieldnames=[*(reader.fieldnames or []), *REJECTED_EXTRA_HEADERS], extrasaction='ignore'
+                )
+                writer.writeheader()
+
+            def reject(line, row, errors):
+                result.rejected += 1
+                if writer is not None:
+                    writer.writerow({**row, 'line': line, 'errors': _format_errors(errors)})
+
+            # Line numbers count the header, as a spreadsheet shows them
+            for chunk in chunked(((reader.line_num, row) for row in reader), chunk_size):
+                candidates = []
+                for (line, row), (values, errors) in zip(chunk, _validate_chunk(chunk, executor, workers)):
+                    if errors:
+                        reject(line, row, errors)
+                        continue
+                    duplicate = next((field for field in BATCH_UNIQUE_FIELDS if values[field] in seen[field]), None)
+                    if duplicate:
+                        reject(line, row, {duplicate: [f"Same as line {seen[duplicate][values[duplicate]]} of this file"]})
+                        continue
+                    for field in BATCH_UNIQUE_FIELDS:
+                        seen[field][values[field]] = line
+                    candidates.append((line, row, values))
+                if not candidates:
+                    continue
+
+                taken = _existing_keys(scheme, candidates)
+                applications = {}
+                for line, row, values in candidates:
+                    duplicate = next((field for field in BATCH_UNIQUE_FIELDS if values[field] in taken[field]), None)
+                    if duplicate:
+                        reject(line, row, {duplicate: ["An application with this value already exists in the scheme"]})
+                        continue
+                    if dry_run:
+                        result.created += 1
+                        continue
+                    application = Application(scheme=scheme, application_number=next_number, **values)
+                    application.apply_income_rules()
+                    application.transaction_reference = normalise_reference(application.dd_id_or_transaction_id)
+                    applications[(line, next_number)] = (row, application)
+                    next_number += 1
+                if not applications:
+                    continue
+
+                created, failed = insert_applications(
+                    {key: application for key, (_, application) in applications.items()}
+                )
+                for (line, number), error in failed.items():
+                    reject(line, applications[(line, number)][0], {'non_field_errors': [str(error)]})
+                record_created(created.values())
+                if created:
+                    numbers = [application.application_number for application in created.values()]
+                    if result.first_number is None:
+                        result.first_number = min(numbers)
+                    result.last_number = max(numbers)
+                    result.created += len(created)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if first is not None:
+            # Hand back the numbers rejected rows did not use, unless another
+            # application took a number after the reserved block
+            Scheme.objects.filter(pk=scheme.pk, next_application_number=first + result.total).update(
+                next_application_number=F('next_application_number') - (first + result.total - next_number)
+            )
+    return result
@@ -0,0 +1,341 @@
+"""
+Index advice for the Application table.
+
+The admin changelist, the public APIs and the lottery run a handful of query
+shapes against ``scheme_application``. Each shape is reduced to the columns an
+index needs (equality columns first, then the sort columns, then range
+columns) and compared with the indexes the model already declares.
+"""
+
+import hashlib
+import re
+import statistics
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Index, Q
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import AND, WhereNode
+from django.utils import timezone
+
+from .models import Application
+
+
+EQUALITY_LOOKUPS = ('exact', 'in')
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte', 'range')
+
+
+class QueryShape:
+    """
+    A query run against Application.
+
+    Attributes:
+        name: Short identifier, also used for the index name
+        build: Callable(scheme_id) returning the queryset
+        partial_on: Equality columns with a constant value that should become
+            the index condition instead of key columns
+    """
+
+    def __init__(self, name, build, partial_on=()):
+        self.name = name
+        self.build = build
+        self.partial_on = tuple(partial_on)
+
+
+def _changelist(**filters):
+    return lambda scheme_id: Application.objects.filter(scheme_id=scheme_id, **filters).order_by(
+        '-application_submission_date'
+    )
+
+
+def _date_hierarchy(scheme_id):
+    today = timezone.now()
+    return Application.objects.filter(
+        scheme_id=scheme_id,
+        application_submission_date__gte=today - timedelta(days=1),
+        application_submission_date__lt=today,
+    ).order_by('-application_submission_date')
+
+
+def _lottery_bucket(scheme_id):
+    return Application.objects.filter(
+        scheme_id=scheme_id,
+        application_status=Application.APPLICATION_STATUS_CHOICES.ACCEPTED,
+        payment_status=Application.PAYMENT_STATUS_CHOICES.VERIFIED,
+        plot_category=Application.PLOT_CATEGORY_CHOICES.EWS,
+    ).order_by('sub_category', 'application_number').values_list('sub_category', 'application_number')
+
+
+# Known query shapes of ApplicationAdmin, the scheme APIs and the lottery engine
+QUERY_SHAPES = (
+    QueryShape('all_recent', lambda scheme_id: Application.objects.order_by('-application_submission_date')),
+    QueryShape('scheme_recent', _changelist()),
+    QueryShape('scheme_status', _changelist(application_status=Application.APPLICATION_STATUS_CHOICES.PENDING)),
+    QueryShape('scheme_payment', _changelist(payment_status=Application.PAYMENT_STATUS_CHOICES.PENDING)),
+    QueryShape('scheme_lottery', _changelist(lottery_status=Application.LOTTERY_STATUS_CHOICES.SELECTED)),
+    QueryShape('scheme_date', _date_hierarchy),
+    QueryShape('lottery_bucket', _lottery_bucket, partial_on=('application_status', 'payment_status')),
+)
+
+
+def _lookups(where):
+    for child in where.children:
+        if isinstance(child, WhereNode):
+            if child.connector == AND and not child.negated:
+                yield from _lookups(child)
+        elif isinstance(child, Lookup) and isinstance(child.lhs, Col):
+            yield child
+
+
+def _append(columns, name):
+    if name not in [column.lstrip('-') for column in columns]:
+        columns.append(name)
+
+
+class Proposal:
+    """
+    An index derived from one query shape.
+
+    Attributes:
+        name: Index name
+        fields: Index fields, '-' prefixed for descending
+        condition: Dict of field -> value for a partial index, or empty
+        shapes: Names of the shapes the index serves
+    """
+
+    def __init__(self, name, fields, condition=None, shapes=()):
+        self.name = name
+        self.fields = list(fields)
+        self.condition = dict(condition or {})
+        self.shapes = list(shapes)
+
+    def as_index(self):
+        condition = Q(**self.condition) if self.condition else None
+        return Index(fields=self.fields, name=self.name, condition=condition)
+
+    def key(self):
+        return tuple(self.fields), tuple(sorted(self.condition.items()))
+
+
+def _index_name(prefix, fields, condition):
+    if prefix != 'log':
+        return f"idx_app_{prefix}"[:30]
+    digest = hashlib.md5(repr((fields, sorted(condition.items()))).encode()).hexdigest()[:8]
+    return f"idx_app_log_{digest}"
+
+
+def propose_for_queryset(queryset, name, partial_on=()):
+    """
+    Derive the index a queryset needs.
+
+    Args:
+        queryset: Application queryset
+        name: Name of the shape
+        partial_on: Equality columns to move into the index condition
+
+    Returns:
+        Proposal
+    """
+    equality, ranges, condition = [], [], {}
+    for lookup in _lookups(queryset.query.where):
+        field = lookup.lhs.target.name
+        if lookup.lookup_name == 'exact' and field in partial_on:
+            condition[field] = getattr(lookup.rhs, 'value', lookup.rhs)
+        elif lookup.lookup_name in EQUALITY_LOOKUPS:
+            _append(equality, field)
+        elif lookup.lookup_name in RANGE_LOOKUPS:
+            _append(ranges, field)
+    return _proposal(name, equality, ranges, list(queryset.query.order_by), condition)
+
+
+def _proposal(name, equality, ranges, ordering, condition):
+    fields = []
+    # Foreign keys lead so scheme-scoped indexes share a prefix
+    for field in sorted(equality, key=lambda name: not Application._meta.get_field(name).is_relation):
+        _append(fields, field)
+    for field in ordering:
+        if field.lstrip('-') in ('pk', Application._meta.pk.name):
+            continue
+        if field.lstrip('-') not in fields:
+            fields.append(field)
+    for field in ranges:
+        _append(fields, field)
+    return Proposal(_index_name(name, fields, condition), fields, condition, shapes=[name])
+
+
+def existing_indexes():
+    """
+    Indexes Application already has, as (fields, condition) pairs.
+
+    Covers Meta.indexes, unique_together and single column indexes
+    (db_index and foreign keys). Field directions are ignored.
+    """
+    meta = Application._meta
+    indexes = []
+    for index in meta.indexes:
+        condition = ()
+        if index.condition is not None:
+            condition = tuple(sorted(index.condition.children))
+        indexes.append((tuple(field.lstrip('-') for field in index.fields), condition))
+    for fields in meta.unique_together:
+        indexes.append((tuple(fields), ()))
+    for field in meta.concrete_fields:
+        if field.db_index or field.unique:
+            indexes.append(((field.name,), ()))
+    return indexes
+
+
+def is_covered(proposal, indexes=None):
+    """True when an existing index has the proposal's fields as a prefix"""
+    fields = tuple(field.lstrip('-') for field in proposal.fields)
+    condition = tuple(sorted(proposal.condition.items()))
+    for existing_fields, existing_condition in indexes if indexes is not None else existing_indexes():
+        if existing_fields[:len(fields)] == fields and existing_condition in ((), condition):
+            return True
+    return False
+
+
+def merge_proposals(proposals):
+    """
+    Drop proposals that another proposal makes redundant.
+
+    A proposal whose fields are a prefix of another one with the same
+    condition is served by the longer index.
+    """
+    merged = {}
+    for proposal in proposals:
+        merged.setdefault(proposal.key(), Proposal(proposal.name, proposal.fields, proposal.condition))
+        merged[proposal.key()].shapes.extend(proposal.shapes)
+
+    result = []
+    for key, proposal in merged.items():
+        fields = [field.lstrip('-') for field in proposal.fields]
+        longer = [
+            other for other_key, other in merged.items()
+            if other_key != key
+            and other.condition == proposal.condition
+            and len(other.fields) > len(fields)
+            and [field.lstrip('-') for field in other.fields][:len(fields)] == fields
+        ]
+        if longer:
+            longer[0].shapes.extend(proposal.shapes)
+        else:
+            result.append(proposal)
+    return result
+
+
+def advise(shapes=QUERY_SHAPES, scheme_id=1):
+    """
+    Propose indexes for the known query shapes.
+
+    Returns:
+        Tuple of (missing proposals, covered proposals)
+    """
+    proposals = merge_proposals(
+        propose_for_queryset(shape.build(scheme_id), shape.name, shape.partial_on) for shape in shapes
+    )
+    indexes = existing_indexes()
+    missing = [proposal for proposal in proposals if not is_covered(proposal, indexes)]
+    covered = [proposal for proposal in proposals if is_covered(proposal, indexes)]
+    return missing, covered
+
+
+QUOTED_COLUMN = r'"?{table}"?\."?(\w+)"?'
+LOG_COMPARISON = re.compile(r'\s*(=|IN\b|>=|<=|<|>|BETWEEN\b)', re.IGNORECASE)
+
+
+def parse_query_log(lines, min_calls=1):
+    """
+    Reduce a query log to Application query shapes.
+
+    Accepts any log with one SQL statement per line, such as the
+    ``django.db.backends`` debug log or a PostgreSQL ``log_statement`` log.
+    Statements that do not read ``scheme_application`` are ignored.
+
+    Args:
+        lines: Iterable of log lines
+        min_calls: Ignore shapes seen fewer times than this
+
+    Returns:
+        List of (Proposal, calls), most frequent first
+    """
+    table = Application._meta.db_table
+    columns = {field.column: field.name for field in Application._meta.concrete_fields}
+    column = re.compile(QUOTED_COLUMN.format(table=table))
+    seen = Counter()
+
+    for line in lines:
+        upper = line.upper()
+        if f'FROM "{table.upper()}"' not in upper and f'FROM {table.upper()}' not in upper:
+            continue
+        where_start = upper.find(' WHERE ')
+        order_start = upper.find(' ORDER BY ')
+        end = min(position for position in (upper.find(' LIMIT '), upper.find(';'), len(line)) if position >= 0)
+
+        equality, ranges, ordering = [], [], []
+        if where_start >= 0:
+            where = line[where_start:order_start if order_start > where_start else end]
+            for match in column.finditer(where):
+                operator = LOG_COMPARISON.match(where, match.end())
+                if not operator or match.group(1) not in columns:
+                    continue
+                target = equality if operator.group(1).upper() in ('=', 'IN') else ranges
+                _append(target, columns[match.group(1)])
+        if order_start >= 0:
+            for match in column.finditer(line[order_start:end]):
+                if match.group(1) not in columns:
+                    continue
+                descending = line[order_start + match.end():end].lstrip().upper().startswith('DESC')
+                ordering.append(('-' if descending else '') + columns[match.group(1)])
+
+        seen[(tuple(equality), tuple(ranges), tuple(ordering))] += 1
+
+    results = []
+    for (equality, ranges, ordering), calls in seen.most_common():
+        if calls < min_calls or not (equality or ranges or ordering):
+            continue
+        results.append((_proposal('log', equality, ranges, ordering, {}), calls))
+    return results
+
+
+def time_shape(queryset, repeat=5, page_size=50):
+    """
+    Median time in milliseconds for a changelist page of a query shape.
+
+    Each run does what the admin changelist does: count the filtered rows and
+    fetch the first page.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        queryset.count()
+        list(queryset[:page_size])
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+@contextmanager
+def temporary_indexes(proposals):
+    """Create the proposed indexes for the duration of the block"""
+    # Plain statements rather than a schema editor context, which SQLite
+    # refuses inside a transaction (e.g. under TestCase)
+    editor = connection.schema_editor()
+    indexes = [proposal.as_index() for proposal in proposals]
+    with connection.cursor() as cursor:
+        for index in indexes:
+            cursor.execute(str(index.create_sql(Application, editor)))
+        cursor.execute(f'ANALYZE {connection.ops.quote_name(Application._meta.db_table)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for index in indexes:
+                cursor.execute(editor.sql_delete_index % {
+                    'table': editor.quote_name(Application._meta.db_table),
+                    'name': editor.quote_name(index.name),
+                })
+
@@ -0,0 +1,312 @@
+"""
+Batch intake of applications keyed in at assisted-submission centres.
+
+A batch is a JSON list of applications whose ``payment_proof`` values name
+uploaded files, sent either as a multipart request (``applications`` field
+plus one file part per proof) or as a zip holding ``applications.json`` and
+the proof files. ``submit_batch``:
+
+1. validates every row with ApplicationSerializer (in one validation scope),
+   also rejecting rows that duplicate an earlier row of the batch;
+2. per scheme, takes the scheme lock once and reserves a contiguous block of
+   application numbers;
+3. uploads the proofs concurrently, outside any lock or transaction;
+4. bulk_creates the rows, then does the bookkeeping the skipped save()
+   signals would have done (status counters, identity graph, reused
+   transaction IDs).
+
+Rows whose upload or insert fails are reported and leave a gap in the
+reserved number block.
+"""
+
+import json
+import logging
+import posixpath
+import zipfile
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .identity import link_all
+from .models import Application, Scheme, normalise_reference
+from .serializers import ApplicationSerializer
+from .validators import validation_scope
+from .workflow import adjust_status_counts
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_NAME = 'applications.json'
+
+# Set by intake, not by the centre
+INTAKE_DEFAULT_FIELDS = ('payment_status', 'application_status', 'lottery_status', 'rejection_remark')
+
+# Rows that must be unique within a scheme, as in Application.Meta.unique_together
+BATCH_UNIQUE_FIELDS = ('mobile_number', 'aadhar_number', 'applicant_account_number')
+
+
+class BatchError(Exception):
+    """A batch that cannot be read at all"""
+
+
+def max_rows():
+    return getattr(settings, 'APPLICATION_BATCH_MAX_ROWS', 500)
+
+
+def upload_workers():
+    return getattr(settings, 'APPLICATION_BATCH_UPLOAD_WORKERS', 8)
+
+
+def _check_size(rows):
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise BatchError("The batch must be a JSON list of application objects")
+    if not rows:
+        raise BatchError("The batch is empty")
+    if len(rows) > max_rows():
+        raise BatchError(f"A batch may hold at most {max_rows()} applications")
+    return rows
+
+
+def read_multipart(data, files):
+    """
+    Rows of a multipart batch, with payment_proof resolved to the file part
+    of that name.
+
+    Raises:
+        BatchError: If the manifest is missing or malformed
+    """
+    try:
+        rows = json.loads(data.get('applications') or '')
+    except ValueError:
+        raise BatchError("'applications' must be a JSON list")
+    rows = _check_size(rows)
+    for row in rows:
+        part = row.get('payment_proof')
+        row['payment_proof'] = files.get(part) if isinstance(part, str) else None
+    return rows
+
+
+def read_zip(archive):
+    """
+    Rows of a zip batch, with payment_proof resolved to the member of that
+    path.
+
+    Raises:
+        BatchError: If the archive or its manifest is unreadable, or too big
+    """
+    try:
+        bundle = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise BatchError("The archive is not a zip file")
+    with bundle:
+        members = {info.filename: info for info in bundle.infolist() if not info.is_dir()}
+        # Declared sizes, checked before anything is decompressed
+        limit = getattr(settings, 'APPLICATION_BATCH_MAX_BYTES', 200 * 1024 * 1024)
+        if sum(info.file_size for info in members.values()) > limit:
+            raise BatchError(f"The archive expands to more than {limit} bytes")
+        if MANIFEST_NAME not in members:
+            raise BatchError(f"The archive has no {MANIFEST_NAME}")
+        try:
+            rows = json.loads(bundle.read(MANIFEST_NAME))
+        except ValueError:
+            raise BatchError(f"{MANIFEST_NAME} is not valid JSON")
+        rows = _check_size(rows)
+        for row in rows:
+            path = row.get('payment_proof')
+            if isinstance(path, str) and path in members:
+                row['payment_proof'] = SimpleUploadedFile(posixpath.basename(path), bundle.read(path))
+            else:
+                row['payment_proof'] = None
+    return rows
+
+
+def _validate(rows):
+    """Serializers of the valid rows by index, and errors of the others"""
+    valid, errors = {}, {}
+    seen = {}
+    with validation_scope():
+        for index, row in enumerate(rows):
+            data = {key: value for key, value in row.items() if key not in INTAKE_DEFAULT_FIELDS}
+            serializer = ApplicationSerializer(data=data)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+            scheme_id = serializer.validated_data['scheme'].pk
+            duplicate = None
+            for field in BATCH_UNIQUE_FIELDS:
+                key = (scheme_id, field, serializer.validated_data[field])
+                if key in seen:
+                    duplicate = f"Same {field} as application {seen[key]} of this batch"
+                    break
+            if duplicate:
+                errors[index] = {'non_field_errors': [duplicate]}
+                continue
+            for field in BATCH_UNIQUE_FIELDS:
+                seen[(scheme_id, field, serializer.validated_data[field])] = index
+            valid[index] = serializer
+    return valid, errors
+
+
+def reserve_numbers(scheme_id, count):
+    """
+    Reserve ``count`` consecutive application numbers with one scheme lock.
+
+    Returns:
+        The first reserved number
+    """
+    with transaction.atomic():
+        scheme = Scheme.objects.select_for_update().get(id=scheme_id)
+        first = scheme.next_application_number
+        Scheme.objects.filter(id=scheme_id).update(next_application_number=F('next_application_number') + count)
+    return first
+
+
+def _build(serializer, number):
+    data = dict(serializer.validated_data)
+    proof = data.pop('payment_proof')
+    application = Application(**data)
+    application.application_number = number
+    application.apply_income_rules()
+    application.transaction_reference = normalise_reference(application.dd_id_or_transaction_id)
+    return application, proof
+
+
+def _upload(application, proof):
+    field = application._meta.get_field('payment_proof')
+    name = field.generate_filename(application, proof.name)
+    return field.storage.save(name, proof, max_length=field.max_length)
+
+
+def _upload_all(pending):
+    """Upload proofs concurrently; returns {index: stored name or exception}"""
+    with ThreadPoolExecutor(max_workers=upload_workers()) as executor:
+        futures = {
+            index: executor.submit(_upload, application, proof)
+            for index, (application, proof) in pending.items()
+        }
+    outcomes = {}
+    for index, future in futures.items():
+        try:
+            outcomes[index] = future.result()
+        except Exception as e:
+            logger.exception(f"Payment proof upload of batch row {index} failed")
+            outcomes[index] = e
+    return outcomes
+
+
+def insert_applications(applications):
+    """
+    bulk_create applications, falling back to row by row when one violates a
+    constraint.
+
+    Args:
+        applications: Mapping of caller key -> unsaved Application
+
+    Returns:
+        Tuple of ({key: created application}, {key: IntegrityError})
+    """
+    try:
+        with transaction.atomic():
+            return {index: created for index, created in zip(
+                applications, Application.objects.bulk_create(applications.values())
+            )}, {}
+    except IntegrityError:
+        pass
+    created, failed = {}, {}
+    for index, application in applications.items():
+        try:
+            with transaction.atomic():
+                created[index] = Application.objects.bulk_create([application])[0]
+        except IntegrityError as e:
+            failed[index] = e
+    return created, failed
+
+
+def _flag_reused(created):
+    references = Counter(a.transaction_reference for a in created if a.transaction_reference)
+    if not references:
+        return
+    reused = (
+        Application.objects.filter(transaction_reference__in=list(references))
+        .order_by().values('transaction_reference').annotate(n=Count('id')).filter(n__gt=1)
+        .values('transaction_reference')
+    )
+    Application.objects.filter(transaction_reference__in=reused, transaction_reused=False).update(
+        transaction_reused=True
+    )
+
+
+def record_created(created):
+    """
+    Bookkeeping the save() signals would have done for bulk_created
+    applications: status counters, reused transaction IDs, identity graph.
+
+    As in signals.link_new_application, the identity link runs after the
+    commit and a failure only leaves the rows for `manage.py link_identities`:
+    the applications exist either way, and the caller still gets its results.
+    """
+    created = list(created)
+    if not created:
+        return
+    deltas = Counter()
+    for application in created:
+        for field in Application.COUNTED_STATUS_FIELDS:
+            deltas[(application.scheme_id, field, getattr(application, field))] += 1
+    adjust_status_counts(deltas)
+    _flag_reused(created)
+    pks = [application.pk for application in created]
+    transaction.on_commit(lambda: link_all(Application.objects.filter(pk__in=pks)), robust=True)
+
+
+def submit_batch(rows):
+    """
+    Validate, number, upload and insert a batch.
+
+    Args:
+        rows: From read_multipart or read_zip
+
+    Returns:
+        One result dict per row, in order: ``{'index', 'status': 'created',
+        'id', 'application_number'}`` or ``{'index', 'status': 'invalid' or
+        'failed', 'errors'}``
+    """
+    valid, errors = _validate(rows)
+    results = {index: {'index': index, 'status': 'invalid', 'errors': error} for index, error in errors.items()}
+
+    by_scheme = defaultdict(list)
+    for index in sorted(valid):
+        by_scheme[valid[index].validated_data['scheme'].pk].append(index)
+
+    pending = {}
+    for scheme_id, indexes in by_scheme.items():
+        first = reserve_numbers(scheme_id, len(indexes))
+        for offset, index in enumerate(indexes):
+            pending[index] = _build(valid[index], first + offset)
+
+    applications = {}
+    for index, outcome in _upload_all(pending).items():
+        application = pending[index][0]
+        if isinstance(outcome, Exception):
+            results[index] = {'index': index, 'status': 'failed', 'errors': {'payment_proof': [str(outcome)]}}
+        else:
+            application.payment_proof.name = outcome
+            applications[index] = application
+
+    created, failed = insert_applications(applications)
+    for index, error in failed.items():
+        application = applications[index]
+        application.payment_proof.storage.delete(application.payment_proof.name)
+        results[index] = {'index': index, 'status': 'failed', 'errors': {'non_field_errors': [str(error)]}}
+
+    for index, application in created.items():
+        results[index] = {
+            'index': index, 'status': 'created', 'id': application.pk,
+            'application_number': application.application_number,
+        }
+    record_created(created.values())
+
+    return [results[index] for index in range(len(rows))]
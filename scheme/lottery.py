@@ -0,0 +1,436 @@
+import hashlib
+import heapq
+import secrets
+import zlib
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from .allocation import allocate, quota_table
+from .models import Application, LotteryDraw, Scheme
+
+
+# Bump this whenever the ranking or allocation rules change. Artefacts record
+# the version they were drawn with so old draws can still be replayed.
+#   sha256-rank/1: top-N per plot category
+#   sha256-rank/2: reserved quotas per sub-category with spillover
+ALGORITHM_VERSION = 'sha256-rank/2'
+SUPPORTED_VERSIONS = ('sha256-rank/1', ALGORITHM_VERSION)
+
+ARTEFACT_SALT = 'scheme.lottery.artefact'
+
+# Rows are streamed / updated in chunks of this size so a draw never holds the
+# full Application table in memory.
+CHUNK_SIZE = 2000
+
+
+class LotteryError(Exception):
+    """Raised when a draw is refused (bad seed, or the scheme was already drawn)."""
+
+
+class LotteryVerificationError(Exception):
+    """Raised when an artefact cannot be decoded or its signature is invalid."""
+
+
+def draw_rank(seed, bucket, application_number):
+    """
+    Rank key for one application in one bucket.
+
+    The key only depends on the public seed, the bucket name and the
+    application number, so anyone holding the artefact can recompute it.
+    Lower keys win.
+    """
+    return hashlib.sha256(f'{seed}:{bucket}:{application_number}'.encode()).hexdigest()
+
+
+def rank_bucket(seed, bucket, application_numbers, seats, waitlist=0):
+    """
+    Version 1 ranking: plain top-N of a bucket from a stream of application
+    numbers, kept to replay draws made before reserved quotas existed.
+
+    Uses a bounded heap, so memory is O(seats + waitlist) regardless of the
+    number of applicants.
+
+    Args:
+        seed: Draw seed
+        bucket: Bucket name (plot category)
+        application_numbers: Iterable of application numbers
+        seats: Number of plots in the bucket
+        waitlist: Number of applicants to waitlist after the winners
+
+    Returns:
+        Tuple of (selected, waitlisted) lists in rank order
+    """
+    ranked = heapq.nsmallest(
+        seats + waitlist,
+        application_numbers,
+        key=lambda number: draw_rank(seed, bucket, number),
+    )
+    return ranked[:seats], ranked[seats:]
+
+
+def draw_bucket(seed, bucket, applicants, quotas, waitlist=0):
+    """
+    Rank one plot category and allocate its reserved quotas.
+
+    Args:
+        seed: Draw seed
+        bucket: Plot category
+        applicants: Iterable of (application_number, sub_category)
+        quotas: Dict of sub_category -> plots
+        waitlist: Number of unseated applicants to waitlist
+
+    Returns:
+        Tuple of (selected, waitlisted) where selected is a list of
+        [application_number, quota] pairs in rank order
+    """
+    ranked = sorted(applicants, key=lambda applicant: draw_rank(seed, bucket, applicant[0]))
+    allocation = allocate(quotas, ranked)
+    selected = [[number, quota] for number, quota in allocation.selected]
+    return selected, allocation.unseated[:waitlist]
+
+
+def _encode_numbers(numbers):
+    """Delta-encode a sorted list of application numbers (keeps artefacts small)."""
+    encoded, previous = [], 0
+    for number in numbers:
+        encoded.append(number - previous)
+        previous = number
+    return encoded
+
+
+def _decode_numbers(encoded):
+    """Yield application numbers back from a delta-encoded list."""
+    total = 0
+    for delta in encoded:
+        total += delta
+        yield total
+
+
+def sign_artefact(payload):
+    """Serialise, compress and sign an artefact payload."""
+    return signing.dumps(
+        payload,
+        key=getattr(settings, 'LOTTERY_SIGNING_KEY', None),
+        salt=ARTEFACT_SALT,
+        compress=True,
+    )
+
+
+def load_artefact(token, verify_signature=True):
+    """
+    Decode a signed artefact back into its payload.
+
+    Args:
+        token: Signed artefact string
+        verify_signature: Set to False to decode an artefact without the
+            signing key (e.g. by a third-party auditor replaying the draw)
+
+    Returns:
+        Artefact payload dict
+
+    Raises:
+        LotteryVerificationError: If the token is malformed or tampered with
+    """
+    token = token.strip()
+    if verify_signature:
+        try:
+            return signing.loads(
+                token,
+                key=getattr(settings, 'LOTTERY_SIGNING_KEY', None),
+                salt=ARTEFACT_SALT,
+            )
+        except signing.BadSignature as e:
+            raise LotteryVerificationError(f'Invalid artefact signature: {e}')
+
+    try:
+        # Layout is "<payload>:<timestamp>:<signature>", see django.core.signing
+        data = token.rsplit(':', 2)[0]
+        return signing.JSONSerializer().loads(_b64_payload(data))
+    except Exception as e:
+        raise LotteryVerificationError(f'Malformed artefact: {e}')
+
+
+def _b64_payload(data):
+    compressed = data.startswith('.')
+    if compressed:
+        data = data[1:]
+    raw = signing.b64_decode(data.encode())
+    return zlib.decompress(raw) if compressed else raw
+
+
+def artefact_digest(token):
+    """SHA-256 of the signed artefact, suitable for publishing with the results."""
+    return hashlib.sha256(token.strip().encode()).hexdigest()
+
+
+def _tagged(numbers, sub_category):
+    for number in numbers:
+        yield number, sub_category
+
+
+def bucket_inputs(payload, bucket):
+    """
+    Yield (application_number, sub_category) for a bucket of an artefact,
+    sorted by application number. sub_category is None for version 1
+    artefacts, which did not record it.
+    """
+    inputs = payload['buckets'][bucket]['inputs']
+    if isinstance(inputs, list):
+        return _tagged(_decode_numbers(inputs), None)
+    return heapq.merge(*(
+        _tagged(_decode_numbers(encoded), sub_category)
+        for sub_category, encoded in inputs.items()
+    ))
+
+
+def selected_numbers(bucket_data):
+    """Selected application numbers of an artefact bucket, in rank order."""
+    return [
+        entry[0] if isinstance(entry, list) else entry
+        for entry in bucket_data['selected']
+    ]
+
+
+def replay(payload):
+    """
+    Re-run a draw purely from its artefact.
+
+    Args:
+        payload: Decoded artefact payload
+
+    Returns:
+        List of human readable mismatch descriptions (empty when the draw
+        reproduces exactly)
+    """
+    algorithm = payload.get('algorithm')
+    if algorithm not in SUPPORTED_VERSIONS:
+        return [f"Unsupported algorithm version {algorithm!r}"]
+
+    mismatches = []
+    seed = payload['seed']
+    for bucket, data in payload['buckets'].items():
+        if algorithm == 'sha256-rank/1':
+            numbers = (number for number, _ in bucket_inputs(payload, bucket))
+            selected, waitlisted = rank_bucket(seed, bucket, numbers, data['seats'], data['waitlist'])
+        else:
+            selected, waitlisted = draw_bucket(
+                seed, bucket, bucket_inputs(payload, bucket), data['quotas'], data['waitlist']
+            )
+        if selected != data['selected']:
+            mismatches.append(f'{bucket}: selected list does not reproduce')
+        if waitlisted != data['waitlisted']:
+            mismatches.append(f'{bucket}: waitlist does not reproduce')
+    return mismatches
+
+
+class LotteryEngine:
+    """
+    Conducts the plot lottery for a scheme.
+
+    Eligible applications (accepted, with verified payment) are bucketed by
+    plot category and ranked by ``draw_rank``. Seats are allocated in rank
+    order against the scheme's reserved quotas (see scheme.allocation); the
+    first ``waitlist`` unseated applicants are WAITLISTED and the rest are
+    NOT_SELECTED. Every draw emits a signed artefact that is enough to replay
+    it with ``verify_lottery``.
+
+    A scheme is drawn once: a further draw needs a redraw reason, which is
+    stored with the draw and in its artefact. Dry runs always use a random
+    seed that is never revealed, so seeds cannot be tried out against the
+    inputs before the real draw.
+    """
+
+    def __init__(self, scheme, seed=None, waitlist=0):
+        max_length = LotteryDraw._meta.get_field('seed').max_length
+        if seed and len(seed) > max_length:
+            raise LotteryError(f'Seed is longer than {max_length} characters')
+        self.scheme = scheme
+        self.seed_given = bool(seed)
+        self.seed = seed or secrets.token_hex(16)
+        self.waitlist = waitlist
+
+    def eligible_applications(self):
+        return Application.objects.filter(
+            scheme=self.scheme,
+            application_status=Application.APPLICATION_STATUS_CHOICES.ACCEPTED,
+            payment_status=Application.PAYMENT_STATUS_CHOICES.VERIFIED,
+        )
+
+    def _bucket_inputs(self, bucket):
+        """Sorted application numbers per sub-category for one plot category."""
+        inputs = {}
+        rows = (
+            self.eligible_applications()
+            .filter(plot_category=bucket)
+            .order_by('sub_category', 'application_number')
+            .values_list('sub_category', 'application_number')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for sub_category, application_number in rows:
+            inputs.setdefault(sub_category, []).append(application_number)
+        return inputs
+
+    def build_payload(self):
+        """Run the draw in memory and return the unsigned artefact payload."""
+        buckets = {}
+        for bucket, quotas in quota_table(self.scheme).items():
+            inputs = self._bucket_inputs(bucket)
+            applicants = [
+                (number, sub_category)
+                for sub_category, numbers in inputs.items()
+                for number in numbers
+            ]
+            selected, waitlisted = draw_bucket(self.seed, bucket, applicants, quotas, self.waitlist)
+            buckets[bucket] = {
+                'seats': sum(quotas.values()),
+                'quotas': quotas,
+                'waitlist': self.waitlist,
+                'inputs': {
+                    sub_category: _encode_numbers(numbers)
+                    for sub_category, numbers in inputs.items()
+                },
+                'selected': selected,
+                'waitlisted': waitlisted,
+            }
+
+        return {
+            'algorithm': ALGORITHM_VERSION,
+            'scheme': self.scheme.pk,
+            'seed': self.seed,
+            'drawn_at': timezone.now().isoformat(),
+            'buckets': buckets,
+        }
+
+    def conduct(self, dry_run=False, redraw_reason=''):
+        """
+        Conduct the draw, update lottery statuses and store the artefact.
+
+        The draw row, with its seed, is written before the inputs are read,
+        while the scheme row is locked against concurrent draws.
+
+        Args:
+            dry_run: Only compute the artefact, don't touch the database. The
+                seed is random and withheld from the returned payload.
+            redraw_reason: Required when the scheme was already drawn
+
+        Returns:
+            Tuple of (LotteryDraw instance or None for dry runs, payload)
+
+        Raises:
+            LotteryError: If a dry run is given a seed, or the scheme was
+                already drawn and no redraw reason is given
+        """
+        if dry_run:
+            if self.seed_given:
+                raise LotteryError('A dry run always uses a random seed; do not pass one')
+            payload = self.build_payload()
+            payload['seed'] = None
+            return None, payload
+
+        with transaction.atomic():
+            Scheme.objects.select_for_update().get(pk=self.scheme.pk)
+            if LotteryDraw.objects.filter(scheme=self.scheme).exists() and not redraw_reason:
+                raise LotteryError(f'{self.scheme} was already drawn; a redraw needs a reason')
+
+            draw = LotteryDraw.objects.create(
+                scheme=self.scheme,
+                seed=self.seed,
+                algorithm_version=ALGORITHM_VERSION,
+                redraw_reason=redraw_reason,
+            )
+
+            payload = self.build_payload()
+            if redraw_reason:
+                payload['redraw_reason'] = redraw_reason
+
+            # Every row is reset, so applications that are no longer eligible
+            # do not keep a status from an earlier draw
+            Application.objects.filter(scheme=self.scheme).update(
+                lottery_status=Application.LOTTERY_STATUS_CHOICES.NOT_CONDUCTED
+            )
+            self.eligible_applications().update(
+                lottery_status=Application.LOTTERY_STATUS_CHOICES.NOT_SELECTED
+            )
+            for data in payload['buckets'].values():
+                self._mark(selected_numbers(data), Application.LOTTERY_STATUS_CHOICES.SELECTED)
+                self._mark(data['waitlisted'], Application.LOTTERY_STATUS_CHOICES.WAITLISTED)
+
+            draw.artefact = sign_artefact(payload)
+            draw.artefact_digest = artefact_digest(draw.artefact)
+            draw.save(update_fields=['artefact', 'artefact_digest'])
+        return draw, payload
+
+    def _mark(self, numbers, lottery_status):
+        for start in range(0, len(numbers), CHUNK_SIZE):
+            Application.objects.filter(
+                scheme=self.scheme,
+                application_number__in=numbers[start:start + CHUNK_SIZE],
+            ).update(lottery_status=lottery_status)
+
+
+def verify_against_database(payload):
+    """
+    Stream the scheme's applications and compare them with an artefact.
+
+    Checks that the eligible applications in each bucket are exactly the
+    artefact inputs and that their lottery statuses match the results. Rows
+    are read with a chunked iterator ordered by application number and merged
+    against the (sorted) artefact inputs, so the table is never loaded whole.
+
+    Args:
+        payload: Decoded artefact payload
+
+    Returns:
+        List of human readable mismatch descriptions
+    """
+    mismatches = []
+    scheme = Scheme.objects.get(pk=payload['scheme'])
+    engine = LotteryEngine(scheme, seed=payload['seed'])
+
+    for bucket, data in payload['buckets'].items():
+        selected = set(selected_numbers(data))
+        waitlisted = set(data['waitlisted'])
+        expected = bucket_inputs(payload, bucket)
+        expected_number, expected_sub_category = next(expected, (None, None))
+        rows = (
+            engine.eligible_applications()
+            .filter(plot_category=bucket)
+            .order_by('application_number')
+            .values_list('application_number', 'sub_category', 'lottery_status')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+
+        for application_number, sub_category, lottery_status in rows:
+            while expected_number is not None and expected_number < application_number:
+                mismatches.append(f'{bucket}: application {expected_number} is no longer eligible')
+                expected_number, expected_sub_category = next(expected, (None, None))
+            if expected_number != application_number:
+                mismatches.append(f'{bucket}: application {application_number} was not part of the draw')
+                continue
+            if expected_sub_category is not None and expected_sub_category != sub_category:
+                mismatches.append(
+                    f'{bucket}: application {application_number} was drawn as {expected_sub_category}, '
+                    f'now {sub_category}'
+                )
+            expected_number, expected_sub_category = next(expected, (None, None))
+
+            if application_number in selected:
+                wanted = Application.LOTTERY_STATUS_CHOICES.SELECTED
+            elif application_number in waitlisted:
+                wanted = Application.LOTTERY_STATUS_CHOICES.WAITLISTED
+            else:
+                wanted = Application.LOTTERY_STATUS_CHOICES.NOT_SELECTED
+            if lottery_status != wanted:
+                mismatches.append(
+                    f'{bucket}: application {application_number} is {lottery_status}, expected {wanted}'
+                )
+
+        while expected_number is not None:
+            mismatches.append(f'{bucket}: application {expected_number} is no longer eligible')
+            expected_number, expected_sub_category = next(expected, (None, None))
+
+    return mismatches
+
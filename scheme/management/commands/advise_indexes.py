@@ -0,0 +1,154 @@
+"""
+Django Management Command to propose indexes for the Application table.
+
+Reduces the known admin, API and lottery query shapes (or the statements of a
+recorded query log) to the composite and partial indexes they need, reports
+the ones Application.Meta does not declare yet and can write the migration.
+
+With ``--benchmark`` the changelist query of every shape is timed with the
+current indexes and with the missing ones added temporarily; load a large
+dataset (around 1M applications) first for meaningful numbers.
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.migrations import Migration
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.operations import AddIndex
+from django.db.migrations.writer import MigrationWriter
+
+from scheme.indexing import (
+    QUERY_SHAPES, advise, is_covered, parse_query_log, temporary_indexes, time_shape,
+)
+from scheme.models import Scheme
+
+
+class Command(BaseCommand):
+    help = 'Propose composite and partial indexes for Application and optionally write the migration'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            help='Query log to analyse instead of the known query shapes (one SQL statement per line)'
+        )
+
+        parser.add_argument(
+            '--min-calls',
+            type=int,
+            default=10,
+            help='Ignore logged query shapes seen fewer times than this (default: 10)'
+        )
+
+        parser.add_argument(
+            '--scheme',
+            type=int,
+            help='Scheme ID used in the query shapes (default: the first scheme)'
+        )
+
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the query plan of every known query shape'
+        )
+
+        parser.add_argument(
+            '--write',
+            action='store_true',
+            help='Write a migration adding the missing indexes'
+        )
+
+        parser.add_argument(
+            '--benchmark',
+            action='store_true',
+            help='Time the changelist query of every shape with and without the missing indexes'
+        )
+
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per shape when benchmarking (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        scheme_id = options['scheme'] or Scheme.objects.order_by('pk').values_list('pk', flat=True).first() or 1
+
+        if options['log']:
+            if not os.path.exists(options['log']):
+                raise CommandError(f"Query log {options['log']} does not exist")
+            with open(options['log']) as fh:
+                logged = parse_query_log(fh, min_calls=options['min_calls'])
+            missing = [proposal for proposal, _ in logged if not is_covered(proposal)]
+            covered = [proposal for proposal, _ in logged if is_covered(proposal)]
+            self.stdout.write(self.style.WARNING(f"QUERY LOG {options['log']}: {len(logged)} shapes"))
+            for proposal, calls in logged:
+                self.stdout.write(f"  {calls:>8} calls  {', '.join(proposal.fields)}")
+        else:
+            missing, covered = advise(QUERY_SHAPES, scheme_id)
+            self.stdout.write(self.style.WARNING(f"KNOWN QUERY SHAPES: {len(QUERY_SHAPES)}"))
+
+        for proposal in covered:
+            self.stdout.write(f"  ✓ covered: {self._describe(proposal)}")
+        for proposal in missing:
+            self.stdout.write(self.style.ERROR(f"  ✗ missing: {self._describe(proposal)}"))
+
+        if options['explain']:
+            for shape in QUERY_SHAPES:
+                self.stdout.write(self.style.WARNING(f"\nEXPLAIN {shape.name}"))
+                self.stdout.write(shape.build(scheme_id).explain())
+
+        if options['benchmark']:
+            self._benchmark(scheme_id, missing, options['repeat'])
+
+        if not missing:
+            self.stdout.write(self.style.SUCCESS("✓ Application.Meta already covers every query shape"))
+            return
+
+        self.stdout.write("\nAdd to Application.Meta.indexes:")
+        for proposal in missing:
+            self.stdout.write(f"    {MigrationWriter.serialize(proposal.as_index())[0]},")
+
+        if options['write']:
+            path = self._write_migration(missing)
+            self.stdout.write(self.style.SUCCESS(f"✓ Migration written to {path}"))
+
+    def _describe(self, proposal):
+        description = f"{proposal.name} ({', '.join(proposal.fields)})"
+        if proposal.condition:
+            description += ' WHERE ' + ' AND '.join(f"{field}={value!r}" for field, value in proposal.condition.items())
+        if proposal.shapes:
+            description += f" for {', '.join(proposal.shapes)}"
+        return description
+
+    def _benchmark(self, scheme_id, missing, repeat):
+        self.stdout.write(self.style.WARNING("\nBENCHMARK (median ms, count + first page of 50)"))
+        before = {shape.name: time_shape(shape.build(scheme_id), repeat) for shape in QUERY_SHAPES}
+        if not missing:
+            self.stdout.write(f"  {'shape':<20}{'current':>12}")
+            for shape in QUERY_SHAPES:
+                self.stdout.write(f"  {shape.name:<20}{before[shape.name]:>12.2f}")
+            return
+
+        with temporary_indexes(missing):
+            after = {shape.name: time_shape(shape.build(scheme_id), repeat) for shape in QUERY_SHAPES}
+
+        self.stdout.write(f"  {'shape':<20}{'current':>12}{'advised':>12}")
+        for shape in QUERY_SHAPES:
+            self.stdout.write(f"  {shape.name:<20}{before[shape.name]:>12.2f}{after[shape.name]:>12.2f}")
+
+    def _write_migration(self, proposals):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        leaves = loader.graph.leaf_nodes('scheme')
+        if len(leaves) != 1:
+            raise CommandError(f"Expected a single leaf migration for scheme, found {leaves}")
+        number = int(leaves[0][1].split('_')[0]) + 1
+
+        migration = Migration(f'{number:04d}_advised_indexes', 'scheme')
+        migration.dependencies = leaves
+        migration.operations = [AddIndex('application', proposal.as_index()) for proposal in proposals]
+
+        writer = MigrationWriter(migration)
+        with open(writer.path, 'w') as fh:
+            fh.write(writer.as_string())
+        return writer.path
@@ -0,0 +1,88 @@
+"""
+Django Management Command to conduct the plot lottery for a scheme.
+
+Ranks every eligible application (accepted + payment verified) per plot
+category, allocates the scheme's reserved quotas, updates lottery statuses and stores a signed artefact that can be
+replayed later with ``verify_lottery``.
+
+A scheme that was already drawn is only drawn again with --redraw and a
+reason, which is kept with the draw. Dry runs use a random seed that is not
+shown, so a seed cannot be tried out before the real draw.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheme.lottery import LotteryEngine, LotteryError
+from scheme.models import Scheme
+
+
+class Command(BaseCommand):
+    help = 'Conduct the lottery for a scheme and store a signed audit artefact'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scheme_id', type=int, help='ID of the scheme to draw')
+
+        parser.add_argument(
+            '--seed',
+            help='Public seed for the draw (default: a random 128-bit hex string)'
+        )
+
+        parser.add_argument(
+            '--waitlist',
+            type=int,
+            default=0,
+            help='Number of applicants to waitlist per plot category (default: 0)'
+        )
+
+        parser.add_argument(
+            '--output',
+            help='Also write the signed artefact to this file'
+        )
+
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the draw with a random, undisclosed seed without updating any application'
+        )
+
+        parser.add_argument(
+            '--redraw',
+            metavar='REASON',
+            default='',
+            help='Draw a scheme that was already drawn, recording why'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scheme = Scheme.objects.get(pk=options['scheme_id'])
+        except Scheme.DoesNotExist:
+            raise CommandError(f"Scheme {options['scheme_id']} does not exist")
+
+        if options['dry_run'] and options['output']:
+            raise CommandError("--output is not available for dry runs, whose seed is withheld")
+
+        try:
+            engine = LotteryEngine(scheme, seed=options['seed'], waitlist=options['waitlist'])
+            draw, payload = engine.conduct(dry_run=options['dry_run'], redraw_reason=options['redraw'].strip())
+        except LotteryError as e:
+            raise CommandError(str(e))
+
+        mode = "DRY RUN" if options['dry_run'] else "LIVE"
+        self.stdout.write(self.style.WARNING(f"LOTTERY FOR {scheme.name} - {mode} MODE"))
+        self.stdout.write(f"Seed: {payload['seed'] or '(random, withheld in dry runs)'}")
+        for bucket, data in payload['buckets'].items():
+            eligible = sum(len(numbers) for numbers in data['inputs'].values())
+            self.stdout.write(
+                f"  {bucket}: {len(data['selected'])} selected, "
+                f"{len(data['waitlisted'])} waitlisted out of {eligible} eligible"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(draw.artefact)
+            self.stdout.write(f"Artefact written to {options['output']}")
+
+        if draw:
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Draw {draw.pk} stored, artefact digest {draw.artefact_digest}"
+            ))
@@ -0,0 +1,90 @@
+"""
+Django Management Command to import applications from a CSV file.
+
+Validates the rows in parallel, rejects invalid rows and rows whose mobile,
+Aadhar or account number is already used in the scheme, and bulk inserts the
+rest with consecutive application numbers. Rejected rows are written to a
+CSV with their line number and errors.
+
+Usage:
+    python manage.py import_applications --scheme 3 legacy.csv --rejected rejected.csv
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheme.importing import CHUNK_SIZE, import_csv
+from scheme.models import Scheme
+
+
+class Command(BaseCommand):
+    help = 'Import applications of a scheme from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with one column per application field')
+
+        parser.add_argument(
+            '--scheme',
+            type=int,
+            required=True,
+            help='Scheme ID to import into'
+        )
+
+        parser.add_argument(
+            '--rejected',
+            help='Write the rejected rows to this CSV file'
+        )
+
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Validation processes (default: CPU count; 1 validates in this process)'
+        )
+
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows validated and inserted together (default: {CHUNK_SIZE})'
+        )
+
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and check the rows without inserting them'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scheme = Scheme.objects.get(id=options['scheme'])
+        except Scheme.DoesNotExist:
+            raise CommandError(f"Scheme with ID {options['scheme']} does not exist")
+
+        rejected = None
+        try:
+            if options['rejected']:
+                rejected = open(options['rejected'], 'w', newline='', encoding='utf-8')
+            result = import_csv(
+                options['path'],
+                scheme,
+                rejected=rejected,
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+            )
+        except OSError as e:
+            raise CommandError(str(e))
+        finally:
+            if rejected is not None:
+                rejected.close()
+
+        self.stdout.write(f"Read {result.total} row(s)")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"✓ {result.created} row(s) would be imported"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✓ {result.created} application(s) imported"))
+            if result.created:
+                self.stdout.write(f"  Application numbers {result.first_number} to {result.last_number}")
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f"✗ {result.rejected} row(s) rejected"))
+            if options['rejected']:
+                self.stdout.write(f"Rejected rows written to {options['rejected']}")
@@ -0,0 +1,51 @@
+"""
+Django Management Command to build the applicant identity graph.
+
+New submissions are linked as they are saved. This command links the
+applications that are not in a cluster yet (e.g. after an import), or with
+--rebuild forgets every cluster and relinks the whole table, which also
+splits clusters whose shared details have since been corrected.
+"""
+
+from django.core.management.base import BaseCommand
+
+from scheme.identity import LINK_CHUNK_SIZE, link_all, linked_clusters, reset_identities
+from scheme.models import Application
+
+
+class Command(BaseCommand):
+    help = 'Link applications that share an Aadhaar, mobile, bank account or email across schemes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Forget existing clusters and relink every application'
+        )
+
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=LINK_CHUNK_SIZE,
+            help=f'Applications linked per batch (default: {LINK_CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            reset_identities()
+            self.stdout.write(self.style.WARNING("Existing clusters cleared"))
+
+        pending = Application.objects.filter(identity_cluster__isnull=True).count()
+        self.stdout.write(f"Linking {pending} application(s)...")
+
+        def progress(done):
+            self.stdout.write(f"  {done}/{pending}")
+
+        linked, merged = link_all(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"✓ {linked} application(s) linked, {merged} cluster(s) merged"))
+
+        clusters = linked_clusters()
+        self.stdout.write(
+            f"{clusters.count()} cluster(s) with more than one application, "
+            f"{clusters.filter(schemes__gt=1).count()} spanning several schemes"
+        )
@@ -0,0 +1,35 @@
+"""
+Django Management Command to recompute the per-scheme status counters.
+
+SchemeStatusCount is kept up to date by application saves and bulk
+transitions. Run this after changing statuses with raw SQL or a plain
+``queryset.update()``, or to check the counters against the table.
+"""
+
+from django.core.management.base import BaseCommand
+
+from scheme.models import Scheme
+from scheme.workflow import rebuild_status_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute SchemeStatusCount from the applications table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scheme',
+            type=int,
+            action='append',
+            help='Scheme ID to rebuild (repeatable, default: all schemes)'
+        )
+
+    def handle(self, *args, **options):
+        scheme_ids = options['scheme']
+        if scheme_ids:
+            missing = set(scheme_ids) - set(Scheme.objects.filter(id__in=scheme_ids).values_list('id', flat=True))
+            if missing:
+                self.stdout.write(self.style.ERROR(f"✗ Scheme(s) not found: {sorted(missing)}"))
+                return
+
+        rows = rebuild_status_counts(scheme_ids)
+        self.stdout.write(self.style.SUCCESS(f"✓ {rows} status counter(s) rebuilt"))
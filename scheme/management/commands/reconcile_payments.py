@@ -0,0 +1,114 @@
+"""
+Django Management Command to reconcile payments with bank statements.
+
+Loads one or more bank/UPI statement CSVs, matches every pending or failed
+payment of a scheme on (transaction id, amount, date) and marks the matches
+as verified. Statement entries already held by a verified payment are not
+matched again, and matches for a transaction ID other applications also use
+are reported rather than verified. Mismatches are written to an exceptions
+report and, with --fail-mismatched, marked as failed.
+
+Usage:
+    python manage.py reconcile_payments --scheme 3 statement.csv upi.csv --report exceptions.csv
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheme.models import Scheme
+from scheme.reconciliation import (
+    MATCHED, Statement, StatementError, apply_reconciliation, reconcile, write_exceptions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Match payments against bank statement CSVs and verify them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statements', nargs='+', help='Statement CSV files')
+
+        parser.add_argument(
+            '--scheme',
+            type=int,
+            required=True,
+            help='Scheme ID to reconcile'
+        )
+
+        parser.add_argument(
+            '--report',
+            help='Write the exceptions report to this CSV file'
+        )
+
+        parser.add_argument(
+            '--date-tolerance',
+            type=int,
+            default=0,
+            help='Days a statement date may differ from the claimed date (default: 0)'
+        )
+
+        parser.add_argument(
+            '--fail-mismatched',
+            action='store_true',
+            help='Mark payments whose amount or date differs from the statement as failed'
+        )
+
+        parser.add_argument(
+            '--reference-column',
+            help='Statement column with the transaction id (default: detected from the header)'
+        )
+
+        parser.add_argument(
+            '--amount-column',
+            help='Statement column with the credited amount (default: detected)'
+        )
+
+        parser.add_argument(
+            '--date-column',
+            help='Statement column with the transaction date (default: detected)'
+        )
+
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the matches without changing any payment status'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scheme = Scheme.objects.get(id=options['scheme'])
+        except Scheme.DoesNotExist:
+            raise CommandError(f"Scheme with ID {options['scheme']} does not exist")
+
+        statement = Statement()
+        for path in options['statements']:
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as fh:
+                    statement.load(
+                        fh,
+                        reference_column=options['reference_column'],
+                        amount_column=options['amount_column'],
+                        date_column=options['date_column'],
+                    )
+            except (OSError, StatementError) as e:
+                raise CommandError(f"{path}: {e}")
+        self.stdout.write(f"Loaded {len(statement)} statement entries")
+        for line, reason in statement.rejected:
+            self.stdout.write(self.style.WARNING(f"  line {line}: {reason}"))
+
+        result = reconcile(scheme, statement, date_tolerance=options['date_tolerance'])
+        for issue, count in sorted(result.summary().items()):
+            style = self.style.SUCCESS if issue == MATCHED else self.style.WARNING
+            self.stdout.write(style(f"  {issue}: {count}"))
+
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as fh:
+                write_exceptions(result, fh)
+            self.stdout.write(f"Exceptions report written to {options['report']}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run: no payment status changed"))
+            return
+
+        apply_reconciliation(result, fail_mismatched=options['fail_mismatched'])
+        self.stdout.write(self.style.SUCCESS(f"✓ {result.verified.updated} payment(s) verified"))
+        if result.failed:
+            self.stdout.write(self.style.SUCCESS(f"✓ {result.failed.updated} payment(s) marked as failed"))
@@ -0,0 +1,80 @@
+"""
+Django Management Command to report reused transaction IDs.
+
+Finds every transaction reference (the normalised DD ID/transaction ID) used
+by more than one application, within or across schemes, in one grouped scan
+and writes the applications involved to a CSV report.
+
+Usage:
+    python manage.py report_duplicate_transactions --output duplicates.csv
+    python manage.py report_duplicate_transactions --cross-scheme --fix-flags
+"""
+
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+
+from scheme.models import Application
+from scheme.reconciliation import DUPLICATE_HEADERS, duplicate_references, duplicate_rows, flag_reused_references
+
+
+class Command(BaseCommand):
+    help = 'Report transaction IDs used by more than one application'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='Write the report to this CSV file (default: standard output)'
+        )
+
+        parser.add_argument(
+            '--scheme',
+            type=int,
+            help='Only references used by at least one application of this scheme'
+        )
+
+        parser.add_argument(
+            '--cross-scheme',
+            action='store_true',
+            help='Only references used in more than one scheme'
+        )
+
+        parser.add_argument(
+            '--fix-flags',
+            action='store_true',
+            help='Also recompute the reused flag on every application'
+        )
+
+    def handle(self, *args, **options):
+        groups = duplicate_references()
+        if options['cross_scheme']:
+            groups = groups.filter(schemes__gt=1)
+        if options['scheme']:
+            groups = groups.filter(transaction_reference__in=Application.objects.filter(
+                scheme=options['scheme']
+            ).values('transaction_reference'))
+
+        if options['output']:
+            fh = open(options['output'], 'w', newline='', encoding='utf-8')
+        else:
+            fh = sys.stdout
+        try:
+            writer = csv.DictWriter(fh, fieldnames=DUPLICATE_HEADERS)
+            writer.writeheader()
+            references = set()
+            rows = 0
+            for row in duplicate_rows(groups):
+                writer.writerow(row)
+                references.add(row['transaction_reference'])
+                rows += 1
+        finally:
+            if options['output']:
+                fh.close()
+
+        style = self.style.WARNING if references else self.style.SUCCESS
+        self.stderr.write(style(f"{len(references)} reused transaction ID(s) across {rows} application(s)"))
+
+        if options['fix_flags']:
+            flagged, unflagged = flag_reused_references()
+            self.stderr.write(self.style.SUCCESS(f"✓ Reuse flag set on {flagged}, cleared on {unflagged} application(s)"))
@@ -0,0 +1,67 @@
+"""
+Django Management Command to verify a conducted lottery.
+
+Replays the draw from its artefact and, unless --skip-db is given, streams the
+scheme's applications to confirm the inputs and lottery statuses still match.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheme.lottery import (
+    LotteryVerificationError,
+    artefact_digest,
+    load_artefact,
+    replay,
+    verify_against_database,
+)
+from scheme.models import LotteryDraw
+
+
+class Command(BaseCommand):
+    help = 'Replay a lottery draw from its signed artefact and confirm the results'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--draw', type=int, help='ID of a stored LotteryDraw')
+        source.add_argument('--file', help='Path to an artefact file')
+
+        parser.add_argument(
+            '--skip-signature',
+            action='store_true',
+            help='Decode the artefact without checking its signature (for auditors without the key)'
+        )
+
+        parser.add_argument(
+            '--skip-db',
+            action='store_true',
+            help='Only replay the artefact, do not compare it with the database'
+        )
+
+    def handle(self, *args, **options):
+        if options['draw']:
+            try:
+                token = LotteryDraw.objects.get(pk=options['draw']).artefact
+            except LotteryDraw.DoesNotExist:
+                raise CommandError(f"Lottery draw {options['draw']} does not exist")
+        else:
+            with open(options['file']) as fh:
+                token = fh.read()
+
+        try:
+            payload = load_artefact(token, verify_signature=not options['skip_signature'])
+        except LotteryVerificationError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Artefact digest: {artefact_digest(token)}")
+        self.stdout.write(f"Algorithm: {payload.get('algorithm')}, seed: {payload.get('seed')}")
+
+        mismatches = replay(payload)
+        if not mismatches and not options['skip_db']:
+            mismatches = verify_against_database(payload)
+
+        if mismatches:
+            for mismatch in mismatches:
+                self.stdout.write(self.style.ERROR(f"  ✗ {mismatch}"))
+            raise CommandError(f"Lottery verification failed with {len(mismatches)} mismatch(es)")
+
+        self.stdout.write(self.style.SUCCESS("✓ Lottery draw verified"))
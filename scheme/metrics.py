@@ -0,0 +1,479 @@
+"""
+Per-request instrumentation with Prometheus histograms.
+
+RequestMetricsMiddleware collects, for each request, the wall time, the
+number and time of SQL queries, cache hits and misses, storage calls and
+their time, and PDF render time, then adds them to per-view histograms.
+``/scheme/internal/metrics/`` serves the histograms in the Prometheus text
+format to requests bearing METRICS_TOKEN, along with the state of each process's database connection pool
+when DATABASES_POOL=psycopg.
+
+Collection is cheap enough to leave on: every database connection gets an
+execute wrapper, and cache and storage backends are wrapped, once at start-up
+(``instrument()``, called from SchemeConfig.ready) with functions that only
+look up a context variable when no request is being measured. The request
+is found through that context variable, so queries and calls that async
+views hand to worker threads are counted too. The registry
+is per process, so every worker serves its own series; scrape each worker
+or add up the series in Prometheus.
+"""
+
+import hmac
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger(__name__)
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Wrapped backend methods; each call is one storage call
+STORAGE_METHODS = ('_save', '_open', 'delete', 'exists', 'url', 'size', 'listdir')
+
+
+def enabled():
+    return getattr(settings, 'REQUEST_METRICS_ENABLED', True)
+
+
+class RequestStats:
+    """Resource use of one request (or of any block under ``collecting()``)"""
+
+    __slots__ = (
+        'db_queries', 'db_seconds', 'cache_hits', 'cache_misses',
+        'storage_calls', 'storage_seconds', 'pdf_renders', 'pdf_seconds',
+    )
+
+    def __init__(self):
+        self.db_queries = self.cache_hits = self.cache_misses = self.storage_calls = self.pdf_renders = 0
+        self.db_seconds = self.storage_seconds = self.pdf_seconds = 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    # Looks the request up per query: async views run their queries on a
+    # worker thread, which sees the request's context but not its connections
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@contextmanager
+def collecting():
+    """
+    Collect the resource use of a block.
+
+    Yields:
+        The RequestStats being filled
+    """
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        with ExitStack() as stack:
+            # Connections opened since instrument() time their queries already
+            for connection in connections.all():
+                if _time_query not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(_time_query))
+            yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def pdf_render():
+    """Time a PDF render as part of the current request"""
+    stats = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.pdf_renders += 1
+            stats.pdf_seconds += time.perf_counter() - start
+
+
+_MISSING = object()
+
+
+def _wrap_cache_get(get):
+    @wraps(get)
+    def instrumented_get(self, key, default=None, version=None):
+        stats = _current.get()
+        value = get(self, key, _MISSING, version)
+        hit = value is not _MISSING
+        if stats is not None:
+            if hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+        return value if hit else default
+    return instrumented_get
+
+
+def _wrap_cache_get_many(get_many):
+    @wraps(get_many)
+    def instrumented_get_many(self, keys, version=None):
+        stats = _current.get()
+        found = get_many(self, keys, version=version)
+        if stats is not None:
+            keys = list(keys) if not isinstance(keys, (list, tuple, set)) else keys
+            stats.cache_hits += len(found)
+            stats.cache_misses += len(keys) - len(found)
+        return found
+    return instrumented_get_many
+
+
+def _wrap_storage(method):
+    @wraps(method)
+    def instrumented(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            stats.storage_calls += 1
+            stats.storage_seconds += time.perf_counter() - start
+    return instrumented
+
+
+def _defining_class(cls, name):
+    return next((klass for klass in cls.__mro__ if name in vars(klass)), None)
+
+
+def _patch(cls, name, wrapper):
+    # Patch the class that defines the method, once
+    klass = _defining_class(cls, name)
+    if klass is None:
+        return
+    method = vars(klass)[name]
+    if not getattr(method, '_instrumented', False):
+        patched = wrapper(method)
+        patched._instrumented = True
+        setattr(klass, name, patched)
+
+
+def instrument_cache(cache_class):
+    from django.core.cache.backends.base import BaseCache
+
+    _patch(cache_class, 'get', _wrap_cache_get)
+    # BaseCache.get_many loops over get, which is already counted
+    if _defining_class(cache_class, 'get_many') is not BaseCache:
+        _patch(cache_class, 'get_many', _wrap_cache_get_many)
+
+
+def instrument_storage(storage_class):
+    for name in STORAGE_METHODS:
+        _patch(storage_class, name, _wrap_storage)
+
+
+def instrument():
+    """Time every connection's queries; wrap the cache backends and the storages of file fields"""
+    if not enabled():
+        return
+    from django.apps import apps
+    from django.core.cache import caches
+    from django.core.files.storage import storages
+    from django.db.backends.signals import connection_created
+    from django.db.models import FileField
+
+    connection_created.connect(_wrap_connection, dispatch_uid='scheme.metrics')
+
+    for alias in settings.CACHES:
+        instrument_cache(type(caches[alias]))
+
+    storage_classes = {type(storages[alias]) for alias in settings.STORAGES}
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, FileField):
+                storage_classes.add(type(field.storage))
+    for storage_class in storage_classes:
+        instrument_storage(storage_class)
+
+
+class Counter:
+    """Prometheus counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Histogram:
+    """Prometheus histogram with labels; buckets are cumulative on output"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        series = self.values.get(labels)
+        if series is None:
+            # One count per bucket, then +Inf, sum
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in sorted(self.values.items()):
+            names = dict(zip(self.labels, labels))
+            total = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                total += count
+                yield f'{self.name}_bucket', {**names, 'le': str(bound)}, total
+            yield f'{self.name}_sum', names, series[-1]
+            yield f'{self.name}_count', names, total
+
+
+class Gauge:
+    """Prometheus gauge with labels, read from ``collect()`` at each scrape"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.collect = collect
+        self.values = {}  # Nothing stored; kept for Registry.reset()
+
+    def samples(self):
+        for labels, value in sorted(self.collect()):
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class CollectedCounter(Gauge):
+    """Prometheus counter kept by someone else, read at each scrape"""
+
+    kind = 'counter'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                    lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.add(Counter(
+    'portal_requests_total', 'Requests by view, method and status code', ('view', 'method', 'status')
+))
+REQUEST_SECONDS = REGISTRY.add(Histogram(
+    'portal_request_duration_seconds', 'Wall time of requests', ('view', 'method'), DURATION_BUCKETS
+))
+DB_QUERIES = REGISTRY.add(Histogram(
+    'portal_request_db_queries', 'SQL queries per request', ('view',), COUNT_BUCKETS
+))
+DB_SECONDS = REGISTRY.add(Histogram(
+    'portal_request_db_seconds', 'Time in SQL queries per request', ('view',), DURATION_BUCKETS
+))
+CACHE_REQUESTS = REGISTRY.add(Counter(
+    'portal_cache_requests_total', 'Cache lookups by view and result', ('view', 'result')
+))
+STORAGE_CALLS = REGISTRY.add(Histogram(
+    'portal_request_storage_calls', 'File storage calls per request', ('view',), COUNT_BUCKETS
+))
+STORAGE_SECONDS = REGISTRY.add(Histogram(
+    'portal_request_storage_seconds', 'Time in file storage calls per request', ('view',), DURATION_BUCKETS
+))
+PDF_SECONDS = REGISTRY.add(Histogram(
+    'portal_pdf_render_seconds', 'Time rendering PDFs per request that renders one', ('view',), DURATION_BUCKETS
+))
+
+# psycopg_pool statistics: current state, and totals since the pool opened
+POOL_GAUGES = ('pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_waiting')
+POOL_COUNTERS = (
+    'requests_num', 'requests_queued', 'requests_wait_ms', 'requests_errors',
+    'connections_num', 'connections_errors', 'connections_lost',
+)
+
+
+def pool_stats():
+    """
+    Statistics of the connection pools of this process.
+
+    Returns:
+        (alias, stats) pairs for each database alias that uses a pool
+    """
+    found = []
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            found.append((alias, pool.get_stats()))
+    return found
+
+
+def _pool_samples(names):
+    def collect():
+        return [
+            ((alias, name), stats.get(name, 0))
+            for alias, stats in pool_stats()
+            for name in names
+        ]
+    return collect
+
+
+DB_POOL = REGISTRY.add(Gauge(
+    'portal_db_pool', 'Connection pool state of this process by database and statistic',
+    ('database', 'stat'), _pool_samples(POOL_GAUGES)
+))
+DB_POOL_EVENTS = REGISTRY.add(CollectedCounter(
+    'portal_db_pool_events_total', 'Connection pool requests, waits and errors by database and statistic',
+    ('database', 'stat'), _pool_samples(POOL_COUNTERS)
+))
+
+
+def record(view, method, status, seconds, stats):
+    """Add one request to the histograms"""
+    with REGISTRY.lock:
+        REQUESTS.inc((view, method, str(status)))
+        REQUEST_SECONDS.observe((view, method), seconds)
+        DB_QUERIES.observe((view,), stats.db_queries)
+        DB_SECONDS.observe((view,), stats.db_seconds)
+        if stats.cache_hits:
+            CACHE_REQUESTS.inc((view, 'hit'), stats.cache_hits)
+        if stats.cache_misses:
+            CACHE_REQUESTS.inc((view, 'miss'), stats.cache_misses)
+        STORAGE_CALLS.observe((view,), stats.storage_calls)
+        STORAGE_SECONDS.observe((view,), stats.storage_seconds)
+        if stats.pdf_renders:
+            PDF_SECONDS.observe((view,), stats.pdf_seconds)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    # Named routes; the route pattern keeps ids out of the label
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route
+
+
+class RequestMetricsMiddleware:
+    """Measure every request; keep it first in MIDDLEWARE"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        if not enabled():
+            return self.get_response(request)
+        start = time.perf_counter()
+        with collecting() as stats:
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def _acall(self, request):
+        if not enabled():
+            return await self.get_response(request)
+        start = time.perf_counter()
+        with collecting() as stats:
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    def _record(self, request, response, seconds, stats):
+        view = view_label(request)
+        record(view, request.method, response.status_code, seconds, stats)
+        slow = getattr(settings, 'REQUEST_METRICS_SLOW_SECONDS', 2)
+        if slow is not None and seconds > slow:
+            logger.warning(f"Slow request {request.method} {view} took {seconds:.3f}s: {stats.as_dict()}")
+
+
+def _allowed(request):
+    # Behind the load balancer every request arrives from a private address,
+    # so the address proves nothing: without a token nobody may scrape
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """The histograms in the Prometheus text format"""
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
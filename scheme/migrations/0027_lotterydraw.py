@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0026_alter_application_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotteryDraw',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seed', models.CharField(max_length=64)),
+                ('algorithm_version', models.CharField(max_length=50)),
+                ('artefact', models.TextField(editable=False)),
+                ('artefact_digest', models.CharField(editable=False, help_text='SHA-256 of the signed artefact', max_length=64)),
+                ('conducted_at', models.DateTimeField(auto_now_add=True)),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lottery_draws', to='scheme.scheme')),
+            ],
+            options={
+                'verbose_name': 'Lottery Draw',
+                'verbose_name_plural': 'Lottery Draws',
+                'ordering': ['-conducted_at'],
+            },
+        ),
+    ]
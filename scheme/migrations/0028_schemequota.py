@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0027_lotterydraw'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemeQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plot_category', models.CharField(choices=[('EWS', 'Economically Weaker Section'), ('LIG', 'Low Income Group')], max_length=10)),
+                ('sub_category', models.CharField(choices=[('un-reserved', 'Un-Reserved'), ('un-reserved-dls', 'Un-Reserved (Destitute & Landless Single)'), ('un-reserved-handicap', 'Un-Reserved Handicap'), ('gov-employees', 'Government Employees'), ('journalist', 'Journalist'), ('other-soldiers', 'Other soldiers (including ex-servicemen)'), ('sc', 'Scheduled Caste'), ('st', 'Scheduled Tribe'), ('soldier-handicapped', 'Soldier Handicapped'), ('soldier-widow-dependent', 'Soldier (Widow & Dependent)'), ('transgender', 'Transgender')], max_length=100)),
+                ('plots', models.PositiveIntegerField()),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quotas', to='scheme.scheme')),
+            ],
+            options={
+                'verbose_name': 'Reserved Quota',
+                'verbose_name_plural': 'Reserved Quotas',
+                'unique_together': {('scheme', 'plot_category', 'sub_category')},
+            },
+        ),
+    ]
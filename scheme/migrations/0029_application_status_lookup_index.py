@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:28
+
+from django.db import migrations, models
+
+from ._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('scheme', '0028_schemequota'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['scheme', 'application_number', 'mobile_number', 'application_status', 'payment_status', 'lottery_status'], name='idx_app_status_lookup'),
+        ),
+    ]
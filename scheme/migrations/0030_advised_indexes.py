@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:31
+
+from django.db import migrations, models
+
+from ._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('scheme', '0029_application_status_lookup_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['-application_submission_date'], name='idx_app_all_recent'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['scheme', '-application_submission_date'], name='idx_app_scheme_recent'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['scheme', 'application_status', '-application_submission_date'], name='idx_app_scheme_status'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['scheme', 'payment_status', '-application_submission_date'], name='idx_app_scheme_payment'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['scheme', 'lottery_status', '-application_submission_date'], name='idx_app_scheme_lottery'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(condition=models.Q(('application_status', 'ACCEPTED'), ('payment_status', 'VERIFIED')), fields=['scheme', 'plot_category', 'sub_category', 'application_number'], name='idx_app_lottery_bucket'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:34
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+from ._operations import AddIndexConcurrently
+
+
+# The SQL is spelled out here rather than imported from scheme.search, so the
+# migration keeps doing what it did when it was written
+
+TRIGRAM_INDEXES = {
+    'idx_app_name_trgm': 'applicant_name',
+    'idx_app_father_name_trgm': 'father_or_husband_name',
+}
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS scheme_application_fts USING fts5("
+    "applicant_name, father_or_husband_name, content='scheme_application', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS scheme_application_fts_ai AFTER INSERT ON scheme_application BEGIN "
+    "INSERT INTO scheme_application_fts(rowid, applicant_name, father_or_husband_name) "
+    "VALUES (new.id, new.applicant_name, new.father_or_husband_name); END",
+    "CREATE TRIGGER IF NOT EXISTS scheme_application_fts_ad AFTER DELETE ON scheme_application BEGIN "
+    "INSERT INTO scheme_application_fts(scheme_application_fts, rowid, applicant_name, father_or_husband_name) "
+    "VALUES ('delete', old.id, old.applicant_name, old.father_or_husband_name); END",
+    "CREATE TRIGGER IF NOT EXISTS scheme_application_fts_au AFTER UPDATE ON scheme_application BEGIN "
+    "INSERT INTO scheme_application_fts(scheme_application_fts, rowid, applicant_name, father_or_husband_name) "
+    "VALUES ('delete', old.id, old.applicant_name, old.father_or_husband_name); "
+    "INSERT INTO scheme_application_fts(rowid, applicant_name, father_or_husband_name) "
+    "VALUES (new.id, new.applicant_name, new.father_or_husband_name); END",
+    "INSERT INTO scheme_application_fts(scheme_application_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_DROP = [
+    'DROP TRIGGER IF EXISTS scheme_application_fts_ai',
+    'DROP TRIGGER IF EXISTS scheme_application_fts_ad',
+    'DROP TRIGGER IF EXISTS scheme_application_fts_au',
+    'DROP TABLE IF EXISTS scheme_application_fts',
+]
+
+
+def create_name_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute('SET statement_timeout = 0')
+        for name, column in TRIGRAM_INDEXES.items():
+            schema_editor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON scheme_application '
+                f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+        schema_editor.execute('RESET statement_timeout')
+    elif connection.vendor == 'sqlite':
+        for sql in SQLITE_FTS:
+            schema_editor.execute(sql)
+
+
+def drop_name_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for name in TRIGRAM_INDEXES:
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    elif connection.vendor == 'sqlite':
+        for sql in SQLITE_FTS_DROP:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('scheme', '0030_advised_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['mobile_number'], name='idx_app_mobile'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['aadhar_number'], name='idx_app_aadhar'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['id_number'], name='idx_app_id_number'),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='idx_app_email_upper'),
+        ),
+        migrations.RunPython(create_name_search_index, drop_name_search_index),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_status_counts(apps, schema_editor):
+    Application = apps.get_model('scheme', 'Application')
+    SchemeStatusCount = apps.get_model('scheme', 'SchemeStatusCount')
+    rows = []
+    for field in ('application_status', 'payment_status'):
+        for row in Application.objects.order_by().values('scheme_id', field).annotate(n=Count('id')):
+            rows.append(SchemeStatusCount(scheme_id=row['scheme_id'], field=field, value=row[field], count=row['n']))
+    SchemeStatusCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0033_exportjob_parquet_format'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransitionBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transition', models.CharField(max_length=30)),
+                ('field', models.CharField(max_length=30)),
+                ('to_value', models.CharField(max_length=20)),
+                ('remark', models.TextField(blank=True)),
+                ('source', models.CharField(help_text='admin action or upload', max_length=20)),
+                ('requested', models.PositiveIntegerField(default=0)),
+                ('updated', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0, help_text='Selected rows not in an allowed state')),
+                ('application_numbers', models.TextField(blank=True, editable=False)),
+                ('performed_at', models.DateTimeField(auto_now_add=True)),
+                ('performed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_transitions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Status Transition Batch',
+                'verbose_name_plural': 'Status Transition Batches',
+                'ordering': ['-performed_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SchemeStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=30)),
+                ('value', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('scheme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_counts', to='scheme.scheme')),
+            ],
+            options={
+                'verbose_name': 'Scheme Status Count',
+                'verbose_name_plural': 'Scheme Status Counts',
+                'unique_together': {('scheme', 'field', 'value')},
+            },
+        ),
+        migrations.RunPython(populate_status_counts, migrations.RunPython.noop),
+    ]
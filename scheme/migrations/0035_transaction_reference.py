@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:44
+
+import re
+
+from django.db import migrations, models
+
+from ._operations import AddIndexConcurrently
+from django.db.models import Count
+
+
+def backfill_transaction_references(apps, schema_editor):
+    Application = apps.get_model('scheme', 'Application')
+    batch = []
+    for application in Application.objects.only('id', 'dd_id_or_transaction_id').iterator(chunk_size=2000):
+        application.transaction_reference = re.sub(r'[\s-]', '', application.dd_id_or_transaction_id or '').upper()
+        batch.append(application)
+        if len(batch) == 2000:
+            Application.objects.bulk_update(batch, ['transaction_reference'])
+            batch = []
+    Application.objects.bulk_update(batch, ['transaction_reference'])
+
+    reused = (
+        Application.objects.exclude(transaction_reference='')
+        .values('transaction_reference').annotate(n=Count('id')).filter(n__gt=1)
+        .values('transaction_reference')
+    )
+    Application.objects.filter(transaction_reference__in=reused).update(transaction_reused=True)
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('scheme', '0034_status_transitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='transaction_reference',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='transaction_reused',
+            field=models.BooleanField(default=False, editable=False, help_text='The transaction ID is also used by another application'),
+        ),
+        migrations.RunPython(backfill_transaction_references, migrations.RunPython.noop, atomic=True),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['transaction_reference'], name='idx_app_txn_reference'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:47
+
+from django.db import migrations, models
+
+from ._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL
+    atomic = False
+
+    dependencies = [
+        ('scheme', '0035_transaction_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentityKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('AADHAAR', 'Aadhaar Number'), ('MOBILE', 'Mobile Number'), ('BANK_ACCOUNT', 'Bank Account'), ('EMAIL', 'Email')], max_length=12)),
+                ('digest', models.CharField(max_length=64)),
+                ('cluster', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Identity Key',
+                'verbose_name_plural': 'Identity Keys',
+            },
+        ),
+        migrations.AddField(
+            model_name='application',
+            name='identity_cluster',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='application',
+            index=models.Index(fields=['identity_cluster'], name='idx_app_identity_cluster'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='identitykey',
+            unique_together={('kind', 'digest')},
+        ),
+    ]
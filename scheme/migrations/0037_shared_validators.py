@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:49
+
+import scheme.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0036_identity_graph'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='application',
+            name='aadhar_number',
+            field=models.CharField(max_length=12, validators=[scheme.validators.RuleValidator('aadhar_number')]),
+        ),
+        migrations.AlterField(
+            model_name='application',
+            name='applicant_bank_ifsc',
+            field=models.CharField(max_length=11, validators=[scheme.validators.RuleValidator('ifsc')]),
+        ),
+        migrations.AlterField(
+            model_name='application',
+            name='mobile_number',
+            field=models.CharField(max_length=10, validators=[scheme.validators.RuleValidator('mobile_number')]),
+        ),
+        migrations.AlterField(
+            model_name='application',
+            name='permanent_address_pincode',
+            field=models.CharField(max_length=6, validators=[scheme.validators.RuleValidator('pincode')]),
+        ),
+        migrations.AlterField(
+            model_name='application',
+            name='postal_address_pincode',
+            field=models.CharField(max_length=6, validators=[scheme.validators.RuleValidator('pincode')]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0037_shared_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lotterydraw',
+            name='redraw_reason',
+            field=models.TextField(blank=True, editable=False, help_text='Why an earlier draw was superseded'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:45
+
+from django.db import migrations, models
+
+
+def fail_unfinished_jobs(apps, schema_editor):
+    # Their rows were recorded as a pickled query, which is no longer read
+    ExportJob = apps.get_model('scheme', 'ExportJob')
+    ExportJob.objects.filter(status__in=['QUEUED', 'RUNNING']).update(
+        status='FAILED', error='Queued before an upgrade of the export jobs; run the export again',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0038_lotterydraw_redraw_reason'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_unfinished_jobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='exportjob',
+            name='query',
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='object_ids',
+            field=models.TextField(blank=True, editable=False, help_text='Packed primary keys of the rows to export'),
+        ),
+    ]
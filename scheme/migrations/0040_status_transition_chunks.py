@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_application_numbers(apps, schema_editor):
+    # Earlier batches did not keep the scheme of their applications
+    StatusTransitionBatch = apps.get_model('scheme', 'StatusTransitionBatch')
+    StatusTransitionChunk = apps.get_model('scheme', 'StatusTransitionChunk')
+    StatusTransitionChunk.objects.bulk_create(
+        StatusTransitionChunk(batch_id=pk, application_numbers=numbers)
+        for pk, numbers in StatusTransitionBatch.objects.exclude(application_numbers='').values_list('pk', 'application_numbers')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0039_exportjob_object_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransitionChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application_numbers', models.TextField(editable=False)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='scheme.statustransitionbatch')),
+                ('scheme', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='scheme.scheme')),
+            ],
+            options={
+                'verbose_name': 'Status Transition Chunk',
+                'verbose_name_plural': 'Status Transition Chunks',
+            },
+        ),
+        migrations.RunPython(move_application_numbers, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='statustransitionbatch',
+            name='application_numbers',
+        ),
+    ]
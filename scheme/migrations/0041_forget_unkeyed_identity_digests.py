@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def forget_identities(apps, schema_editor):
+    # The stored digests were plain SHA-256 and can be reversed; relink with
+    # `manage.py link_identities`, which picks up the unlinked applications
+    IdentityKey = apps.get_model('scheme', 'IdentityKey')
+    Application = apps.get_model('scheme', 'Application')
+    IdentityKey.objects.all().delete()
+    Application.objects.exclude(identity_cluster__isnull=True).update(identity_cluster=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheme', '0040_status_transition_chunks'),
+    ]
+
+    operations = [
+        migrations.RunPython(forget_identities, migrations.RunPython.noop),
+    ]
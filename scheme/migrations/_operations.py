@@ -0,0 +1,36 @@
+"""
+Migration operations shared by the scheme migrations.
+
+The leading underscore keeps the migration loader from treating this module
+as a migration.
+"""
+
+from django.contrib.postgres.operations import AddIndexConcurrently as PostgresAddIndexConcurrently
+from django.db.migrations.operations import AddIndex
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, a plain AddIndex elsewhere.
+
+    A plain CREATE INDEX blocks writes to the table for the whole build, which
+    on scheme_application means blocking submissions. Migrations using this
+    must set ``atomic = False``.
+
+    The build can outlast the statement_timeout set in settings.DATABASES,
+    so the timeout is lifted for it.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute('SET statement_timeout = 0')
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+            schema_editor.execute('RESET statement_timeout')
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
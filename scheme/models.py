@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
@@ -5,6 +6,7 @@ from django.db import transaction
 import os
 from django.core.files.base import ContentFile
 from django.db.models import F
+from django.db.models.functions import Upper
 import time
 from django.db import models
 from django.utils import timezone
@@ -13,8 +15,17 @@ import random
 import string
 
 from storages.backends.s3boto3 import S3Boto3Storage
+import re
+
+from .validators import RuleValidator, validate_id_number
 # Create your models here.
 
+
+def normalise_reference(value):
+    """Transaction reference as compared: upper case, spaces and dashes removed"""
+    return re.sub(r'[\s-]', '', str(value or '')).upper()
+
+
 class Scheme(models.Model):
 
     # ID Type choices
@@ -86,6 +97,24 @@ class Scheme(models.Model):
             self.next_application_number = self.application_number_start
         
         super().save(*args, **kwargs)
+
+    def current_status(self, now=None):
+        """Stage of the scheme, from its dates"""
+        now = now or timezone.now()
+        if self.close_date and now > self.close_date:
+            return "Closed"
+        elif self.lottery_result_date and now > self.lottery_result_date:
+            return "Lottery Announced"
+        elif self.appeal_end_date and now > self.appeal_end_date:
+            return "Lottery Pending"
+        elif self.successful_applicants_publish_date and now > self.successful_applicants_publish_date:
+            return "Appeal Period"
+        elif self.application_close_date and now > self.application_close_date:
+            return "Applications Under Review"
+        elif self.application_open_date and now >= self.application_open_date:
+            return "Applications Open"
+        else:
+            return "Coming Soon"
     
     @property
     def total_applications(self):
@@ -245,7 +274,7 @@ class Application(models.Model):
     scheme = models.ForeignKey('Scheme', on_delete=models.PROTECT, related_name='applications')
     mobile_number = models.CharField(
         max_length=10,
-        validators=[RegexValidator(regex=r'^\d{10}$', message='Enter a valid 10-digit mobile number')]
+        validators=[RuleValidator('mobile_number')]
     )
 
     # to be set at runtime by save method. 
@@ -260,9 +289,7 @@ class Application(models.Model):
     id_number = models.CharField(max_length=20)
     aadhar_number = models.CharField(
         max_length=12,
-        validators=[RegexValidator(
-            regex=r'^[0-9]{12}$' , message='Enter a valid Aadhar number (12 digits)')
-        ]
+        validators=[RuleValidator('aadhar_number')]
     )
 
     
@@ -270,12 +297,12 @@ class Application(models.Model):
     permanent_address = models.TextField()
     permanent_address_pincode = models.CharField(
         max_length=6,
-        validators=[RegexValidator(regex=r'^\d{6}$', message='Enter a valid 6-digit pincode')]
+        validators=[RuleValidator('pincode')]
     )
     postal_address = models.TextField()
     postal_address_pincode = models.CharField(
         max_length=6,
-        validators=[RegexValidator(regex=r'^\d{6}$', message='Enter a valid 6-digit pincode')]
+        validators=[RuleValidator('pincode')]
     )
     
     # Contact & Income
@@ -317,6 +344,12 @@ class Application(models.Model):
         decimal_places=2, 
         verbose_name='DD Amount/Transaction Amount'
     )
+    # dd_id_or_transaction_id folded by normalise_reference, for duplicate
+    # detection and statement matching
+    transaction_reference = models.CharField(max_length=100, blank=True, default='', editable=False)
+    transaction_reused = models.BooleanField(
+        default=False, editable=False, help_text='The transaction ID is also used by another application'
+    )
 
 
 
@@ -397,7 +430,7 @@ class Application(models.Model):
     applicant_bank_branch_address = models.TextField()
     applicant_bank_ifsc = models.CharField(
         max_length=11,
-        validators=[RegexValidator(regex=r'^[A-Z]{4}0[A-Z0-9]{6}$', message='Enter a valid IFSC code')]
+        validators=[RuleValidator('ifsc')]
     )
     
     # Application Tracking
@@ -451,6 +484,10 @@ class Application(models.Model):
         verbose_name='Application PDF'
     )
 
+    # Applications sharing an Aadhaar, mobile, bank account or email, in any
+    # scheme, have the same cluster (see scheme/identity.py)
+    identity_cluster = models.BigIntegerField(null=True, blank=True, editable=False)
+
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -462,6 +499,36 @@ class Application(models.Model):
             ('scheme', 'aadhar_number'),
             ('scheme', 'applicant_account_number'),
         )
+        indexes = [
+            # Covering index for the applicant status lookup: the three status
+            # columns are trailing key columns so the lookup is an index-only scan.
+            models.Index(
+                fields=['scheme', 'application_number', 'mobile_number',
+                        'application_status', 'payment_status', 'lottery_status'],
+                name='idx_app_status_lookup',
+            ),
+            # Admin changelist: ordered by submission date, usually filtered by
+            # scheme and one status (see scheme/indexing.py QUERY_SHAPES)
+            models.Index(fields=['-application_submission_date'], name='idx_app_all_recent'),
+            models.Index(fields=['scheme', '-application_submission_date'], name='idx_app_scheme_recent'),
+            models.Index(fields=['scheme', 'application_status', '-application_submission_date'], name='idx_app_scheme_status'),
+            models.Index(fields=['scheme', 'payment_status', '-application_submission_date'], name='idx_app_scheme_payment'),
+            models.Index(fields=['scheme', 'lottery_status', '-application_submission_date'], name='idx_app_scheme_lottery'),
+            # Exact-match search fast paths (see scheme/search.py)
+            models.Index(fields=['mobile_number'], name='idx_app_mobile'),
+            models.Index(fields=['aadhar_number'], name='idx_app_aadhar'),
+            models.Index(fields=['id_number'], name='idx_app_id_number'),
+            models.Index(Upper('email'), name='idx_app_email_upper'),
+            # Reused transaction IDs across all schemes
+            models.Index(fields=['transaction_reference'], name='idx_app_txn_reference'),
+            models.Index(fields=['identity_cluster'], name='idx_app_identity_cluster'),
+            # Lottery draw: only eligible applications, read per plot category
+            models.Index(
+                fields=['scheme', 'plot_category', 'sub_category', 'application_number'],
+                name='idx_app_lottery_bucket',
+                condition=models.Q(application_status='ACCEPTED', payment_status='VERIFIED'),
+            ),
+        ]
         ordering = ['-application_submission_date']
         verbose_name = 'Application'
         verbose_name_plural = 'Applications'
@@ -474,26 +541,16 @@ class Application(models.Model):
         super().clean()
 
         # Validate ID number based on ID type
-        
-        import re
-        if self.id_type == 'PAN_CARD':
-            if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', self.id_number):
-                raise ValidationError({'id_number':'Enter a valid PAN number (e.g., ABCDE1234F)'})
-        elif self.id_type == 'RATION_CARD':
-            if len(self.id_number) < 8 or len(self.id_number) > 15:
-                raise ValidationError({'id_number': 'Ration card number must be between 8-15 characters'})
-        elif self.id_type == 'JAN_AADHAR':
-            if not self.id_number.isdigit() or len(self.id_number) != 10:
-                raise ValidationError({'id_number': 'Jan Aadhar number must be 10 digits'})
-        elif self.id_type == 'VOTER_ID':
-            if not re.match(r'^[A-Z]{3}[0-9]{7}$', self.id_number):
-                raise ValidationError({'id_number': 'Enter a valid VOTER ID number'})
+        try:
+            validate_id_number(self.id_type, self.id_number)
+        except ValidationError as e:
+            raise ValidationError({'id_number': e.messages})
     
-    def save(self, *args, **kwargs):
-        print('save is called with mobile number:', self.mobile_number, "scheme_id" , self.scheme.id)
-        """Auto-fill fields based on annual income before saving"""
+    def apply_income_rules(self):
+        """Auto-fill plot category and fees based on annual income"""
         # Set plot category based on income
-        if self.annual_income == 'UP_TO_3L':
+        # 'UP_TO_3L' is the value used before the choices were renamed
+        if self.annual_income in (self.INCOME_CHOICES.ZERO_TO_THREE, 'UP_TO_3L'):
             self.plot_category = 'EWS'
             self.registration_fees = Decimal('10000.00')
         elif self.annual_income == '3L_6L':
@@ -503,6 +560,20 @@ class Application(models.Model):
         # Calculate total payable amount
         self.total_payable_amount = self.registration_fees + self.processing_fees
 
+    def save(self, *args, **kwargs):
+        print('save is called with mobile number:', self.mobile_number, "scheme_id" , self.scheme.id)
+        """Auto-fill fields based on annual income before saving"""
+        self.apply_income_rules()
+
+        previous_reference = getattr(self, '_loaded_reference', None)
+        self.transaction_reference = normalise_reference(self.dd_id_or_transaction_id)
+        reference_changed = self.transaction_reference != previous_reference
+        if reference_changed:
+            # One lookup on idx_app_txn_reference
+            self.transaction_reused = bool(self.transaction_reference) and Application.objects.filter(
+                transaction_reference=self.transaction_reference
+            ).exclude(pk=self.pk).exists()
+
 
         # make sure to keep this chek at the end of save as it runs a atomic transection on database to genrate application number which can only be genrated once.         
         if self.pk is None:
@@ -522,6 +593,36 @@ class Application(models.Model):
         else:
             super().save(*args, **kwargs)
 
+        if reference_changed:
+            self._flag_reused_reference(previous_reference)
+
+    def _flag_reused_reference(self, previous_reference):
+        """Update the reuse flag of the other applications sharing the old or new transaction ID"""
+        if self.transaction_reused:
+            Application.objects.filter(
+                transaction_reference=self.transaction_reference, transaction_reused=False
+            ).exclude(pk=self.pk).update(transaction_reused=True)
+        if previous_reference:
+            others = Application.objects.filter(transaction_reference=previous_reference).exclude(pk=self.pk)
+            if len(others[:2]) == 1:
+                others.update(transaction_reused=False)
+        self._loaded_reference = self.transaction_reference
+
+    # Status columns whose per-scheme totals are kept in SchemeStatusCount
+    COUNTED_STATUS_FIELDS = ('application_status', 'payment_status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded statuses so a later save can adjust the counters
+        instance._loaded_statuses = {
+            field: getattr(instance, field)
+            for field in cls.COUNTED_STATUS_FIELDS if field in field_names
+        }
+        if 'transaction_reference' in field_names:
+            instance._loaded_reference = instance.transaction_reference
+        return instance
+
 
 
 
@@ -545,3 +646,228 @@ class Application(models.Model):
     
 
 
+
+class SchemeQuota(models.Model):
+    """
+    Plots reserved for one sub-category within a plot category of a scheme.
+
+    Plots of a category not covered by any quota row are treated as
+    un-reserved (see scheme.allocation.quota_table).
+    """
+    scheme = models.ForeignKey('Scheme', on_delete=models.CASCADE, related_name='quotas')
+    plot_category = models.CharField(max_length=10, choices=Application.PLOT_CATEGORY_CHOICES)
+    sub_category = models.CharField(max_length=100, choices=Application.SUB_CATEGORY_CHOICES)
+    plots = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['scheme', 'plot_category', 'sub_category']
+        verbose_name = 'Reserved Quota'
+        verbose_name_plural = 'Reserved Quotas'
+
+    def __str__(self):
+        return f"{self.scheme} - {self.plot_category} / {self.get_sub_category_display()}: {self.plots}"
+
+    def clean(self):
+        if not self.scheme_id or not self.plot_category or self.plots is None:
+            return
+
+        if self.plot_category == Application.PLOT_CATEGORY_CHOICES.EWS:
+            total = self.scheme.ews_plot_count
+        else:
+            total = self.scheme.Lig_plot_count
+
+        assigned = SchemeQuota.objects.filter(
+            scheme_id=self.scheme_id,
+            plot_category=self.plot_category,
+        ).exclude(pk=self.pk).aggregate(total=models.Sum('plots'))['total'] or 0
+
+        if assigned + self.plots > total:
+            raise ValidationError({
+                'plots': f"Quotas for {self.plot_category} add up to {assigned + self.plots}, "
+                         f"but the scheme only has {total} {self.plot_category} plots"
+            })
+
+
+class LotteryDraw(models.Model):
+    """
+    One conducted lottery draw for a scheme.
+
+    ``artefact`` is the signed, compressed record of the draw (seed, sorted
+    inputs per bucket, algorithm version and results). Publish
+    ``artefact_digest`` with the results so the artefact can be checked by
+    third parties with ``manage.py verify_lottery``. Any draw after the first
+    of a scheme records why it was redrawn.
+    """
+    scheme = models.ForeignKey('Scheme', on_delete=models.PROTECT, related_name='lottery_draws')
+    seed = models.CharField(max_length=64)
+    algorithm_version = models.CharField(max_length=50)
+    redraw_reason = models.TextField(blank=True, editable=False, help_text='Why an earlier draw was superseded')
+    artefact = models.TextField(editable=False)
+    artefact_digest = models.CharField(max_length=64, editable=False, help_text='SHA-256 of the signed artefact')
+    conducted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-conducted_at']
+        verbose_name = 'Lottery Draw'
+        verbose_name_plural = 'Lottery Draws'
+
+    def __str__(self):
+        return f"Draw {self.pk} for {self.scheme} ({self.conducted_at:%d-%m-%Y %H:%M})"
+
+
+class ExportJob(models.Model):
+    """
+    A queued export of an import-export resource.
+
+    Admin export actions create the job and ``manage.py run_export_worker``
+    builds the file into the ``exports`` storage (see settings.STORAGES),
+    updating ``processed_rows`` and ``heartbeat_at`` as it goes. Running jobs
+    whose heartbeat stops (a crashed worker) are queued again, up to
+    EXPORT_JOB_MAX_ATTEMPTS runs, by scheme.export_jobs.sweep_stale_jobs.
+    """
+    class STATUS_CHOICES(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    class FORMAT_CHOICES(models.TextChoices):
+        CSV = 'csv', 'CSV'
+        XLSX = 'xlsx', 'Excel'
+        PARQUET = 'parquet', 'Parquet'
+
+    resource_path = models.CharField(max_length=200, help_text='Dotted path of the import-export resource')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=FORMAT_CHOICES.CSV)
+    object_ids = models.TextField(
+        editable=False, blank=True, help_text='Packed primary keys of the rows to export'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_CHOICES.QUEUED)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    file_name = models.CharField(max_length=255, blank=True, help_text='Name of the file in the exports storage')
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Export Job'
+        verbose_name_plural = 'Export Jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='idx_exportjob_queue'),
+        ]
+
+    def __str__(self):
+        return f"Export {self.pk} ({self.resource_path.rsplit('.', 1)[-1]}, {self.format})"
+
+    @property
+    def progress(self):
+        """Percentage of rows written"""
+        if self.status == self.STATUS_CHOICES.DONE:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, self.processed_rows * 100 // self.total_rows)
+
+
+class SchemeStatusCount(models.Model):
+    """
+    Number of applications of a scheme per status value.
+
+    Kept up to date by Application saves and deletes (scheme/signals.py) and
+    by bulk transitions (scheme/workflow.py); ``manage.py
+    rebuild_status_counts`` recomputes them after raw SQL changes.
+    """
+    scheme = models.ForeignKey('Scheme', on_delete=models.CASCADE, related_name='status_counts')
+    field = models.CharField(max_length=30)
+    value = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('scheme', 'field', 'value')
+        verbose_name = 'Scheme Status Count'
+        verbose_name_plural = 'Scheme Status Counts'
+
+    def __str__(self):
+        return f"{self.scheme_id} {self.field}={self.value}: {self.count}"
+
+
+class StatusTransitionBatch(models.Model):
+    """
+    Audit record of one bulk status transition.
+
+    The row is created before the first chunk is applied. Each chunk then
+    adds its counts and its StatusTransitionChunk rows in the transaction
+    that changes the statuses, so the audit trail never lags the data.
+    """
+    transition = models.CharField(max_length=30)
+    field = models.CharField(max_length=30)
+    to_value = models.CharField(max_length=20)
+    remark = models.TextField(blank=True)
+    source = models.CharField(max_length=20, help_text='admin action or upload')
+    requested = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0, help_text='Selected rows not in an allowed state')
+    performed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='status_transitions'
+    )
+    performed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-performed_at']
+        verbose_name = 'Status Transition Batch'
+        verbose_name_plural = 'Status Transition Batches'
+
+    def __str__(self):
+        return f"{self.transition}: {self.updated} updated ({self.performed_at:%d-%m-%Y %H:%M})"
+
+
+class StatusTransitionChunk(models.Model):
+    """
+    Applications of one scheme updated by one chunk of a bulk transition.
+
+    ``application_numbers`` holds them in a compact packed form; use
+    ``scheme.workflow.unpack_numbers`` to read it. ``scheme`` is empty for
+    batches recorded before chunks kept their scheme.
+    """
+    batch = models.ForeignKey(StatusTransitionBatch, on_delete=models.CASCADE, related_name='chunks')
+    scheme = models.ForeignKey('Scheme', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    application_numbers = models.TextField(editable=False)
+
+    class Meta:
+        verbose_name = 'Status Transition Chunk'
+        verbose_name_plural = 'Status Transition Chunks'
+
+    def __str__(self):
+        return f"Chunk {self.pk} of batch {self.batch_id}"
+
+
+class IdentityKey(models.Model):
+    """
+    Node of the applicant identity graph: a hashed, normalised identifier and
+    the cluster of the applications that used it (scheme/identity.py).
+    """
+
+    class KIND_CHOICES(models.TextChoices):
+        AADHAAR = 'AADHAAR', 'Aadhaar Number'
+        MOBILE = 'MOBILE', 'Mobile Number'
+        BANK_ACCOUNT = 'BANK_ACCOUNT', 'Bank Account'
+        EMAIL = 'EMAIL', 'Email'
+
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    digest = models.CharField(max_length=64)
+    cluster = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        unique_together = ('kind', 'digest')
+        verbose_name = 'Identity Key'
+        verbose_name_plural = 'Identity Keys'
+
+    def __str__(self):
+        return f"{self.kind} {self.digest[:12]} -> {self.cluster}"
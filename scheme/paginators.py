@@ -0,0 +1,82 @@
+import json
+
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+# Query parameter that asks the admin changelist for an exact row count
+EXACT_COUNT_VAR = 'exact_count'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the PostgreSQL planner for large result sets.
+
+    An exact COUNT(*) over a few lakh filtered rows dominates changelist page
+    loads. On PostgreSQL the planner's row estimate for the query is used
+    instead whenever it is at least ESTIMATED_COUNT_THRESHOLD rows; smaller
+    result sets, other databases and ``exact=True`` fall back to COUNT(*).
+
+    ``estimated`` tells templates whether ``count`` is approximate.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, exact=False):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.exact = exact
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        if not self.exact:
+            estimate = self.estimate()
+            if estimate is not None and estimate >= getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 10000):
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def estimate(self):
+        """
+        Planner row estimate for the object list.
+
+        Returns:
+            Estimated number of rows, or None when no estimate is available
+        """
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or connections[queryset.db].vendor != 'postgresql':
+            return None
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        if isinstance(plan, list):
+            plan = plan[0]
+        return int(plan['Plan']['Plan Rows'])
+
+    def validate_number(self, number):
+        # An estimate can overshoot, so pages past the real end are empty
+        # instead of an error
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.estimated and int(number) >= 1:
+                return int(number)
+            raise
+
+
+class ExactCountChangeList(ChangeList):
+    """
+    Changelist that understands EXACT_COUNT_VAR.
+
+    The parameter is kept out of the filter lookups (the changelist rejects
+    unknown ones) but stays in ``params``, so pagination, filter and date
+    links carry it along.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(EXACT_COUNT_VAR, None)
+        return lookup_params
+
+
+def wants_exact_count(request):
+    return request.GET.get(EXACT_COUNT_VAR, '') not in ('', '0')
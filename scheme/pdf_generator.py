@@ -0,0 +1,108 @@
+"""
+Acknowledgement PDF of a submitted application.
+
+The document is one A4 page of text in the PDF base fonts (Helvetica), so it
+is written directly, without a rendering engine or font files. Text outside
+Latin-1 is replaced with '?'.
+"""
+
+from django.utils import timezone
+
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 56
+LINE_HEIGHT = 18
+LABEL_WIDTH = 200
+
+
+def escape_text(text):
+    """Text as a PDF string literal body: Latin-1, with delimiters escaped"""
+    text = str(text).encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').replace('\r', '').replace('\n', ' ')
+
+
+class ApplicationPDFGenerator:
+    """
+    Builds the acknowledgement of one application.
+
+    Usage:
+        pdf = ApplicationPDFGenerator(application).create_pdf()
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    def rows(self):
+        """(label, value) pairs printed on the acknowledgement"""
+        application = self.application
+        submitted = application.application_submission_date
+        if submitted and timezone.is_aware(submitted):
+            submitted = timezone.localtime(submitted)
+        return [
+            ('Scheme', application.scheme.name),
+            ('Application Number', application.application_number),
+            ('Submitted On', f'{submitted:%d-%m-%Y %H:%M}' if submitted else ''),
+            ('Applicant Name', application.applicant_name),
+            ('Father/Husband Name', application.father_or_husband_name),
+            ('Date of Birth', f'{application.dob:%d-%m-%Y}' if application.dob else ''),
+            ('Mobile Number', application.mobile_number),
+            ('Email', application.email),
+            ('Annual Income', application.get_annual_income_display()),
+            ('Plot Category', application.get_plot_category_display()),
+            ('Sub Category', application.get_sub_category_display()),
+            ('Payment Mode', application.get_payment_mode_display()),
+            ('DD / Transaction ID', application.dd_id_or_transaction_id),
+            ('Amount Paid', application.dd_amount_or_transaction_amount),
+            ('Total Payable', application.total_payable_amount),
+            ('Application Status', application.get_application_status_display()),
+            ('Payment Status', application.get_payment_status_display()),
+        ]
+
+    def content(self):
+        """The page's content stream"""
+        y = PAGE_HEIGHT - MARGIN
+        lines = [
+            'BT', '/F2 16 Tf', f'{MARGIN} {y} Td', '(Application Acknowledgement) Tj', 'ET',
+        ]
+        y -= 2 * LINE_HEIGHT
+        for label, value in self.rows():
+            lines += [
+                'BT', '/F2 10 Tf', f'{MARGIN} {y} Td', f'({escape_text(label)}) Tj', 'ET',
+                'BT', '/F1 10 Tf', f'{MARGIN + LABEL_WIDTH} {y} Td', f'({escape_text(value)}) Tj', 'ET',
+            ]
+            y -= LINE_HEIGHT
+        y -= LINE_HEIGHT
+        lines += [
+            'BT', '/F1 8 Tf', f'{MARGIN} {y} Td',
+            '(Keep this acknowledgement; the application number and mobile number are needed '
+            'to check the application status.) Tj',
+            'ET',
+        ]
+        return '\n'.join(lines).encode('latin-1')
+
+    def create_pdf(self):
+        """
+        Returns:
+            The PDF document as bytes
+        """
+        stream = self.content()
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>'.encode(),
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+            b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        ]
+
+        pdf = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(pdf))
+            pdf += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        xref = len(pdf)
+        pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(pdf)
@@ -0,0 +1,346 @@
+"""
+Payment reconciliation against bank and UPI statements, and reused
+transaction IDs.
+
+Statement CSVs are loaded into a hash index keyed on (transaction reference,
+amount, date), with a second index on the reference alone to explain misses.
+Entries whose reference a verified application (of any scheme) already
+holds are marked as used first, so a transaction ID is never verified twice.
+The scheme's unverified applications are then read once, each looked up in
+constant time. Matches are verified, and mismatches can be failed, through
+the status transition engine (scheme/workflow.py), so counters and the audit
+trail stay consistent. Everything else goes to the exceptions report.
+"""
+
+import csv
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count
+
+from .models import Application, normalise_reference
+from .workflow import apply_transition, chunked
+
+
+# Header names recognised in statement files, compared lower-cased with
+# spaces, dots and underscores removed
+REFERENCE_COLUMNS = ('transactionid', 'utr', 'utrno', 'utrnumber', 'rrn', 'referenceno', 'reference',
+                     'refno', 'chequeno', 'ddno', 'ddnumber', 'transactionreference')
+AMOUNT_COLUMNS = ('amount', 'creditamount', 'credit', 'deposit', 'depositamount', 'transactionamount')
+DATE_COLUMNS = ('transactiondate', 'date', 'valuedate', 'txndate', 'postingdate')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d/%m/%y', '%d-%b-%Y', '%d %b %Y', '%d-%b-%y')
+
+MATCHED = 'MATCHED'
+AMOUNT_MISMATCH = 'AMOUNT_MISMATCH'
+DATE_MISMATCH = 'DATE_MISMATCH'
+NOT_FOUND = 'NOT_FOUND'
+ALREADY_CLAIMED = 'ALREADY_CLAIMED'
+# A statement match for a transaction ID other applications also claim; left
+# for review instead of being verified
+TRANSACTION_REUSED = 'TRANSACTION_REUSED'
+
+# Issues that are evidence of a bad payment rather than a missing statement
+MISMATCHES = (AMOUNT_MISMATCH, DATE_MISMATCH, ALREADY_CLAIMED)
+
+EXCEPTION_HEADERS = [
+    'application_number', 'applicant_name', 'transaction_id', 'claimed_amount', 'claimed_date',
+    'issue', 'statement_amount', 'statement_date',
+]
+
+
+class StatementError(Exception):
+    """A statement file that cannot be read"""
+
+
+def _header_key(name):
+    return re.sub(r'[\s._]', '', name or '').lower()
+
+
+def parse_amount(value):
+    try:
+        return Decimal(re.sub(r'[^\d.-]', '', value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def parse_date(value):
+    value = (value or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _find_column(fieldnames, candidates, override):
+    keys = {_header_key(name): name for name in fieldnames}
+    if override:
+        if _header_key(override) not in keys:
+            raise StatementError(f"Column '{override}' not in statement header")
+        return keys[_header_key(override)]
+    for candidate in candidates:
+        if candidate in keys:
+            return keys[candidate]
+    raise StatementError(f"No column for any of {', '.join(candidates)} in statement header")
+
+
+class Statement:
+    """
+    Hash index over statement entries.
+
+    Attributes:
+        entries: (reference, amount, date) -> number of statement rows
+        by_reference: reference -> list of (amount, date)
+        rejected: Rows that could not be parsed, as (line number, reason)
+    """
+
+    def __init__(self):
+        self.entries = defaultdict(int)
+        self.by_reference = defaultdict(list)
+        self.rejected = []
+
+    def __len__(self):
+        return sum(self.entries.values())
+
+    def add(self, reference, amount, date):
+        key = (normalise_reference(reference), amount, date)
+        self.entries[key] += 1
+        self.by_reference[key[0]].append((amount, date))
+
+    def mark_used(self, reference):
+        """Take every entry with the reference, e.g. one a verified payment holds"""
+        for amount, date in self.by_reference.get(reference, ()):
+            self.entries[(reference, amount, date)] = 0
+
+    def load(self, fh, reference_column=None, amount_column=None, date_column=None):
+        """
+        Add the rows of a statement CSV.
+
+        Args:
+            fh: Text file object
+            reference_column, amount_column, date_column: Header names to
+                use instead of the recognised ones
+
+        Raises:
+            StatementError: If the header lacks a needed column
+        """
+        reader = csv.DictReader(fh)
+        if not reader.fieldnames:
+            raise StatementError("Statement file is empty")
+        reference_key = _find_column(reader.fieldnames, REFERENCE_COLUMNS, reference_column)
+        amount_key = _find_column(reader.fieldnames, AMOUNT_COLUMNS, amount_column)
+        date_key = _find_column(reader.fieldnames, DATE_COLUMNS, date_column)
+
+        for line, row in enumerate(reader, start=2):
+            reference = normalise_reference(row.get(reference_key))
+            amount = parse_amount(row.get(amount_key))
+            date = parse_date(row.get(date_key))
+            if not reference:
+                # Statements carry charges and other rows without a reference
+                continue
+            if amount is None or date is None:
+                self.rejected.append((line, f"unreadable amount or date for {reference}"))
+                continue
+            self.add(reference, amount, date)
+        return self
+
+    def claim(self, reference, amount, date, date_tolerance=0):
+        """
+        Take one statement entry matching a payment.
+
+        Returns:
+            Tuple of (issue, statement amount, statement date); the amount
+            and date are those of the closest entry with the reference
+        """
+        for offset in sorted(range(-date_tolerance, date_tolerance + 1), key=abs):
+            key = (reference, amount, date + timedelta(days=offset))
+            if self.entries.get(key):
+                self.entries[key] -= 1
+                return MATCHED, amount, key[2]
+
+        candidates = self.by_reference.get(reference)
+        if not candidates:
+            return NOT_FOUND, None, None
+        same_amount = [entry for entry in candidates if entry[0] == amount]
+        if same_amount:
+            near = min(same_amount, key=lambda entry: abs((entry[1] - date).days))
+            if abs((near[1] - date).days) <= date_tolerance:
+                # The entry exists but an earlier application claimed it
+                return ALREADY_CLAIMED, near[0], near[1]
+            return DATE_MISMATCH, near[0], near[1]
+        return AMOUNT_MISMATCH, candidates[0][0], candidates[0][1]
+
+
+class Reconciliation:
+    """Outcome of reconciling one scheme"""
+
+    def __init__(self):
+        self.matched = []
+        self.exceptions = []
+        self.verified = None
+        self.failed = None
+
+    @property
+    def mismatched(self):
+        return [row['pk'] for row in self.exceptions if row['issue'] in MISMATCHES]
+
+    def summary(self):
+        counts = defaultdict(int)
+        for row in self.exceptions:
+            counts[row['issue']] += 1
+        counts[MATCHED] = len(self.matched)
+        return dict(counts)
+
+
+def reconcile(scheme, statement, date_tolerance=0, chunk_size=2000):
+    """
+    Match a scheme's pending and failed payments against a statement.
+
+    Applications are read in application number order, so when two claim the
+    same statement entry the earlier one gets it. Entries whose reference a
+    verified application already holds are taken before matching, and
+    applications flagged transaction_reused are reported even when they
+    match.
+
+    Args:
+        scheme: Scheme to reconcile
+        statement: Loaded Statement (entries are consumed)
+        date_tolerance: Days a statement date may differ from the claimed one
+
+    Returns:
+        Reconciliation
+    """
+    result = Reconciliation()
+    for references in chunked(statement.by_reference, chunk_size):
+        verified = (
+            Application.objects.filter(
+                transaction_reference__in=references, payment_status=Application.PAYMENT_STATUS_CHOICES.VERIFIED,
+            )
+            .order_by()
+            .values_list('transaction_reference', flat=True)
+            .distinct()
+        )
+        for reference in verified:
+            statement.mark_used(reference)
+
+    rows = (
+        Application.objects.filter(
+            scheme=scheme,
+            payment_status__in=[Application.PAYMENT_STATUS_CHOICES.PENDING, Application.PAYMENT_STATUS_CHOICES.FAILED],
+        )
+        .order_by('application_number')
+        .values_list('pk', 'application_number', 'applicant_name', 'transaction_reference',
+                     'dd_amount_or_transaction_amount', 'dd_date_or_transaction_date', 'transaction_reused')
+        .iterator(chunk_size=chunk_size)
+    )
+    for pk, number, name, reference, amount, date, reused in rows:
+        issue, statement_amount, statement_date = statement.claim(reference, amount, date, date_tolerance)
+        if issue == MATCHED and reused:
+            issue = TRANSACTION_REUSED
+        if issue == MATCHED:
+            result.matched.append(pk)
+            continue
+        result.exceptions.append({
+            'pk': pk,
+            'application_number': number,
+            'applicant_name': name,
+            'transaction_id': reference,
+            'claimed_amount': amount,
+            'claimed_date': date,
+            'issue': issue,
+            'statement_amount': statement_amount,
+            'statement_date': statement_date,
+        })
+    return result
+
+
+def apply_reconciliation(result, fail_mismatched=False, user=None):
+    """
+    Verify matched payments and optionally fail mismatched ones.
+
+    Payments that are simply not in the statement are never failed; the
+    money may not have been credited yet.
+    """
+    result.verified = apply_transition(
+        'verify_payment', pks=result.matched,
+        remark='Matched with bank statement', user=user, source='reconciliation',
+    )
+    if fail_mismatched and result.mismatched:
+        result.failed = apply_transition(
+            'fail_payment', pks=result.mismatched,
+            remark='Bank statement mismatch', user=user, source='reconciliation',
+        )
+    return result
+
+
+def write_exceptions(result, fh):
+    """Write the exceptions report as CSV"""
+    writer = csv.DictWriter(fh, fieldnames=EXCEPTION_HEADERS, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(result.exceptions)
+
+
+DUPLICATE_HEADERS = [
+    'transaction_reference', 'applications', 'schemes', 'scheme_id', 'application_number', 'applicant_name',
+    'mobile_number', 'payment_status', 'dd_amount_or_transaction_amount', 'dd_date_or_transaction_date',
+]
+
+
+def duplicate_references(queryset=None):
+    """
+    Transaction references used by more than one application.
+
+    A single grouped scan over idx_app_txn_reference.
+
+    Returns:
+        Queryset of dicts with transaction_reference, applications and schemes
+    """
+    queryset = Application.objects.all() if queryset is None else queryset
+    return (
+        queryset.exclude(transaction_reference='')
+        .order_by()
+        .values('transaction_reference')
+        .annotate(applications=Count('id'), schemes=Count('scheme', distinct=True))
+        .filter(applications__gt=1)
+    )
+
+
+def duplicate_rows(groups):
+    """
+    Yield one report row per application of the duplicate groups.
+
+    Args:
+        groups: Result of duplicate_references, possibly filtered
+    """
+    by_reference = {group['transaction_reference']: group for group in groups}
+    rows = (
+        Application.objects.filter(transaction_reference__in=groups.values('transaction_reference'))
+        .order_by('transaction_reference', 'scheme_id', 'application_number')
+        .values('transaction_reference', 'scheme_id', 'application_number', 'applicant_name', 'mobile_number',
+                'payment_status', 'dd_amount_or_transaction_amount', 'dd_date_or_transaction_date')
+        .iterator(chunk_size=2000)
+    )
+    for row in rows:
+        group = by_reference[row['transaction_reference']]
+        yield {**row, 'applications': group['applications'], 'schemes': group['schemes']}
+
+
+def flag_reused_references():
+    """
+    Set transaction_reused from the table, for rows changed without save().
+
+    Returns:
+        Tuple of (rows flagged, rows unflagged)
+    """
+    reused = duplicate_references().values('transaction_reference')
+    flagged = Application.objects.filter(transaction_reference__in=reused, transaction_reused=False).update(
+        transaction_reused=True
+    )
+    unflagged = Application.objects.filter(transaction_reused=True).exclude(transaction_reference__in=reused).update(
+        transaction_reused=False
+    )
+    return flagged, unflagged
@@ -0,0 +1,166 @@
+"""
+Primary/replica database routing.
+
+With a ``replica`` alias in DATABASES, reads go to the replica and writes
+to ``default`` (the primary). Reads go to the primary instead:
+
+- inside a transaction on the primary (select_for_update, read-modify-write);
+- for the whole of a POST, PUT, PATCH or DELETE request, so validation
+  before its first write (e.g. the serializers' unique checks) does not pass
+  on a lagging replica and fail later as an IntegrityError;
+- for the rest of any other request once it has written;
+- for REPLICA_PIN_SECONDS after a client's last write, through a cookie, so
+  e.g. the PDF fetch right after a submission finds the new application
+  even if the replica lags;
+- in the admin's add, change and delete views;
+- inside ``primary()``, for code outside requests that must read its own
+  writes.
+
+Without a replica alias the router leaves every query on ``default``.
+
+Settings:
+    REPLICA_PIN_SECONDS: How long a client reads from the primary after
+                         a write (default 10)
+"""
+
+import contextlib
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Admin views that load an object to change it
+ADMIN_WRITE_VIEWS = ('_add', '_change', '_delete', '_history')
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+class _RoutingState:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def reads_from_primary():
+    """Whether reads in the current context must see the primary"""
+    state = _state.get()
+    if state is not None and (state.pinned or state.wrote):
+        return True
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextlib.contextmanager
+def primary():
+    """Read from the primary inside the block"""
+    token = _state.set(_RoutingState(pinned=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send reads to the replica and writes to the primary (see module docstring)"""
+
+    def db_for_read(self, model, **hints):
+        if not replica_configured() or reads_from_primary():
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db != REPLICA
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope the routing state to a request.
+
+    Pins the request to the primary when it may write (unsafe method), the
+    client wrote recently (cookie) or it is an admin write view, and sets the
+    cookie when the request writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        if not replica_configured():
+            return self.get_response(request)
+
+        state = _RoutingState(pinned=self._pinned(request))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin(state, response)
+
+    async def _acall(self, request):
+        if not replica_configured():
+            return await self.get_response(request)
+
+        # Queries the view hands to worker threads see this state through
+        # the context, and set ``wrote`` on the same object
+        state = _RoutingState(pinned=self._pinned(request))
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin(state, response)
+
+    @staticmethod
+    def _pinned(request):
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def _pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is None or request.resolver_match is None:
+            return None
+        url_name = request.resolver_match.url_name or ''
+        if 'admin' in request.resolver_match.namespaces and url_name.endswith(ADMIN_WRITE_VIEWS):
+            state.pinned = True
+        return None
@@ -0,0 +1,161 @@
+"""
+Search for the application changelist.
+
+Django turns ApplicationAdmin.search_fields into an OR of ``icontains`` over
+seven columns, which no B-tree index can serve. ``search_applications``
+recognises the shape of the search term instead:
+
+    10 digits           mobile_number
+    12 digits           aadhar_number or transaction reference (UPI UTR)
+    PAN (ABCDE1234F)    id_number
+    other digits        application_number
+    contains '@'        email (case-insensitive)
+    letters and digits  id_number or transaction reference
+
+When such a lookup finds nothing (a partial mobile number, say), the term is
+matched with ``icontains`` against the identifier columns, as the default
+search did. Anything else only searches names. Name searches use pg_trgm GIN
+indexes on PostgreSQL and an FTS5 trigram table on SQLite (see migration
+0031); both need at least 3 characters.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import normalise_reference
+
+
+MOBILE_RE = re.compile(r'^\d{10}$')
+AADHAAR_RE = re.compile(r'^\d{12}$')
+PAN_RE = re.compile(r'^[A-Z]{5}\d{4}[A-Z]$')
+NUMBER_RE = re.compile(r'^\d{1,9}$')
+ID_RE = re.compile(r'^(?=.*\d)[A-Z0-9/-]+$')
+
+NAME_FIELDS = ('applicant_name', 'father_or_husband_name')
+IDENTIFIER_FIELDS = ('mobile_number', 'aadhar_number', 'id_number', 'email', 'application_number')
+
+FTS_TABLE = 'scheme_application_fts'
+
+
+def exact_match_filter(term):
+    """
+    B-tree lookup for a search term that looks like an identifier.
+
+    Returns:
+        Q object, or None when the term is free text
+    """
+    upper = term.upper()
+    if MOBILE_RE.match(term):
+        return Q(mobile_number=term)
+    if AADHAAR_RE.match(term):
+        return Q(aadhar_number=term) | Q(transaction_reference=term)
+    if PAN_RE.match(upper):
+        return Q(id_number=upper)
+    if NUMBER_RE.match(term):
+        return Q(application_number=int(term))
+    if '@' in term:
+        return Q(email__iexact=term)
+    if ID_RE.match(upper):
+        return Q(id_number=upper) | Q(transaction_reference=normalise_reference(term))
+    return None
+
+
+def partial_match_filter(term):
+    """Unindexed substring match of an identifier-shaped term, for lookups that found nothing"""
+    query = Q()
+    for field in IDENTIFIER_FIELDS:
+        query |= Q(**{f'{field}__icontains': term})
+    return query
+
+
+def name_filter(term, using='default'):
+    """Name search through the vendor's text index"""
+    if len(term) >= 3 and connections[using].vendor == 'sqlite':
+        phrase = '"' + term.replace('"', '""') + '"'
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [phrase]))
+
+    # On PostgreSQL UPPER(column) LIKE UPPER('%term%') is served by the
+    # trigram indexes
+    query = Q()
+    for field in NAME_FIELDS:
+        query |= Q(**{f'{field}__icontains': term})
+    return query
+
+
+def search_applications(queryset, search_term):
+    """
+    Filter an Application queryset by a changelist search term.
+
+    Args:
+        queryset: Application queryset
+        search_term: Raw search box value
+
+    Returns:
+        Filtered queryset
+    """
+    search_term = search_term.strip()
+    if not search_term:
+        return queryset
+
+    query = exact_match_filter(search_term)
+    if query is None:
+        return queryset.filter(name_filter(search_term, using=queryset.db))
+
+    matches = queryset.filter(query)
+    if matches.exists():
+        return matches
+    return queryset.filter(partial_match_filter(search_term))
+
+
+FTS_TRIGGERS = {
+    f'{FTS_TABLE}_ai': (
+        'AFTER INSERT',
+        "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});",
+    ),
+    f'{FTS_TABLE}_ad': (
+        'AFTER DELETE',
+        "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});",
+    ),
+    f'{FTS_TABLE}_au': (
+        'AFTER UPDATE',
+        "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+        " INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});",
+    ),
+}
+
+
+def ensure_sqlite_fts(connection):
+    """
+    Create the FTS5 name index and its sync triggers if they are missing.
+
+    SQLite drops triggers when a migration rebuilds scheme_application, so
+    this also runs after every migrate (see scheme/signals.py).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'scheme_application'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if set(FTS_TRIGGERS) <= existing:
+            return
+
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(NAME_FIELDS)}, content='scheme_application', content_rowid='id', tokenize='trigram')"
+        )
+        values = {
+            'fts': FTS_TABLE,
+            'columns': ', '.join(NAME_FIELDS),
+            'new': ', '.join(f'new.{field}' for field in NAME_FIELDS),
+            'old': ', '.join(f'old.{field}' for field in NAME_FIELDS),
+        }
+        for name, (event, body) in FTS_TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(
+                f'CREATE TRIGGER {name} {event} ON scheme_application BEGIN {body.format(**values)} END'
+            )
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
@@ -5,8 +5,9 @@ from django.utils import timezone
 from rest_framework import serializers
 from decimal import Decimal
 from datetime import date
-import re
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import Application, Scheme
+from .validators import RuleValidator, validate_id_number as validate_id_for_type, validation_scope
 
 class SchemeSerializer(serializers.ModelSerializer):
     status = serializers.SerializerMethodField()
@@ -30,8 +31,8 @@ class SchemeSerializer(serializers.ModelSerializer):
         ]
 
     def get_status(self, obj):
-        obj.update_status()  # ensures status is always correct
-        return obj.status
+        # Derived from the dates, so it needs no query and is never stale
+        return obj.current_status()
 
 
 
@@ -153,53 +154,20 @@ class ApplicationSerializer(serializers.ModelSerializer):
             'rejection_remark': {'required': False, 'allow_blank': True},
         }
     
-    def validate_mobile_number(self, value):
-        """Validate 10-digit mobile number"""
-        if not re.match(r'^\d{10}$', value):
-            raise serializers.ValidationError('Enter a valid 10-digit mobile number')
-        return value
-    
-    def validate_aadhar_number(self, value):
-        """Validate PAN number format"""
-        if not re.match(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$', value):
-            raise serializers.ValidationError('Enter a valid PAN number (e.g., ABCDE1234F)')
-        return value.upper()
-    
-    def validate_permanent_address_pincode(self, value):
-        """Validate pincode format"""
-        if not re.match(r'^\d{6}$', value):
-            raise serializers.ValidationError('Enter a valid 6-digit pincode')
-        return value
-    
-    def validate_postal_address_pincode(self, value):
-        """Validate pincode format"""
-        if not re.match(r'^\d{6}$', value):
-            raise serializers.ValidationError('Enter a valid 6-digit pincode')
-        return value
-    
-    def validate_applicant_bank_ifsc(self, value):
-        """Validate IFSC code format"""
-        if not re.match(r'^[A-Z]{4}0[A-Z0-9]{6}$', value):
-            raise serializers.ValidationError('Enter a valid IFSC code')
-        return value.upper()
-    
+    # mobile_number, aadhar_number, the pincodes and applicant_bank_ifsc are
+    # checked by the model field validators (scheme/validators.py), which
+    # ModelSerializer copies onto the serializer fields
+
+    def is_valid(self, *, raise_exception=False):
+        with validation_scope():
+            return super().is_valid(raise_exception=raise_exception)
+
     def validate_id_number(self, value):
         """Validate ID number based on ID type"""
-        id_type = self.initial_data.get('id_type')
-        
-        if id_type == 'AADHAR':
-            if not value.isdigit() or len(value) != 12:
-                raise serializers.ValidationError('Aadhar number must be 12 digits')
-        elif id_type == 'RATION_CARD':
-            if len(value) < 8 or len(value) > 15:
-                raise serializers.ValidationError('Ration card number must be between 8-15 characters')
-        elif id_type == 'JAN_AADHAR':
-            if not value.isdigit() or len(value) != 10:
-                raise serializers.ValidationError('Jan Aadhar number must be 10 digits')
-        elif id_type == 'VOTER_ID':
-            if not re.match(r'^[A-Z]{3}[0-9]{7}$', value):
-                raise serializers.ValidationError('Enter a valid VOTER ID number (e.g., ABC1234567)')
-        
+        try:
+            validate_id_for_type(self.initial_data.get('id_type'), value)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
         return value
     
     def validate_dob(self, value):
@@ -312,15 +280,10 @@ class PDFRequestSerializer(serializers.Serializer):
     mobile_number = serializers.CharField(
         max_length=15,
         required=True,
-        help_text="Mobile number for verification"
+        help_text="Mobile number for verification",
+        validators=[RuleValidator('mobile_number')],
     )
     
-    def validate_mobile_number(self, value):
-        """Validate 10-digit mobile number"""
-        if not re.match(r'^\d{10}$', value):
-            raise serializers.ValidationError('Enter a valid 10-digit mobile number')
-        return value
-    
     def validate_application_no(self, value):
         """
         Validate application number format.
@@ -340,4 +303,30 @@ class PDFRequestSerializer(serializers.Serializer):
         if len(value) > 9:
             raise serializers.ValidationError("Application number cannot exceed 9 digits")
 
-        return value
\ No newline at end of file
+        return value
+
+
+class ApplicationStatusRequestSerializer(serializers.Serializer):
+    """
+    Serializer for validating an applicant status lookup.
+    """
+    scheme = serializers.IntegerField(min_value=1, help_text="Scheme ID")
+    application_number = serializers.IntegerField(min_value=0, help_text="Application number")
+    mobile_number = serializers.CharField(
+        max_length=10,
+        help_text="Mobile number for verification",
+        validators=[RuleValidator('mobile_number')],
+    )
+
+
+class ApplicationResultSerializer(serializers.ModelSerializer):
+    """Published lottery result row"""
+
+    class Meta:
+        model = Application
+        fields = [
+            'application_number',
+            'plot_category',
+            'sub_category',
+            'lottery_status',
+        ]
@@ -1 +1,56 @@
-from django.dispatch import receiver
\ No newline at end of file
+from collections import Counter
+
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .identity import link_application
+from .models import Application
+from .search import ensure_sqlite_fts
+from .workflow import adjust_status_counts
+
+
+@receiver(post_migrate)
+def restore_sqlite_search_index(sender, using, **kwargs):
+    """Re-create the FTS5 sync triggers that SQLite table rebuilds drop"""
+    connection = connections[using]
+    if sender.name == 'scheme' and connection.vendor == 'sqlite':
+        ensure_sqlite_fts(connection)
+
+
+@receiver(post_save, sender=Application)
+def count_saved_application(sender, instance, created, raw=False, **kwargs):
+    """Move the application between SchemeStatusCount rows when a status changes"""
+    if raw:
+        return
+    loaded = {} if created else getattr(instance, '_loaded_statuses', {})
+    deltas = Counter()
+    for field in Application.COUNTED_STATUS_FIELDS:
+        value = getattr(instance, field)
+        if created:
+            deltas[(instance.scheme_id, field, value)] += 1
+        elif field in loaded and loaded[field] != value:
+            deltas[(instance.scheme_id, field, loaded[field])] -= 1
+            deltas[(instance.scheme_id, field, value)] += 1
+    adjust_status_counts(deltas)
+    instance._loaded_statuses = {field: getattr(instance, field) for field in Application.COUNTED_STATUS_FIELDS}
+
+
+@receiver(post_delete, sender=Application)
+def count_deleted_application(sender, instance, **kwargs):
+    adjust_status_counts({
+        (instance.scheme_id, field, getattr(instance, field)): -1 for field in Application.COUNTED_STATUS_FIELDS
+    })
+
+
+@receiver(post_save, sender=Application)
+def link_new_application(sender, instance, created, raw=False, **kwargs):
+    """
+    Add new submissions to the identity graph.
+
+    Runs after the commit, so the scheme row locked while the application
+    number is taken is not held across the IdentityKey queries. A failure
+    leaves the application unlinked for `manage.py link_identities`.
+    """
+    if created and not raw:
+        transaction.on_commit(lambda: link_application(instance), robust=True)
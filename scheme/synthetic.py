@@ -0,0 +1,521 @@
+"""
+Synthetic applicants for performance work.
+
+``generate()`` writes a reproducible dataset of schemes, applications, OTPs
+and OTP attempts, large enough to measure indexes, exports and lotteries
+against (see ``manage.py generate_fixtures``). The same seed gives the same
+rows.
+
+Values pass the model validators: PANs, Voter IDs, IFSCs, pincodes and
+Aadhar numbers (with a valid Verhoeff check digit) are well formed. Mobile,
+Aadhar and account numbers come from a fixed permutation of the row's
+position in the table, so they never repeat across runs. Statuses, incomes
+and categories follow rough production proportions.
+
+Rows are generated a chunk at a time, one column at a time (one
+``random.choices`` call per column), and written with COPY on PostgreSQL or
+batched INSERTs elsewhere. The rows bypass save(), so the scheme counters
+and status counts are brought up to date afterwards. Identity links are only
+built on request, as they take longer than the generation itself.
+"""
+
+import io
+import json
+import random
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from OTP.models import OTP, OTPAttempt
+
+from .identity import link_all
+from .intake import reserve_numbers
+from .models import Application, Scheme, normalise_reference
+from .workflow import rebuild_status_counts
+
+
+CHUNK_SIZE = 5000
+
+DIGITS = '0123456789'
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Knuth's multiplicative hash constant; prime, so (i * MULTIPLIER) % m is a
+# permutation of range(m) for every m used below
+MULTIPLIER = 2_654_435_761
+
+FIRST_NAMES = (
+    'Aarav', 'Aditi', 'Amit', 'Anita', 'Arjun', 'Deepak', 'Divya', 'Gaurav', 'Geeta', 'Harish', 'Kavita',
+    'Kiran', 'Lakshmi', 'Mahesh', 'Manoj', 'Meena', 'Mohan', 'Neha', 'Nikhil', 'Pooja', 'Priya', 'Rahul',
+    'Rajesh', 'Ramesh', 'Ritu', 'Rohit', 'Sandeep', 'Sanjay', 'Seema', 'Shivani', 'Sunil', 'Sunita',
+    'Suresh', 'Vikram', 'Vinod', 'Yogesh',
+)
+SURNAMES = (
+    'Agarwal', 'Bairwa', 'Chauhan', 'Choudhary', 'Gupta', 'Jain', 'Jangid', 'Khan', 'Kumawat', 'Meena',
+    'Mehta', 'Rathore', 'Saini', 'Sharma', 'Shekhawat', 'Singh', 'Soni', 'Swami', 'Vaishnav', 'Verma',
+    'Yadav',
+)
+LOCALITIES = (
+    'Malviya Nagar', 'Vaishali Nagar', 'Mansarovar', 'Raja Park', 'Jhotwara', 'Sanganer', 'Sodala',
+    'Pratap Nagar', 'Shastri Nagar', 'Bani Park', 'Civil Lines', 'Ratanada', 'Sardarpura', 'Hiran Magri',
+)
+# Real 3-digit pincode prefixes (sorting district), mostly Rajasthan
+PINCODE_PREFIXES = (
+    ('302', 40), ('303', 10), ('301', 6), ('305', 6), ('313', 6), ('324', 6), ('334', 5), ('342', 6),
+    ('311', 4), ('110', 4), ('380', 3), ('400', 4),
+)
+# (IFSC bank code, bank name)
+BANKS = (
+    ('SBIN', 'State Bank of India'), ('PUNB', 'Punjab National Bank'), ('BARB', 'Bank of Baroda'),
+    ('HDFC', 'HDFC Bank'), ('ICIC', 'ICICI Bank'), ('UTIB', 'Axis Bank'), ('CNRB', 'Canara Bank'),
+    ('UBIN', 'Union Bank of India'), ('BKID', 'Bank of India'), ('KKBK', 'Kotak Mahindra Bank'),
+)
+EMAIL_DOMAINS = ('gmail.com', 'yahoo.co.in', 'rediffmail.com', 'outlook.com')
+USER_AGENTS = (
+    'Mozilla/5.0 (Linux; Android 13; SM-A135F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 12; Redmi Note 11) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+)
+
+# (value, weight)
+ID_TYPES = (('VOTER_ID', 45), ('PAN_CARD', 30), ('RATION_CARD', 15), ('DRIVING_LICENSE', 10))
+INCOMES = (('0L_3L', 60), ('3L_6L', 40))
+SUB_CATEGORIES = (
+    ('un-reserved', 50), ('sc', 14), ('st', 10), ('gov-employees', 8), ('un-reserved-handicap', 4),
+    ('un-reserved-dls', 3), ('other-soldiers', 3), ('journalist', 2), ('soldier-handicapped', 2),
+    ('soldier-widow-dependent', 2), ('transgender', 2),
+)
+PAYMENT_MODES = (('UPI', 70), ('DD', 30))
+PAYMENT_STATUSES = (('VERIFIED', 75), ('PENDING', 17), ('FAILED', 8))
+# Application status given the payment status
+APPLICATION_STATUSES = {
+    'VERIFIED': (('ACCEPTED', 88), ('PENDING', 8), ('REJECTED', 4)),
+    'PENDING': (('PENDING', 95), ('REJECTED', 5)),
+    'FAILED': (('REJECTED', 70), ('PENDING', 30)),
+}
+REJECTION_REMARKS = (
+    'Payment not received', 'Income certificate mismatch', 'Duplicate application', 'Incomplete documents',
+)
+
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5), (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7), (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3), (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4), (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7), (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+_VERHOEFF_INV = (0, 4, 3, 2, 1, 5, 6, 7, 8, 9)
+
+
+def verhoeff_digit(number):
+    """Verhoeff check digit of a string of digits, as used by Aadhar"""
+    check = 0
+    for position, digit in enumerate(reversed(number)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[(position + 1) % 8][int(digit)]]
+    return str(_VERHOEFF_INV[check])
+
+
+def _permuted(index, low, size):
+    """The index-th value of a fixed permutation of range(low, low + size)"""
+    return low + index * MULTIPLIER % size
+
+
+def _strings(rng, alphabet, length, n):
+    """``n`` random strings of ``length`` characters, from one choices() call"""
+    text = ''.join(rng.choices(alphabet, k=length * n))
+    return [text[i:i + length] for i in range(0, length * n, length)]
+
+
+def _weighted(rng, options, n):
+    values, weights = zip(*options)
+    return rng.choices(values, cum_weights=list(accumulate(weights)), k=n)
+
+
+def pincodes(rng, n):
+    return [prefix + suffix for prefix, suffix in zip(_weighted(rng, PINCODE_PREFIXES, n), _strings(rng, DIGITS, 3, n))]
+
+
+def ifscs(rng, banks):
+    """IFSC for each bank code: bank, a zero, then a 6-digit branch code"""
+    return [f'{code}0{branch}' for code, branch in zip(banks, _strings(rng, DIGITS, 6, len(banks)))]
+
+
+def pans(rng, surnames):
+    """Individual PANs: 3 letters, P (person), the surname's initial, 4 digits, a letter"""
+    n = len(surnames)
+    return [
+        f'{head}P{surname[0]}{digits}{tail}'
+        for head, surname, digits, tail in zip(
+            _strings(rng, LETTERS, 3, n), surnames, _strings(rng, DIGITS, 4, n), _strings(rng, LETTERS, 1, n)
+        )
+    ]
+
+
+def id_numbers(rng, id_types, surnames):
+    """An ID number of the right format for each ID type"""
+    n = len(id_types)
+    by_type = {
+        'PAN_CARD': pans(rng, surnames),
+        'VOTER_ID': [a + b for a, b in zip(_strings(rng, LETTERS, 3, n), _strings(rng, DIGITS, 7, n))],
+        'RATION_CARD': _strings(rng, DIGITS, 12, n),
+        'DRIVING_LICENSE': [f'RJ{a}{b}' for a, b in zip(_strings(rng, DIGITS, 2, n), _strings(rng, DIGITS, 11, n))],
+    }
+    return [by_type[id_type][i] for i, id_type in enumerate(id_types)]
+
+
+def mobile_number(index):
+    return str(_permuted(index, 6_000_000_000, 4_000_000_000))
+
+
+def aadhar_number(index):
+    body = str(_permuted(index, 20_000_000_000, 80_000_000_000))
+    return body + verhoeff_digit(body)
+
+
+def account_number(index):
+    return str(_permuted(index, 100_000_000_000, 900_000_000_000))
+
+
+def application_rows(rng, scheme, first_index, first_number, n, reuse_rate=0.0):
+    """
+    Column values of ``n`` applications of a scheme.
+
+    Args:
+        rng: random.Random to draw from
+        scheme: Scheme the applications belong to
+        first_index: Position of the first row in the whole table, which
+                     fixes its mobile, Aadhar and account numbers
+        first_number: Application number of the first row
+        n: Number of rows
+        reuse_rate: Share of rows that repeat an earlier row's transaction ID
+
+    Returns:
+        List of dicts of attname -> value, ready for ``write_rows``
+    """
+    firsts = rng.choices(FIRST_NAMES, k=n)
+    surnames = rng.choices(SURNAMES, k=n)
+    fathers = rng.choices(FIRST_NAMES, k=n)
+    id_types = _weighted(rng, ID_TYPES, n)
+    ids = id_numbers(rng, id_types, surnames)
+    incomes = _weighted(rng, INCOMES, n)
+    sub_categories = _weighted(rng, SUB_CATEGORIES, n)
+    modes = _weighted(rng, PAYMENT_MODES, n)
+    payment_statuses = _weighted(rng, PAYMENT_STATUSES, n)
+    banks = rng.choices(BANKS, k=n)
+    payer_banks = rng.choices(BANKS, k=n)
+    bank_ifscs = ifscs(rng, [code for code, _ in banks])
+    permanent_pins = pincodes(rng, n)
+    postal_pins = pincodes(rng, n)
+    houses = rng.choices(range(1, 400), k=n)
+    localities = rng.choices(LOCALITIES, k=n)
+    ages = rng.choices(range(21 * 365, 65 * 365), k=n)
+    domains = rng.choices(EMAIL_DOMAINS, k=n)
+    utrs = _strings(rng, DIGITS, 12, n)
+    dd_numbers = _strings(rng, DIGITS, 6, n)
+    transfer_delays = rng.choices(range(4), k=n)
+
+    opens = scheme.application_open_date or timezone.now() - timedelta(days=30)
+    closes = scheme.application_close_date or opens + timedelta(days=30)
+    window = max(int((min(closes, timezone.now()) - opens).total_seconds()), 1)
+    submitted = [opens + timedelta(seconds=s) for s in rng.choices(range(window), k=n)]
+
+    today = date.today()
+    rows = []
+    for i in range(n):
+        index = first_index + i
+        name = f'{firsts[i]} {surnames[i]}'
+        address = f'{houses[i]}, {localities[i]}, Jaipur'
+        annual_income = incomes[i]
+        registration_fees = Decimal('10000.00') if annual_income == '0L_3L' else Decimal('20000.00')
+        processing_fees = Decimal('500.00')
+        transaction_id = f'UTR{utrs[i]}' if modes[i] == 'UPI' else f'DD{dd_numbers[i]}'
+        payment_status = payment_statuses[i]
+        application_status = _weighted(rng, APPLICATION_STATUSES[payment_status], 1)[0]
+        rows.append({
+            'scheme_id': scheme.pk,
+            'application_number': first_number + i,
+            'mobile_number': mobile_number(index),
+            'applicant_name': name,
+            'father_or_husband_name': f'{fathers[i]} {surnames[i]}',
+            'dob': today - timedelta(days=ages[i]),
+            'id_type': id_types[i],
+            'id_number': ids[i],
+            'aadhar_number': aadhar_number(index),
+            'permanent_address': address,
+            'permanent_address_pincode': permanent_pins[i],
+            'postal_address': address,
+            'postal_address_pincode': postal_pins[i],
+            'email': f'{firsts[i]}.{surnames[i]}{index}@{domains[i]}'.lower(),
+            'annual_income': annual_income,
+            'plot_category': 'EWS' if annual_income == '0L_3L' else 'LIG',
+            'sub_category': sub_categories[i],
+            'registration_fees': registration_fees,
+            'processing_fees': processing_fees,
+            'total_payable_amount': registration_fees + processing_fees,
+            'payment_mode': modes[i],
+            'dd_id_or_transaction_id': transaction_id,
+            'dd_date_or_transaction_date': (submitted[i] - timedelta(days=transfer_delays[i])).date(),
+            'dd_amount_or_transaction_amount': registration_fees + processing_fees,
+            'transaction_reference': normalise_reference(transaction_id),
+            'transaction_reused': False,
+            'payer_account_holder_name': name,
+            'payer_bank_name': payer_banks[i][1],
+            'payment_proof': '',
+            'payment_status': payment_status,
+            'applicant_account_holder_name': name,
+            'applicant_account_number': account_number(index),
+            'applicant_bank_name': banks[i][1],
+            'applicant_bank_branch_address': f'{localities[i]} Branch, Jaipur',
+            'applicant_bank_ifsc': bank_ifscs[i],
+            'application_submission_date': submitted[i],
+            'application_status': application_status,
+            'rejection_remark': rng.choice(REJECTION_REMARKS) if application_status == 'REJECTED' else '',
+            'lottery_status': 'NOT_CONDUCTED',
+            'application_pdf': '',
+            'identity_cluster': None,
+            'created_at': submitted[i],
+            'updated_at': submitted[i],
+        })
+
+    # A few applicants quote someone else's transaction, as in production
+    for i in range(1, n):
+        if rng.random() < reuse_rate:
+            earlier = rows[rng.randrange(i)]
+            for key in ('dd_id_or_transaction_id', 'transaction_reference'):
+                rows[i][key] = earlier[key]
+            rows[i]['transaction_reused'] = earlier['transaction_reused'] = True
+    return rows
+
+
+def otp_rows(rng, applications, per_application):
+    """
+    OTPs and OTP attempts of the applicants' logins.
+
+    Every applicant verified at least one OTP before submitting; some asked
+    for more, resent them or typed a wrong code first.
+
+    Returns:
+        Tuple of (OTP rows, OTPAttempt rows)
+    """
+    otps, attempts = [], []
+    extra = max(per_application - 1, 0)
+    ips = [f'{a}.{b}.{c}.{d}' for a, b, c, d in zip(
+        rng.choices((49, 103, 106, 117, 122, 157, 182, 223), k=len(applications)),
+        *(rng.choices(range(256), k=len(applications)) for _ in range(2)),
+        rng.choices(range(1, 255), k=len(applications)),
+    )]
+    agents = rng.choices(USER_AGENTS, k=len(applications))
+
+    for application, ip, agent in zip(applications, ips, agents):
+        mobile = application['mobile_number']
+        count = 1 + int(extra) + (rng.random() < extra % 1)
+        created = application['application_submission_date'] - timedelta(minutes=rng.randrange(5, 60))
+        for attempt in range(count):
+            otp_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+            used = attempt == count - 1
+            otps.append({
+                'id': otp_id,
+                'code': ''.join(rng.choices(DIGITS, k=6)),
+                'mobile_number': mobile,
+                'expires_at': created + timedelta(minutes=5),
+                'is_used': used,
+                'created_at': created,
+            })
+
+            def attempt_row(attempt_type, success, at, otp=None, error=None):
+                attempts.append({
+                    'id': uuid.UUID(int=rng.getrandbits(128), version=4),
+                    'identifier': mobile,
+                    'attempt_type': attempt_type,
+                    'ip_address': ip,
+                    'user_agent': agent,
+                    'timestamp': at,
+                    'success': success,
+                    'otp_id': otp,
+                    'error_message': error,
+                    'metadata': {},
+                })
+
+            attempt_row(OTPAttempt.GENERATION, True, created)
+            if rng.random() < 0.05:
+                attempt_row(OTPAttempt.RESEND, True, created + timedelta(seconds=45))
+            if rng.random() < 0.2:
+                attempt_row(OTPAttempt.VERIFICATION, False, created + timedelta(seconds=60), otp_id, 'Invalid code')
+            if used:
+                attempt_row(OTPAttempt.VERIFICATION, True, created + timedelta(seconds=90), otp_id)
+            created += timedelta(minutes=rng.randrange(6, 30))
+    return otps, attempts
+
+
+def _columns(model):
+    """Concrete fields written by write_rows: all but an auto-increment key"""
+    return [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and isinstance(field, models.AutoField))
+    ]
+
+
+# Field types whose Python values go to the database unchanged
+PASSTHROUGH_TYPES = {
+    'BigIntegerField', 'BooleanField', 'CharField', 'EmailField', 'FileField',
+    'GenericIPAddressField', 'ImageField', 'IntegerField', 'TextField',
+}
+
+
+def _preparer(field, db):
+    """Callable converting a column's values for the database, or None when they need no conversion"""
+    if field.get_internal_type() in PASSTHROUGH_TYPES:
+        return None
+    if isinstance(field, models.JSONField) and db.vendor == 'postgresql':
+        # Serialised here: COPY takes the text, not psycopg's adapter
+        return json.dumps
+    return lambda value: field.get_db_prep_save(value, db)
+
+
+def _copy_text(value):
+    """A prepared value in PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def write_rows(model, rows, using=DEFAULT_DB_ALIAS):
+    """
+    Insert rows of attname -> value, bypassing the model's save().
+
+    Uses COPY on PostgreSQL and a batched INSERT elsewhere. Fields missing
+    from a row take their default.
+    """
+    if not rows:
+        return
+    db = connections[using]
+    fields = _columns(model)
+    for field in fields:
+        if field.attname not in rows[0] and field.has_default():
+            for row in rows:
+                row[field.attname] = field.get_default()
+
+    # Converted a column at a time, skipping the columns that need nothing
+    columns = []
+    for field in fields:
+        values = [row[field.attname] for row in rows]
+        prepare = _preparer(field, db)
+        if prepare is not None:
+            values = [None if value is None else prepare(value) for value in values]
+        columns.append(values)
+    records = list(zip(*columns))
+
+    table = db.ops.quote_name(model._meta.db_table)
+    names = ', '.join(db.ops.quote_name(field.column) for field in fields)
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            buffer = io.StringIO()
+            buffer.writelines('\t'.join(map(_copy_text, record)) + '\n' for record in records)
+            buffer.seek(0)
+            sql = f'COPY {table} ({names}) FROM STDIN'
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                raw.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+        else:
+            placeholders = ', '.join(['%s'] * len(fields))
+            cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({placeholders})', records)
+
+
+def create_schemes(rng, count, applications_each, seed):
+    """Closed schemes with plots for about one applicant in ten"""
+    now = timezone.now()
+    base = (Scheme.objects.aggregate(last=Max('application_number_start'))['last'] or 0) // 1_000_000 + 1
+    schemes = []
+    for offset in range(count):
+        opens = now - timedelta(days=rng.randrange(60, 720))
+        plots = max(applications_each // 10, 1)
+        schemes.append(Scheme.objects.create(
+            name=f'Synthetic Scheme {seed}-{base + offset}',
+            company=rng.choice(Scheme.COMPANY_CHOICES.values),
+            ews_plot_count=plots * 6 // 10 or 1,
+            Lig_plot_count=plots * 4 // 10 or 1,
+            reserved_price=rng.randrange(3000, 9000, 250),
+            application_number_start=(base + offset) * 1_000_000,
+            application_open_date=opens,
+            application_close_date=opens + timedelta(days=45),
+            successful_applicants_publish_date=opens + timedelta(days=60),
+        ))
+    return schemes
+
+
+class GenerationResult:
+    """Row counts of one generate() run"""
+
+    def __init__(self, schemes):
+        self.schemes = schemes
+        self.applications = 0
+        self.otps = 0
+        self.attempts = 0
+        self.linked = 0
+
+
+def generate(applications, schemes=None, scheme_count=1, seed=0, otps_per_application=1.5, reuse_rate=0.002,
+             chunk_size=CHUNK_SIZE, link_identities=False, progress=None):
+    """
+    Generate applications with their OTPs and OTP attempts.
+
+    Args:
+        applications: Number of applications, split evenly over the schemes
+        schemes: Existing schemes to add them to (default: create new ones)
+        scheme_count: Number of schemes to create when ``schemes`` is None
+        seed: Random seed; the same seed on the same database gives the same rows
+        otps_per_application: Average OTPs requested per applicant
+        reuse_rate: Share of applications quoting another's transaction ID
+        chunk_size: Rows generated and written together
+        link_identities: Also link the new applications' identities
+        progress: Optional callable receiving the running application count
+
+    Returns:
+        GenerationResult
+    """
+    rng = random.Random(seed)
+    if schemes is None:
+        schemes = create_schemes(rng, scheme_count, -(-applications // scheme_count), seed)
+    result = GenerationResult(schemes)
+
+    # Rows already in the table take the first positions of the permutations
+    first_index = Application.objects.aggregate(last=Max('pk'))['last'] or 0
+    per_scheme, remainder = divmod(applications, len(schemes))
+    for position, scheme in enumerate(schemes):
+        count = per_scheme + (position < remainder)
+        if not count:
+            continue
+        first_number = reserve_numbers(scheme.pk, count)
+        for start in range(0, count, chunk_size):
+            n = min(chunk_size, count - start)
+            rows = application_rows(rng, scheme, first_index, first_number + start, n, reuse_rate)
+            otps, attempts = otp_rows(rng, rows, otps_per_application)
+            with transaction.atomic():
+                write_rows(Application, rows)
+                write_rows(OTP, otps)
+                write_rows(OTPAttempt, attempts)
+            first_index += n
+            result.applications += n
+            result.otps += len(otps)
+            result.attempts += len(attempts)
+            if progress:
+                progress(result.applications)
+
+    rebuild_status_counts([scheme.pk for scheme in schemes])
+    if link_identities:
+        result.linked, _ = link_all()
+    return result
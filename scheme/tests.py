@@ -14,7 +14,7 @@ import os
 import random
 from unittest.mock import patch, MagicMock
 from django.test import TestCase
-from django.db import transaction, models
+from django.db import connections, transaction, models
 from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 
@@ -33,7 +33,7 @@ class SchemeFactory:
     counter = 1_000_000
     
     @staticmethod
-    def create(name="Test Scheme", company = "riyasat infra", ews_plot_count = 3, Lig_plot_count = 1, 
+    def create(name="Test Scheme", company = "riyasat-infra", ews_plot_count = 3, Lig_plot_count = 1, 
                reserved_price = Decimal(5000), application_number_start = None):
         if application_number_start is None:
             # Increment counter each time to ensure uniqueness
@@ -114,22 +114,31 @@ class ApplicationFactory:
     @staticmethod
     def create(
         scheme, # REQUIRED: Must pass a Scheme instance
-        # Randomly selected defaults for enum fields
-        annual_income=random.choice(INCOME_CHOICES),
-        id_type=random.choice(ID_TYPE_CHOICES),
-        payment_mode=random.choice(PAYMENT_MODE_CHOICES),
-        payment_status=random.choice(PAYMENT_STATUS_CHOICES),
-        application_status=random.choice(APPLICATION_STATUS_CHOICES),
-        lottery_status=random.choice(LOTTERY_STATUS_CHOICES),
+        # Enum fields left as None are picked at random on each call
+        annual_income=None,
+        id_type=None,
+        payment_mode=None,
+        payment_status=None,
+        application_status=None,
+        lottery_status=None,
         
         # Other defaults
         applicant_name="Test Applicant",
         mobile_number=None,
-        dob=date.today() - timedelta(days=random.randint(20, 50)*365), # Random age 20-50
+        dob=None, # Random age 20-50
         aadhar_number=None,
         registration_fees=None,
         payment_proof = None
     ):
+        # Defaults are evaluated once, at import; draw the random ones here
+        annual_income = annual_income or random.choice(INCOME_CHOICES)
+        id_type = id_type or random.choice(ID_TYPE_CHOICES)
+        payment_mode = payment_mode or random.choice(PAYMENT_MODE_CHOICES)
+        payment_status = payment_status or random.choice(PAYMENT_STATUS_CHOICES)
+        application_status = application_status or random.choice(APPLICATION_STATUS_CHOICES)
+        lottery_status = lottery_status or random.choice(LOTTERY_STATUS_CHOICES)
+        if dob is None:
+            dob = date.today() - timedelta(days=random.randint(20, 50)*365)
         
         # 1. Setup default unique fields
         if mobile_number is None:
@@ -212,7 +221,7 @@ class ApplicationFactory:
             
             # applicant Details
             applicant_account_holder_name="applicant Holder Name",
-            applicant_account_number="9876543210987654",
+            applicant_account_number=f"ACC{mobile_number}",
             applicant_bank_name="applicant Test Bank",
             applicant_bank_branch_address="Branch Address",
             applicant_bank_ifsc=generate_ifsc(),
@@ -236,6 +245,11 @@ class ApplicationModelTestCase(TestCase):
     def setUp(self):
         """Set up test data"""
         self.scheme = SchemeFactory.create()
+        # ApplicationFactory attaches a payment proof; keep it off S3
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        storage_patch = patch.object(Application._meta.get_field('payment_proof'), 'storage', storage)
+        storage_patch.start()
+        self.addCleanup(storage_patch.stop)
         self.valid_application_data = {
             'scheme': self.scheme,
             'mobile_number': f'9876543210',
@@ -270,7 +284,16 @@ class ApplicationModelTestCase(TestCase):
         application = Application.objects.create(**self.valid_application_data)
         self.assertEqual(application.plot_category, 'EWS')
         self.assertEqual(application.registration_fees, Decimal('10000.00'))
-    
+
+    def test_auto_fill_ews_category_for_income_choice(self):
+        """Test the '0L_3L' income choice gets the EWS category and fees"""
+        data = self.valid_application_data.copy()
+        data['annual_income'] = Application.INCOME_CHOICES.ZERO_TO_THREE
+        application = Application.objects.create(**data)
+        self.assertEqual(application.plot_category, 'EWS')
+        self.assertEqual(application.registration_fees, Decimal('10000.00'))
+        self.assertEqual(application.total_payable_amount, Decimal('10500.00'))
+
     def test_auto_fill_lig_category(self):
         """Test automatic plot category assignment for LIG"""
         data = self.valid_application_data.copy()
@@ -327,6 +350,8 @@ class ApplicationModelTestCase(TestCase):
         data = self.valid_application_data.copy()
         data['mobile_number'] = '9876543211'
         data['email'] = 'jane@example.com'
+        data['aadhar_number'] = '123456789013'
+        data['applicant_account_number'] = 'ACC2'
         application2 = Application.objects.create(**data)
         
         self.assertIsNotNone(application2.id)
@@ -391,6 +416,8 @@ class ApplicationModelTestCase(TestCase):
         data2 = self.valid_application_data.copy()
         data2['mobile_number'] = '9876543211'
         data2['email'] = 'jane@example.com'
+        data2['aadhar_number'] = '123456789013'
+        data2['applicant_account_number'] = 'ACC2'
         app2 = Application.objects.create(**data2)
         
         applications = Application.objects.all()
@@ -805,6 +832,7 @@ import threading
 
 class ApplicationNumberTestCase(TransactionTestCase):
     reset_sequences = True  # Ensures IDs start from 1 for clarity
+    databases = '__all__'  # Outside a transaction, reads may go to a configured replica
 
     def setUp(self):
         # Create a scheme with a starting next_application_number
@@ -878,3 +906,1706 @@ class ApplicationNumberTestCase(TransactionTestCase):
         # # Each application should have a unique application_number
         # self.assertEqual(sorted(results), [i+start for i in range(5)])
 
+
+
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from .models import LotteryDraw
+from .lottery import (
+    LotteryEngine, LotteryError, LotteryVerificationError, load_artefact, replay, verify_against_database,
+)
+from .models import SchemeQuota
+from .allocation import allocate, seat_summary, quota_table
+from django.core.cache import cache
+from django.test import override_settings
+from .models import ExportJob
+from .export_jobs import claim_next_job, export_storage, presigned_url, queue_export, run_job, sweep_stale_jobs
+import importlib.util
+import unittest
+from .exports import XLSX_CONTENT_TYPE, export_rows, parquet_columns, write_parquet
+from django.db.models import Q
+from .search import exact_match_filter, search_applications
+from .paginators import EstimatedCountPaginator
+from django.test.utils import CaptureQueriesContext
+from .models import IdentityKey, SchemeStatusCount, StatusTransitionBatch
+from .workflow import apply_transition, pack_numbers, rebuild_status_counts, unpack_numbers, updated_numbers
+from django.core.files.storage import FileSystemStorage
+import json
+import zipfile
+import hashlib
+import csv
+from .models import SchemeStatusCount as StatusCount
+from .validators import RULES, RuleValidator, check, validation_scope
+from .serializers import ApplicationStatusRequestSerializer
+from .identity import identity_digest, link_all, normalise_email, normalise_mobile, reset_identities
+from .reconciliation import Statement, apply_reconciliation, duplicate_references, flag_reused_references, reconcile
+from .importing import IMPORT_FIELDS, import_csv
+from . import metrics
+from .pdf_generator import escape_text
+import base64
+from test_utils.query_budget import QueryBudgetExceeded, query_budget, query_shape
+from .indexing import QUERY_SHAPES, advise, is_covered, parse_query_log, propose_for_queryset, temporary_indexes, time_shape
+from .async_views import AsyncApplicationStatusView
+from .views import ApplicationStatusView
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory
+
+
+class ApplicationDataMixin:
+    """Creates eligible applications on self.scheme"""
+
+    def _create_application(self, index, annual_income, payment_status='VERIFIED', sub_category='un-reserved',
+                            **fields):
+        values = dict(
+            scheme=self.scheme,
+            mobile_number=f'98000000{index:02d}',
+            applicant_name=f'Applicant {index}',
+            father_or_husband_name='Father',
+            dob=date(1990, 1, 1),
+            id_type='VOTER_ID',
+            id_number='ABC1234567',
+            aadhar_number=f'1234567890{index:02d}',
+            permanent_address='Address',
+            permanent_address_pincode='302001',
+            postal_address='Address',
+            postal_address_pincode='302001',
+            email=f'applicant{index}@example.com',
+            annual_income=annual_income,
+            sub_category=sub_category,
+            payment_mode='UPI',
+            dd_id_or_transaction_id=f'UPI{index}',
+            dd_date_or_transaction_date=date.today(),
+            dd_amount_or_transaction_amount=Decimal('10500.00'),
+            applicant_account_number=f'ACC{index}',
+            applicant_bank_branch_address='Branch',
+            application_status='ACCEPTED',
+            payment_status=payment_status,
+        )
+        values.update(fields)
+        return Application.objects.create(**values)
+
+
+class LotteryTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the lottery engine and its audit artefact"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(
+            name="Lottery Scheme", company="riyasat-infra", ews_plot_count=2, Lig_plot_count=1
+        )
+        for index in range(8):
+            self._create_application(index, annual_income='UP_TO_3L' if index < 6 else '3L_6L')
+        # Not eligible: payment still pending
+        self._create_application(20, annual_income='UP_TO_3L', payment_status='PENDING')
+
+    def test_draw_is_deterministic_for_a_seed(self):
+        first = LotteryEngine(self.scheme, seed='public-seed', waitlist=1).build_payload()
+        second = LotteryEngine(self.scheme, seed='public-seed', waitlist=1).build_payload()
+        self.assertEqual(first['buckets'], second['buckets'])
+
+    def test_conduct_updates_statuses_and_stores_artefact(self):
+        draw, payload = LotteryEngine(self.scheme, seed='public-seed', waitlist=1).conduct()
+
+        self.assertEqual(len(payload['buckets']['EWS']['selected']), 2)
+        self.assertEqual(len(payload['buckets']['LIG']['selected']), 1)
+        self.assertEqual(Application.objects.filter(lottery_status='SELECTED').count(), 3)
+        self.assertEqual(Application.objects.filter(lottery_status='WAITLISTED').count(), 2)
+        self.assertEqual(Application.objects.filter(lottery_status='NOT_CONDUCTED').count(), 1)
+
+        decoded = load_artefact(draw.artefact)
+        self.assertEqual(decoded['seed'], 'public-seed')
+        self.assertEqual(replay(decoded), [])
+        self.assertEqual(verify_against_database(decoded), [])
+
+    def test_tampered_artefact_is_rejected(self):
+        draw, _ = LotteryEngine(self.scheme, seed='public-seed').conduct()
+        with self.assertRaises(LotteryVerificationError):
+            load_artefact(draw.artefact[:-2] + 'xx')
+
+    def test_verify_detects_status_changes_after_draw(self):
+        draw, payload = LotteryEngine(self.scheme, seed='public-seed').conduct()
+        winner, _ = payload['buckets']['EWS']['selected'][0]
+        Application.objects.filter(application_number=winner).update(lottery_status='NOT_SELECTED')
+
+        mismatches = verify_against_database(load_artefact(draw.artefact, verify_signature=False))
+        self.assertEqual(len(mismatches), 1)
+        self.assertIn(str(winner), mismatches[0])
+
+    def test_verify_lottery_command(self):
+        draw, _ = LotteryEngine(self.scheme, seed='public-seed').conduct()
+        out = StringIO()
+        call_command('verify_lottery', draw=draw.pk, stdout=out)
+        self.assertIn('verified', out.getvalue())
+
+        Application.objects.filter(payment_status='VERIFIED').first().delete()
+        with self.assertRaises(CommandError):
+            call_command('verify_lottery', draw=draw.pk, stdout=StringIO())
+
+    def test_redraw_needs_a_reason_and_resets_every_row(self):
+        _, payload = LotteryEngine(self.scheme, seed='public-seed').conduct()
+        winner, _ = payload['buckets']['EWS']['selected'][0]
+        Application.objects.filter(application_number=winner).update(payment_status='PENDING')
+
+        with self.assertRaises(LotteryError):
+            LotteryEngine(self.scheme, seed='other-seed').conduct()
+        with self.assertRaises(CommandError):
+            call_command('conduct_lottery', self.scheme.pk, stdout=StringIO())
+
+        draw, _ = LotteryEngine(self.scheme, seed='other-seed').conduct(redraw_reason='Court order 12/2026')
+        self.assertEqual(draw.redraw_reason, 'Court order 12/2026')
+        self.assertEqual(load_artefact(draw.artefact)['redraw_reason'], 'Court order 12/2026')
+        self.assertEqual(Application.objects.get(application_number=winner).lottery_status, 'NOT_CONDUCTED')
+        self.assertEqual(LotteryDraw.objects.filter(scheme=self.scheme).count(), 2)
+
+    def test_dry_run_withholds_its_seed(self):
+        _, payload = LotteryEngine(self.scheme).conduct(dry_run=True)
+        self.assertIsNone(payload['seed'])
+        self.assertFalse(LotteryDraw.objects.exists())
+
+        with self.assertRaises(LotteryError):
+            LotteryEngine(self.scheme, seed='public-seed').conduct(dry_run=True)
+        with self.assertRaises(LotteryError):
+            LotteryEngine(self.scheme, seed='x' * 65)
+
+    def test_reserved_quota_is_filled_by_its_own_applicants(self):
+        SchemeQuota.objects.create(scheme=self.scheme, plot_category='EWS', sub_category='sc', plots=1)
+        sc_applicant = self._create_application(30, annual_income='UP_TO_3L', sub_category='sc')
+
+        draw, payload = LotteryEngine(self.scheme, seed='public-seed').conduct()
+
+        ews = payload['buckets']['EWS']
+        self.assertEqual(ews['quotas'], {'sc': 1, 'un-reserved': 1})
+        self.assertIn([sc_applicant.application_number, 'sc'], ews['selected'])
+        self.assertEqual(replay(load_artefact(draw.artefact)), [])
+        self.assertEqual(verify_against_database(load_artefact(draw.artefact)), [])
+
+
+class AllocationTestCase(TestCase):
+    """Tests for the reserved quota allocation solver"""
+
+    def test_reserved_seats_go_to_own_category_first(self):
+        ranked = [(1, 'un-reserved'), (2, 'un-reserved'), (3, 'sc'), (4, 'un-reserved')]
+        allocation = allocate({'sc': 1, 'un-reserved': 1}, ranked)
+        self.assertEqual(allocation.selected, [(1, 'un-reserved'), (3, 'sc')])
+        self.assertEqual(allocation.unseated, [2, 4])
+
+    def test_unfilled_quota_spills_over_in_order(self):
+        ranked = [(1, 'un-reserved'), (2, 'st'), (3, 'un-reserved')]
+        allocation = allocate({'sc': 1, 'st': 2, 'un-reserved': 1}, ranked)
+
+        self.assertEqual(allocation.selected, [(1, 'un-reserved'), (2, 'st'), (3, 'un-reserved')])
+        # SC is released first and filled; the second ST seat is left vacant
+        self.assertEqual(allocation.spillover, [('sc', 1, 1), ('st', 1, 0)])
+        self.assertEqual(allocation.vacant, {'un-reserved': 0, 'sc': 0, 'st': 1})
+
+    def test_reserved_applicant_beyond_quota_competes_for_open_seats(self):
+        ranked = [(1, 'sc'), (2, 'sc'), (3, 'un-reserved')]
+        allocation = allocate({'sc': 1, 'un-reserved': 1}, ranked)
+        self.assertEqual(allocation.selected, [(1, 'sc'), (2, 'un-reserved')])
+
+    def test_seat_summary_matches_allocation(self):
+        rows = {row['sub_category']: row for row in seat_summary(
+            {'sc': 2, 'st': 1, 'un-reserved': 2}, {'sc': 1, 'un-reserved': 1}
+        )}
+        self.assertEqual(rows['sc']['filled'], 1)
+        self.assertEqual(rows['un-reserved']['remaining'], 1)
+        self.assertEqual(rows['st']['remaining'], 1)
+
+    def test_quota_table_defaults_to_un_reserved(self):
+        scheme = SchemeFactory.create(name="Quota Scheme", company="riyasat-infra", ews_plot_count=5, Lig_plot_count=2)
+        SchemeQuota.objects.create(scheme=scheme, plot_category='EWS', sub_category='sc', plots=2)
+        self.assertEqual(quota_table(scheme), {'EWS': {'sc': 2, 'un-reserved': 3}, 'LIG': {'un-reserved': 2}})
+
+    def test_quota_cannot_exceed_plot_count(self):
+        scheme = SchemeFactory.create(name="Quota Scheme", company="riyasat-infra", ews_plot_count=1, Lig_plot_count=1)
+        quota = SchemeQuota(scheme=scheme, plot_category='EWS', sub_category='sc', plots=2)
+        with self.assertRaises(ValidationError):
+            quota.full_clean()
+
+    def test_seats_api(self):
+        scheme = SchemeFactory.create(name="Quota Scheme", company="riyasat-infra", ews_plot_count=3, Lig_plot_count=1)
+        SchemeQuota.objects.create(scheme=scheme, plot_category='EWS', sub_category='sc', plots=1)
+        response = self.client.get(f'/scheme/api/schemes/{scheme.pk}/seats/')
+        self.assertEqual(response.status_code, 200)
+        ews = {row['sub_category']: row for row in response.json()['plot_categories']['EWS']}
+        self.assertEqual(ews['sc']['remaining'], 1)
+        self.assertEqual(ews['un-reserved']['quota'], 2)
+
+
+class ApplicationStatusTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the applicant status lookup and the published results list"""
+
+    def setUp(self):
+        cache.clear()
+        self.scheme = SchemeFactory.create(
+            name="Status Scheme", company="riyasat-infra", ews_plot_count=2, Lig_plot_count=1
+        )
+        self.applications = [self._create_application(index, annual_income='UP_TO_3L') for index in range(5)]
+
+    def _lookup(self, application, mobile_number=None):
+        return self.client.post('/scheme/api/application/status/', {
+            'scheme': self.scheme.pk,
+            'application_number': application.application_number,
+            'mobile_number': mobile_number or application.mobile_number,
+        }, content_type='application/json')
+
+    def test_status_lookup(self):
+        response = self._lookup(self.applications[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['payment_status'], 'VERIFIED')
+        self.assertEqual(response.json()['lottery_status_display'], 'Not Conducted')
+
+    def test_status_lookup_requires_matching_mobile(self):
+        response = self._lookup(self.applications[0], mobile_number='9999999999')
+        self.assertEqual(response.status_code, 404)
+
+    def test_status_lookup_is_cached(self):
+        self._lookup(self.applications[0])
+        with self.assertNumQueries(0):
+            response = self._lookup(self.applications[0])
+        self.assertEqual(response.status_code, 200)
+
+    def test_status_lookup_uses_covering_index(self):
+        application = self.applications[0]
+        lookup = ApplicationStatusView.lookup({
+            'scheme': self.scheme.pk,
+            'application_number': application.application_number,
+            'mobile_number': application.mobile_number,
+        })
+        sql = str(lookup.query)
+        self.assertNotIn('ORDER BY', sql)
+        self.assertIn('LIMIT 1', sql)
+
+    async def test_async_status_lookup_matches_sync(self):
+        application = self.applications[0]
+        view = AsyncApplicationStatusView.as_view()
+
+        def lookup(mobile_number):
+            return AsyncRequestFactory().post('/', {
+                'scheme': self.scheme.pk,
+                'application_number': application.application_number,
+                'mobile_number': mobile_number,
+            }, content_type='application/json')
+
+        response = await view(lookup(application.mobile_number))
+        self.assertEqual(response.status_code, 200)
+        expected = (await sync_to_async(self._lookup)(application)).json()
+        self.assertEqual(json.loads(response.content), expected)
+
+        response = await view(lookup('9999999999'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_results_hidden_until_published(self):
+        response = self.client.get(f'/scheme/api/schemes/{self.scheme.pk}/results/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_results_are_keyset_paginated(self):
+        self.scheme.lottery_result_date = timezone.now() - timedelta(days=1)
+        self.scheme.save()
+        Application.objects.filter(scheme=self.scheme).update(lottery_status='SELECTED')
+
+        response = self.client.get(f'/scheme/api/schemes/{self.scheme.pk}/results/?page_size=3')
+        self.assertEqual(response.status_code, 200)
+        first_page = response.json()
+        self.assertEqual(len(first_page['results']), 3)
+
+        response = self.client.get(first_page['next'])
+        numbers = [row['application_number'] for row in first_page['results'] + response.json()['results']]
+        self.assertEqual(numbers, sorted(app.application_number for app in self.applications))
+
+
+class IndexAdvisorTestCase(TestCase):
+    """Tests for the Application index advisor"""
+
+    def test_meta_covers_known_query_shapes(self):
+        missing, covered = advise(QUERY_SHAPES, scheme_id=1)
+        self.assertEqual(missing, [])
+        self.assertTrue(covered)
+
+    def test_changelist_filter_puts_scheme_first(self):
+        queryset = Application.objects.filter(scheme_id=1, payment_status='PENDING').order_by('-application_submission_date')
+        proposal = propose_for_queryset(queryset, 'payment')
+        self.assertEqual(proposal.fields, ['scheme', 'payment_status', '-application_submission_date'])
+
+    def test_partial_condition(self):
+        queryset = Application.objects.filter(scheme_id=1, payment_status='PENDING').order_by('application_number')
+        proposal = propose_for_queryset(queryset, 'pending', partial_on=('payment_status',))
+        self.assertEqual(proposal.fields, ['scheme', 'application_number'])
+        self.assertEqual(proposal.condition, {'payment_status': 'PENDING'})
+        self.assertTrue(is_covered(proposal))
+
+    def test_parse_query_log(self):
+        statement = (
+            '(0.120) SELECT "scheme_application"."id" FROM "scheme_application" '
+            'WHERE ("scheme_application"."scheme_id" = 1 AND "scheme_application"."annual_income" = \'3L_6L\') '
+            'ORDER BY "scheme_application"."application_submission_date" DESC, "scheme_application"."id" DESC LIMIT 50; args=(1,)'
+        )
+        [(proposal, calls)] = parse_query_log([statement, statement, 'SELECT 1'], min_calls=2)
+        self.assertEqual(calls, 2)
+        self.assertEqual(proposal.fields, ['scheme', 'annual_income', '-application_submission_date'])
+        self.assertFalse(is_covered(proposal))
+
+    def test_benchmark_with_temporary_index(self):
+        scheme = SchemeFactory.create(name="Index Scheme", company="riyasat-infra")
+        proposal = propose_for_queryset(Application.objects.filter(scheme=scheme, annual_income='3L_6L'), 'income')
+        with temporary_indexes([proposal]):
+            self.assertGreaterEqual(time_shape(Application.objects.filter(scheme=scheme), repeat=1), 0)
+
+        out = io.StringIO()
+        call_command('advise_indexes', '--benchmark', '--explain', '--repeat', '1', stdout=out)
+        self.assertIn('already covers every query shape', out.getvalue())
+
+
+class EstimatedCountPaginatorTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the planner estimate paginator used by ApplicationAdmin"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Paginator Scheme", company="riyasat-infra")
+        self.queryset = Scheme.objects.order_by('pk')
+
+    def test_falls_back_to_exact_count_without_estimate(self):
+        paginator = EstimatedCountPaginator(self.queryset, 50)
+        self.assertEqual(paginator.count, 1)
+        self.assertFalse(paginator.estimated)
+
+    @patch.object(EstimatedCountPaginator, 'estimate', return_value=250000)
+    def test_uses_estimate_above_threshold(self, estimate):
+        paginator = EstimatedCountPaginator(self.queryset, 50)
+        self.assertEqual(paginator.count, 250000)
+        self.assertTrue(paginator.estimated)
+        # Overshooting pages are empty instead of an error
+        self.assertEqual(list(paginator.page(5000).object_list), [])
+
+    @patch.object(EstimatedCountPaginator, 'estimate', return_value=250000)
+    def test_exact_count_opt_in(self, estimate):
+        paginator = EstimatedCountPaginator(self.queryset, 50, exact=True)
+        self.assertEqual(paginator.count, 1)
+        estimate.assert_not_called()
+
+    @patch.object(EstimatedCountPaginator, 'estimate', return_value=500)
+    def test_small_estimates_are_counted(self, estimate):
+        self.assertEqual(EstimatedCountPaginator(self.queryset, 50).count, 1)
+
+    @patch.object(EstimatedCountPaginator, 'estimate', return_value=250000)
+    def test_admin_changelist(self, estimate):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+        response = self.client.get('/admin/scheme/application/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'about 250000')
+
+        response = self.client.get('/admin/scheme/application/?exact_count=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'about 250000')
+
+    def test_admin_links_keep_exact_count(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self._create_application(1, annual_income='UP_TO_3L', payment_status='PENDING')
+        Application.objects.update(application_submission_date=timezone.now() - timedelta(days=400))
+        self._create_application(2, annual_income='UP_TO_3L')
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get('/admin/scheme/application/?exact_count=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'application_submission_date__year={timezone.now().year}&amp;exact_count=1')
+        self.assertContains(response, 'exact_count=1&amp;payment_status__exact=PENDING')
+        # Years come from MIN/MAX, not a DISTINCT over every row
+        self.assertFalse([query for query in queries if 'DISTINCT' in query['sql']])
+
+
+class ApplicationSearchTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the application changelist search"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Search Scheme", company="riyasat-infra")
+        self.first = self._create_application(1, annual_income='UP_TO_3L')
+        self.second = self._create_application(2, annual_income='UP_TO_3L')
+        self.second.applicant_name = 'Suresh Kumawat'
+        self.second.save()
+
+    def _search(self, term):
+        return list(search_applications(Application.objects.all(), term))
+
+    def test_exact_match_fast_paths(self):
+        self.assertEqual(exact_match_filter('9800000001'), Q(mobile_number='9800000001'))
+        self.assertEqual(exact_match_filter('abcde1234f'), Q(id_number='ABCDE1234F'))
+        self.assertEqual(exact_match_filter('4000012'), Q(application_number=4000012))
+        self.assertIsNone(exact_match_filter('suresh'))
+
+        self.assertEqual(self._search('9800000002'), [self.second])
+        self.assertEqual(self._search('123456789001'), [self.first])
+        self.assertEqual(self._search(str(self.first.application_number)), [self.first])
+        self.assertEqual(self._search('APPLICANT1@example.com'), [self.first])
+
+    def test_partial_identifiers_fall_back_to_substring_match(self):
+        self.assertEqual(self._search('5555'), [])
+        self.assertCountEqual(self._search('980000000'), [self.first, self.second])
+        self.assertEqual(self._search('0000002'), [self.second])
+
+    def test_name_search_uses_text_index(self):
+        self.assertEqual(self._search('kumaw'), [self.second])
+        self.assertCountEqual(self._search('Father'), [self.first, self.second])
+
+    def test_text_index_follows_updates_and_deletes(self):
+        self.first.applicant_name = 'Meena Kumawat'
+        self.first.save()
+        self.assertEqual(len(self._search('kumawat')), 2)
+
+        Application.objects.filter(pk=self.second.pk).delete()
+        self.assertEqual(self._search('kumawat'), [self.first])
+
+    def test_admin_search(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        response = self.client.get('/admin/scheme/application/', {'q': 'kumawat'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Suresh Kumawat')
+
+
+class StreamingExportTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the streaming application export"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Export Scheme", company="riyasat-infra")
+        for index in range(3):
+            self._create_application(index, annual_income='UP_TO_3L')
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def _run_action(self, action):
+        return self.client.post('/admin/scheme/application/', {
+            'action': action,
+            '_selected_action': list(Application.objects.values_list('pk', flat=True)),
+        })
+
+    def test_rows_match_resource_export(self):
+        # scheme.admin imports this module, so import it lazily
+        from .admin import ApplicationResource
+
+        resource = ApplicationResource()
+        queryset = Application.objects.order_by('pk')
+        dataset = resource.export(queryset)
+
+        rows = list(export_rows(resource, queryset, chunk_size=2))
+        self.assertEqual(rows[0], dataset.headers)
+        self.assertEqual([list(row) for row in dataset], rows[1:])
+
+    def test_csv_action_streams(self):
+        response = self._run_action('stream_export_csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('9800000001', ''.join(lines))
+
+    @unittest.skipIf(importlib.util.find_spec('openpyxl') is None, 'openpyxl is not installed')
+    def test_xlsx_action(self):
+        response = self._run_action('stream_export_xlsx')
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+
+    @unittest.skipIf(importlib.util.find_spec('openpyxl') is not None, 'openpyxl is installed')
+    def test_xlsx_action_without_openpyxl(self):
+        response = self._run_action('stream_export_xlsx')
+        self.assertEqual(response.status_code, 302)
+
+
+EXPORT_TEST_DIR = tempfile.mkdtemp()
+LOCAL_EXPORT_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'exports': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': EXPORT_TEST_DIR}},
+}
+
+
+@override_settings(STORAGES=LOCAL_EXPORT_STORAGES)
+class ExportJobTestCase(ApplicationDataMixin, TestCase):
+    """Tests for background export jobs with a local storage stand-in"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Job Scheme", company="riyasat-infra")
+        for index in range(3):
+            self._create_application(index, annual_income='UP_TO_3L')
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def _queue(self, action):
+        self.client.post('/admin/scheme/application/', {
+            'action': action,
+            '_selected_action': list(Application.objects.values_list('pk', flat=True)[:2]),
+        })
+        return ExportJob.objects.get()
+
+    def test_action_queues_job(self):
+        job = self._queue('queue_export_csv')
+        self.assertEqual(job.status, 'QUEUED')
+        self.assertEqual(job.requested_by, self.user)
+        self.assertEqual(unpack_numbers(job.object_ids), sorted(Application.objects.values_list('pk', flat=True)[:2]))
+
+    def test_stale_jobs_are_requeued_then_failed(self):
+        from .admin import ApplicationResource
+
+        job = queue_export(ApplicationResource, Application.objects.all(), 'csv')
+        claim_next_job()
+        stale = timezone.now() - timedelta(hours=1)
+        ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        self.assertEqual(sweep_stale_jobs(), (1, 0))
+
+        self.assertEqual(claim_next_job().pk, job.pk)
+        ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale, attempts=3)
+        self.assertEqual(sweep_stale_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertIsNone(claim_next_job())
+
+    def test_worker_runs_job(self):
+        job = self._queue('queue_export_csv')
+        out = StringIO()
+        call_command('run_export_worker', '--once', stdout=out)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE', job.error)
+        self.assertEqual((job.total_rows, job.processed_rows, job.progress), (2, 2, 100))
+        with export_storage().open(job.file_name) as fh:
+            self.assertEqual(len(fh.read().decode().splitlines()), 3)
+
+        response = self.client.get(f'/admin/scheme/exportjob/{job.pk}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+    def test_requeued_job_keeps_the_new_run(self):
+        from .admin import ApplicationResource
+
+        job = queue_export(ApplicationResource, Application.objects.all(), 'csv')
+        first_run = claim_next_job()
+        # Requeued as stale and claimed by another worker while this one runs
+        ExportJob.objects.filter(pk=job.pk).update(attempts=2, processed_rows=0)
+
+        run_job(first_run)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.processed_rows, job.file_name), ('RUNNING', 2, 0, ''))
+        self.assertFalse(export_storage().exists(first_run.file_name))
+
+    def test_failed_job_records_error(self):
+        job = queue_export(ApplicationDataMixin, Application.objects.all(), 'csv')
+        run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertTrue(job.error)
+        self.assertIsNone(claim_next_job())
+
+    @patch('scheme.export_jobs.S3Manager')
+    def test_presigned_link_for_s3_storage(self, manager):
+        manager.return_value.generate_presigned_url.return_value = 'https://signed'
+        job = ExportJob(file_name='7/applications.csv')
+        storages = dict(LOCAL_EXPORT_STORAGES, exports={
+            'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+            'OPTIONS': {'location': 'exports', 'bucket_name': 'scheme-bucket'},
+        })
+        with override_settings(STORAGES=storages):
+            self.assertEqual(presigned_url(job), 'https://signed')
+        manager.return_value.generate_presigned_url.assert_called_once_with(
+            bucket_name='scheme-bucket', object_name='exports/7/applications.csv', expiration=300
+        )
+
+
+class SchemeResourceExportTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the annotated SchemeResource export"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Export Scheme", company="riyasat-infra", ews_plot_count=4, Lig_plot_count=3)
+        Scheme.objects.filter(pk=self.scheme.pk).update(
+            application_open_date=timezone.now() - timedelta(days=2),
+            application_close_date=timezone.now() + timedelta(days=2),
+        )
+        self._create_application(1, annual_income='UP_TO_3L')
+        self._create_application(2, annual_income='UP_TO_3L', payment_status='PENDING')
+        Application.objects.filter(mobile_number='9800000002').update(application_status='REJECTED')
+        self.other = SchemeFactory.create(name="Upcoming Scheme", company="riyasat-infra")
+
+    def test_export_is_one_query(self):
+        from .admin import SchemeResource
+
+        with self.assertNumQueries(1):
+            dataset = SchemeResource().export(Scheme.objects.order_by('pk'))
+
+        rows = {row['name']: row for row in dataset.dict}
+        exported = rows["Export Scheme"]
+        self.assertEqual(exported['lig_plot_count'], '3')
+        self.assertEqual(exported['total_plot_count'], '7')
+        self.assertEqual(exported['total_applications'], '2')
+        self.assertEqual(exported['accepted_applications'], '1')
+        self.assertEqual(exported['rejected_applications'], '1')
+        self.assertEqual(exported['payment_verified_applications'], '1')
+        self.assertEqual(exported['current_status'], 'Application Open')
+        self.assertEqual(rows["Upcoming Scheme"]['total_applications'], '0')
+
+    def test_status_ladder(self):
+        from .admin import scheme_status_expression
+
+        now = timezone.now()
+        Scheme.objects.filter(pk=self.scheme.pk).update(application_close_date=now - timedelta(hours=1))
+        Scheme.objects.filter(pk=self.other.pk).update(
+            application_open_date=now - timedelta(days=10), close_date=now - timedelta(days=1)
+        )
+        statuses = dict(Scheme.objects.annotate(status=scheme_status_expression(now)).values_list('name', 'status'))
+        self.assertEqual(statuses, {"Export Scheme": "Applications Under Review", "Upcoming Scheme": "Closed"})
+
+
+@override_settings(STORAGES=LOCAL_EXPORT_STORAGES)
+class ParquetExportTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the typed Parquet export of applications"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Parquet Scheme", company="riyasat-infra")
+        for index in range(3):
+            self._create_application(index, annual_income='UP_TO_3L')
+
+    def _run(self):
+        from .admin import ApplicationResource
+
+        queue_export(ApplicationResource, Application.objects.all(), 'parquet')
+        return run_job(claim_next_job())
+
+    def test_columns_follow_resource(self):
+        from .admin import ApplicationResource
+
+        columns = parquet_columns(ApplicationResource())
+        self.assertEqual(columns[:2], ['application_number', 'applicant_name'])
+        self.assertIn('dd_amount_or_transaction_amount', columns)
+
+    @unittest.skipIf(importlib.util.find_spec('pyarrow') is None, 'pyarrow is not installed')
+    def test_typed_row_groups(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        job = self._run()
+        self.assertEqual(job.status, 'DONE', job.error)
+        self.assertEqual(job.processed_rows, 3)
+        with export_storage().open(job.file_name) as fh:
+            table = pq.read_table(fh)
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.schema.field('dob').type, pa.date32())
+        self.assertEqual(table.schema.field('total_payable_amount').type, pa.decimal128(10, 2))
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('plot_category').type))
+
+        buffer = io.BytesIO()
+        write_parquet(((n,) for n in range(5)), buffer, Application, ['application_number'], row_group_size=2)
+        buffer.seek(0)
+        self.assertEqual(pq.ParquetFile(buffer).num_row_groups, 3)
+
+    @unittest.skipIf(importlib.util.find_spec('pyarrow') is not None, 'pyarrow is installed')
+    def test_missing_pyarrow_fails_job(self):
+        job = self._run()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertIn('pyarrow', job.error)
+
+
+class WorkflowTestCase(ApplicationDataMixin, TestCase):
+    """Tests for bulk status transitions and the scheme status counters"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Workflow Scheme", company="riyasat-infra")
+        self.applications = [
+            self._create_application(index, annual_income='UP_TO_3L', payment_status='PENDING')
+            for index in range(4)
+        ]
+        Application.objects.filter(pk__in=[a.pk for a in self.applications]).update(application_status='PENDING')
+        rebuild_status_counts()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def _counts(self, field):
+        return dict(
+            SchemeStatusCount.objects.filter(scheme=self.scheme, field=field, count__gt=0).values_list('value', 'count')
+        )
+
+    def test_pack_numbers_round_trip(self):
+        numbers = [5, 1, 1000000, 42, 43]
+        self.assertEqual(unpack_numbers(pack_numbers(numbers)), sorted(numbers))
+        self.assertEqual(unpack_numbers(pack_numbers([])), [])
+
+    def test_transition_updates_in_chunks_and_records_batch(self):
+        Application.objects.filter(pk=self.applications[0].pk).update(payment_status='VERIFIED')
+        rebuild_status_counts()
+
+        batch = apply_transition('verify_payment', Application.objects.all(), user=self.user, chunk_size=2)
+
+        self.assertEqual((batch.requested, batch.updated, batch.skipped), (4, 3, 1))
+        self.assertEqual(
+            updated_numbers(batch),
+            {self.scheme.pk: sorted(a.application_number for a in self.applications[1:])},
+        )
+        self.assertEqual(batch.chunks.count(), 2)
+        self.assertEqual(Application.objects.filter(payment_status='VERIFIED').count(), 4)
+        self.assertEqual(self._counts('payment_status'), {'VERIFIED': 4})
+
+    def test_disallowed_rows_are_skipped(self):
+        Application.objects.filter(pk=self.applications[0].pk).update(lottery_status='SELECTED')
+
+        batch = apply_transition('accept', Application.objects.all())
+
+        self.assertEqual(batch.skipped, 1)
+        self.assertEqual(Application.objects.get(pk=self.applications[0].pk).application_status, 'PENDING')
+
+    def test_rejection_requires_and_stores_remark(self):
+        with self.assertRaises(ValidationError):
+            apply_transition('reject', Application.objects.all(), remark='  ')
+
+        apply_transition('reject', Application.objects.all(), remark='Income proof missing')
+
+        application = Application.objects.get(pk=self.applications[0].pk)
+        self.assertEqual(application.rejection_remark, 'Income proof missing')
+        self.assertGreater(application.updated_at, self.applications[0].updated_at)
+        self.assertEqual(self._counts('application_status'), {'REJECTED': 4})
+
+    def test_accept_clears_rejection_remark(self):
+        apply_transition('reject', Application.objects.all(), remark='Income proof missing')
+
+        apply_transition('accept', Application.objects.all())
+
+        self.assertEqual(set(Application.objects.values_list('rejection_remark', flat=True)), {''})
+
+    def test_audit_rolls_back_with_failed_chunk(self):
+        with patch('scheme.workflow.adjust_status_counts', side_effect=[None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                apply_transition('verify_payment', Application.objects.all(), chunk_size=2)
+
+        batch = StatusTransitionBatch.objects.get()
+        verified = Application.objects.filter(payment_status='VERIFIED').values_list('application_number', flat=True)
+        self.assertEqual((batch.requested, batch.updated), (2, 2))
+        self.assertEqual(updated_numbers(batch), {self.scheme.pk: sorted(verified)})
+
+    def test_counters_follow_saves_and_deletes(self):
+        application = Application.objects.get(pk=self.applications[0].pk)
+        application.application_status = 'ACCEPTED'
+        application.save()
+        Application.objects.get(pk=self.applications[1].pk).delete()
+
+        self.assertEqual(self._counts('application_status'), {'PENDING': 2, 'ACCEPTED': 1})
+
+    def test_admin_reject_action_needs_remark(self):
+        self.client.force_login(self.user)
+        selected = [a.pk for a in self.applications[:2]]
+
+        self.client.post('/admin/scheme/application/', {
+            'action': 'mark_application_rejected', '_selected_action': selected, 'remark': '',
+        })
+        self.assertFalse(StatusTransitionBatch.objects.exists())
+
+        self.client.post('/admin/scheme/application/', {
+            'action': 'mark_application_rejected', '_selected_action': selected, 'remark': 'Duplicate',
+        })
+        batch = StatusTransitionBatch.objects.get()
+        self.assertEqual((batch.updated, batch.performed_by, batch.source), (2, self.user, 'admin action'))
+
+    def test_upload_view_applies_transition_to_numbers(self):
+        self.client.force_login(self.user)
+        numbers = [a.application_number for a in self.applications[:3]]
+        upload = SimpleUploadedFile('numbers.csv', '\n'.join(map(str, numbers)).encode() + b'\n999999\n')
+
+        response = self.client.post('/admin/scheme/application/bulk-transition/', {
+            'transition': 'accept', 'scheme': self.scheme.pk, 'numbers_file': upload, 'remark': '',
+        })
+
+        batch = StatusTransitionBatch.objects.get()
+        self.assertRedirects(response, f'/admin/scheme/statustransitionbatch/{batch.pk}/change/')
+        self.assertEqual((batch.requested, batch.updated, batch.skipped, batch.source), (4, 3, 1, 'upload'))
+        self.assertEqual(self._counts('application_status'), {'ACCEPTED': 3, 'PENDING': 1})
+
+
+class PaymentReconciliationTestCase(ApplicationDataMixin, TestCase):
+    """Tests for matching payments against bank statements"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Reconcile Scheme", company="riyasat-infra")
+        self.applications = [
+            self._create_application(index, annual_income='UP_TO_3L', payment_status='PENDING')
+            for index in range(5)
+        ]
+        # Two applications claim the same transaction
+        Application.objects.filter(pk=self.applications[4].pk).update(
+            dd_id_or_transaction_id='UPI0', transaction_reference='UPI0'
+        )
+        self.today = date.today()
+
+    def _statement_text(self, rows):
+        return 'Value Date,UTR No.,Narration,Credit Amount\n' + ''.join(
+            f'{day:%d/%m/%Y},{reference},UPI CREDIT,"{amount}"\n' for day, reference, amount in rows
+        )
+
+    def _statement(self, rows):
+        return Statement().load(io.StringIO(self._statement_text(rows)))
+
+    def _statement_file(self):
+        today = self.today
+        path = os.path.join(tempfile.mkdtemp(), 'statement.csv')
+        with open(path, 'w') as fh:
+            fh.write(self._statement_text([
+                (today, 'upi0', '10,500.00'),
+                (today, 'UPI 1', '10500'),
+                (today, 'UPI2', '500.00'),
+                (today - timedelta(days=3), 'UPI3', '10500.00'),
+            ]))
+        return path
+
+    def test_classifies_payments(self):
+        with open(self._statement_file()) as fh:
+            statement = Statement().load(fh)
+        result = reconcile(self.scheme, statement)
+
+        issues = {row['application_number']: row['issue'] for row in result.exceptions}
+        numbers = [a.application_number for a in self.applications]
+        self.assertCountEqual(result.matched, [a.pk for a in self.applications[:2]])
+        self.assertEqual(issues, {
+            numbers[2]: 'AMOUNT_MISMATCH',
+            numbers[3]: 'DATE_MISMATCH',
+            numbers[4]: 'ALREADY_CLAIMED',
+        })
+
+    def test_date_tolerance(self):
+        statement = self._statement([(self.today - timedelta(days=1), 'UPI3', '10500.00')])
+        result = reconcile(self.scheme, statement, date_tolerance=1)
+        self.assertEqual(result.matched, [self.applications[3].pk])
+
+    def test_command_verifies_and_fails_payments(self):
+        report = os.path.join(tempfile.mkdtemp(), 'exceptions.csv')
+        out = StringIO()
+        call_command('reconcile_payments', self._statement_file(), '--scheme', str(self.scheme.pk),
+                     '--report', report, '--fail-mismatched', stdout=out)
+
+        statuses = dict(Application.objects.values_list('pk', 'payment_status'))
+        self.assertEqual([statuses[a.pk] for a in self.applications],
+                         ['VERIFIED', 'VERIFIED', 'FAILED', 'FAILED', 'FAILED'])
+        self.assertEqual(
+            StatusTransitionBatch.objects.filter(source='reconciliation').count(), 2
+        )
+        with open(report) as fh:
+            self.assertEqual(len(fh.readlines()), 4)
+
+    def test_verified_reference_is_not_matched_again(self):
+        apply_reconciliation(reconcile(self.scheme, self._statement([(self.today, 'UPI0', '10500')])))
+        self.assertEqual(Application.objects.get(pk=self.applications[0].pk).payment_status, 'VERIFIED')
+
+        # A later application in another scheme reuses the verified UTR
+        other_scheme = SchemeFactory.create(name="Other Reconcile Scheme", company="riyasat-infra")
+        reused = self._create_application(7, annual_income='UP_TO_3L', payment_status='PENDING',
+                                          scheme=other_scheme, dd_id_or_transaction_id='UPI0')
+        self.assertTrue(reused.transaction_reused)
+
+        result = reconcile(other_scheme, self._statement([(self.today, 'UPI0', '10500')]))
+
+        self.assertEqual(result.matched, [])
+        self.assertEqual([(row['pk'], row['issue']) for row in result.exceptions], [(reused.pk, 'ALREADY_CLAIMED')])
+
+    def test_reused_reference_is_reported_not_verified(self):
+        Application.objects.filter(pk=self.applications[0].pk).update(transaction_reused=True)
+
+        result = reconcile(self.scheme, self._statement([(self.today, 'UPI0', '10500')]))
+
+        issues = {row['pk']: row['issue'] for row in result.exceptions}
+        self.assertNotIn(self.applications[0].pk, result.matched)
+        self.assertEqual(issues[self.applications[0].pk], 'TRANSACTION_REUSED')
+
+    def test_dry_run_changes_nothing(self):
+        call_command('reconcile_payments', self._statement_file(), '--scheme', str(self.scheme.pk),
+                     '--dry-run', stdout=StringIO())
+        self.assertFalse(Application.objects.exclude(payment_status='PENDING').exists())
+
+
+class DuplicateTransactionTestCase(ApplicationDataMixin, TestCase):
+    """Tests for reused transaction ID detection"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Txn Scheme", company="riyasat-infra")
+        self.other_scheme = SchemeFactory.create(name="Other Txn Scheme", company="riyasat-infra")
+
+    def _create(self, index, reference, scheme=None):
+        application = self._create_application(index, annual_income='UP_TO_3L')
+        if scheme is not None:
+            Application.objects.filter(pk=application.pk).update(scheme=scheme)
+        application = Application.objects.get(pk=application.pk)
+        application.dd_id_or_transaction_id = reference
+        application.save()
+        return application
+
+    def test_reference_is_normalised(self):
+        application = self._create(0, ' upi-123 456 ')
+        self.assertEqual(application.transaction_reference, 'UPI123456')
+        self.assertFalse(application.transaction_reused)
+
+    def test_reuse_is_flagged_on_save(self):
+        first = self._create(0, 'UPI123456')
+        second = self._create(1, 'upi 123456', scheme=self.other_scheme)
+
+        self.assertTrue(second.transaction_reused)
+        self.assertTrue(Application.objects.get(pk=first.pk).transaction_reused)
+
+        second.dd_id_or_transaction_id = 'UPI999'
+        second.save()
+        self.assertFalse(Application.objects.get(pk=second.pk).transaction_reused)
+        self.assertFalse(Application.objects.get(pk=first.pk).transaction_reused)
+
+    def test_report_command_groups_across_schemes(self):
+        self._create(0, 'UPI123456')
+        self._create(1, 'UPI123456', scheme=self.other_scheme)
+        self._create(2, 'UPI777')
+        self._create(3, 'upi777')
+        Application.objects.update(transaction_reused=False)
+
+        group = duplicate_references().get(transaction_reference='UPI123456')
+        self.assertEqual((group['applications'], group['schemes']), (2, 2))
+
+        output = os.path.join(tempfile.mkdtemp(), 'duplicates.csv')
+        call_command('report_duplicate_transactions', '--cross-scheme', '--output', output,
+                     '--fix-flags', stderr=StringIO())
+        with open(output) as fh:
+            lines = fh.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line.startswith('UPI123456') for line in lines[1:]))
+        self.assertEqual(Application.objects.filter(transaction_reused=True).count(), 4)
+        self.assertEqual(flag_reused_references(), (0, 0))
+
+
+class IdentityGraphTestCase(ApplicationDataMixin, TestCase):
+    """Tests for cross-scheme identity clusters"""
+
+    def setUp(self):
+        self.schemes = [
+            SchemeFactory.create(name=f"Identity Scheme {index}", company="riyasat-infra") for index in range(3)
+        ]
+
+    def _create(self, index, scheme, **fields):
+        self.scheme = scheme
+        # Submissions are linked once their transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self._create_application(index, annual_income='UP_TO_3L', **fields)
+
+    def _clusters(self):
+        return dict(Application.objects.values_list('pk', 'identity_cluster'))
+
+    def test_normalisers(self):
+        self.assertEqual(normalise_mobile('+91 98000-00001'), '9800000001')
+        self.assertEqual(normalise_mobile('12345'), '')
+        self.assertEqual(normalise_email(' A.B+lottery@GoogleMail.com'), 'ab@gmail.com')
+        self.assertEqual(normalise_email('a.b@example.com'), 'a.b@example.com')
+
+    def test_new_submission_links_across_schemes(self):
+        first = self._create(1, self.schemes[0])
+        unrelated = self._create(2, self.schemes[0])
+        # Same applicant, different formatting of the mobile number
+        second = self._create(3, self.schemes[1], mobile_number='+919800000001')
+
+        clusters = self._clusters()
+        self.assertEqual(clusters[first.pk], first.pk)
+        self.assertEqual(clusters[second.pk], first.pk)
+        self.assertEqual(clusters[unrelated.pk], unrelated.pk)
+
+    def test_bridge_application_merges_clusters(self):
+        first = self._create(1, self.schemes[0])
+        second = self._create(2, self.schemes[1])
+        self.assertNotEqual(self._clusters()[first.pk], self._clusters()[second.pk])
+
+        # Mobile of the first, Aadhaar of the second
+        bridge = self._create(3, self.schemes[2], mobile_number='9800000001', aadhar_number='123456789002')
+
+        clusters = self._clusters()
+        self.assertEqual({clusters[first.pk], clusters[second.pk], clusters[bridge.pk]}, {first.pk})
+
+    def test_keys_are_keyed_hashes(self):
+        self._create(1, self.schemes[0])
+
+        digests = set(IdentityKey.objects.values_list('digest', flat=True))
+        self.assertNotIn(hashlib.sha256(b'MOBILE:9800000001').hexdigest(), digests)
+        self.assertIn(identity_digest('MOBILE', '9800000001'), digests)
+        with override_settings(IDENTITY_HASH_KEY='another key'):
+            self.assertNotIn(identity_digest('MOBILE', '9800000001'), digests)
+
+    def test_concurrently_inserted_key_is_joined(self):
+        first = self._create(1, self.schemes[0])
+        # As if the first submission committed its keys after the second
+        # looked them up: the second's insert of the shared keys conflicts
+        with patch.object(IdentityKey.objects, 'select_for_update', return_value=IdentityKey.objects.none()):
+            second = self._create(3, self.schemes[1], mobile_number='9800000001')
+
+        clusters = self._clusters()
+        self.assertEqual(clusters[second.pk], first.pk)
+        self.assertEqual(set(IdentityKey.objects.values_list('cluster', flat=True)), {first.pk})
+
+    def test_rebuild_in_chunks_matches_incremental(self):
+        self._create(1, self.schemes[0])
+        self._create(2, self.schemes[1])
+        self._create(3, self.schemes[2], mobile_number='9800000001', aadhar_number='123456789002')
+        self._create(4, self.schemes[2])
+        incremental = self._clusters()
+
+        reset_identities()
+        self.assertEqual(link_all(chunk_size=1)[0], 4)
+        self.assertEqual(self._clusters(), incremental)
+
+    def test_links_a_large_batch_in_one_call(self):
+        # Not linked on creation: the on_commit callbacks are not run here
+        for index in range(400):
+            self.scheme = self.schemes[index % 3]
+            # Pairs of applications share a mobile number
+            self._create_application(
+                index, annual_income='UP_TO_3L', mobile_number=f'97{index // 2:08d}', applicant_bank_ifsc='SBIN0001234',
+            )
+
+        self.assertEqual(link_all()[0], 400)
+
+        self.assertEqual(len(set(self._clusters().values())), 200)
+        self.assertEqual(IdentityKey.objects.filter(kind='MOBILE').count(), 200)
+
+    def test_admin_cross_scheme_filter(self):
+        first = self._create(1, self.schemes[0])
+        second = self._create(3, self.schemes[1], email='Applicant1@Example.com')
+        self._create(2, self.schemes[0])
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+        response = self.client.get('/admin/scheme/application/', {'identity_links': 'cross_scheme'})
+
+        self.assertCountEqual([a.pk for a in response.context['cl'].result_list], [first.pk, second.pk])
+
+
+class ValidationRegistryTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the shared validation rules"""
+
+    def test_model_and_serializer_share_rules(self):
+        mobile_field = Application._meta.get_field('mobile_number')
+        self.assertIn(RuleValidator('mobile_number'), mobile_field.validators)
+
+        serializer = ApplicationStatusRequestSerializer(data={
+            'scheme': 1, 'application_number': 1, 'mobile_number': '98000',
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['mobile_number'], [RULES['mobile_number'].message])
+
+    def test_aadhaar_is_twelve_digits(self):
+        with self.assertRaises(ValidationError):
+            check('aadhar_number', 'ABCDE1234F')
+        check('aadhar_number', '123456789012')
+
+    def test_clean_validates_id_number_for_type(self):
+        self.scheme = SchemeFactory.create(name="Validation Scheme", company="riyasat-infra")
+        application = self._create_application(1, annual_income='UP_TO_3L')
+        application.id_type = 'PAN_CARD'
+        application.id_number = 'ABC1234567'
+        with self.assertRaises(ValidationError) as raised:
+            application.clean()
+        self.assertIn('id_number', raised.exception.message_dict)
+
+        application.id_number = 'ABCDE1234F'
+        application.clean()
+
+    def test_results_are_memoised_in_scope(self):
+        with patch.object(RULES['pincode'], 'matches', wraps=RULES['pincode'].matches) as matches:
+            with validation_scope():
+                for _ in range(3):
+                    check('pincode', '302001')
+                with self.assertRaises(ValidationError):
+                    check('pincode', '30200')
+                with self.assertRaises(ValidationError):
+                    check('pincode', '30200')
+            self.assertEqual(matches.call_count, 2)
+
+            # Outside a scope every call is checked
+            check('pincode', '302001')
+            check('pincode', '302001')
+            self.assertEqual(matches.call_count, 4)
+
+
+class IntakeDataMixin:
+    """Submission rows and a local storage for their payment proofs"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Batch Scheme", company="riyasat-infra")
+        self.storage = FileSystemStorage(location=tempfile.mkdtemp())
+        storage_patch = patch.object(Application._meta.get_field('payment_proof'), 'storage', self.storage)
+        storage_patch.start()
+        self.addCleanup(storage_patch.stop)
+
+    def _png(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), 'white').save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def _row(self, index, proof, **overrides):
+        row = {
+            'scheme': self.scheme.pk,
+            'mobile_number': f'97000000{index:02d}',
+            'applicant_name': f'Batch Applicant {index}',
+            'father_or_husband_name': 'Father',
+            'dob': '1990-01-01',
+            'id_type': 'VOTER_ID',
+            'id_number': 'ABC1234567',
+            'aadhar_number': f'5234567890{index:02d}',
+            'permanent_address': 'Address',
+            'permanent_address_pincode': '302001',
+            'postal_address': 'Address',
+            'postal_address_pincode': '302001',
+            'email': f'batch{index}@example.com',
+            'annual_income': '3L_6L',
+            'payment_mode': 'UPI',
+            'dd_id_or_transaction_id': f'BATCH{index}',
+            'dd_date_or_transaction_date': date.today().isoformat(),
+            'dd_amount_or_transaction_amount': '20500.00',
+            'payer_account_holder_name': 'Applicant',
+            'payer_bank_name': 'Bank',
+            'applicant_account_holder_name': 'Applicant',
+            'applicant_account_number': f'ACCB{index}',
+            'applicant_bank_name': 'Bank',
+            'applicant_bank_branch_address': 'Branch',
+            'applicant_bank_ifsc': 'SBIN0001234',
+            'payment_proof': proof,
+            # Ignored: intake always starts pending
+            'payment_status': 'VERIFIED',
+        }
+        row.update(overrides)
+        return row
+
+
+class BatchIntakeTestCase(IntakeDataMixin, TestCase):
+    """Tests for the batch application intake API"""
+
+    url = '/scheme/api/applications/batch/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('centre', 'centre@example.com', 'password', is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_multipart_batch(self):
+        rows = [
+            self._row(0, 'proof0'),
+            self._row(1, 'proof1', mobile_number='123'),
+            self._row(2, 'proof2'),
+            self._row(3, 'proof3', aadhar_number='523456789000'),
+        ]
+        files = {f'proof{index}': SimpleUploadedFile(f'p{index}.png', self._png()) for index in range(4)}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'applications': json.dumps(rows), **files})
+
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'invalid', 'created', 'invalid'])
+        self.assertIn('mobile_number', results[1]['errors'])
+        self.assertIn('aadhar_number', results[3]['errors']['non_field_errors'][0])
+
+        numbers = [results[0]['application_number'], results[2]['application_number']]
+        self.assertEqual(numbers[1], numbers[0] + 1)
+        application = Application.objects.get(pk=results[0]['id'])
+        self.assertEqual((application.payment_status, application.plot_category), ('PENDING', 'LIG'))
+        self.assertTrue(self.storage.exists(application.payment_proof.name))
+        self.assertEqual(application.identity_cluster, application.pk)
+        self.assertEqual(
+            StatusCount.objects.get(scheme=self.scheme, field='payment_status', value='PENDING').count, 2
+        )
+
+    def test_zip_batch(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as bundle:
+            bundle.writestr('applications.json', json.dumps([
+                self._row(0, 'proofs/0.png'), self._row(1, 'proofs/1.png', dd_id_or_transaction_id='batch-0'),
+            ]))
+            bundle.writestr('proofs/0.png', self._png())
+            bundle.writestr('proofs/1.png', self._png())
+        archive.seek(0)
+
+        response = self.client.post(self.url, {'archive': SimpleUploadedFile('batch.zip', archive.read())})
+
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'created'])
+        self.assertEqual(Application.objects.filter(transaction_reused=True).count(), 2)
+
+    @override_settings(IDENTITY_HASH_KEY=None)
+    def test_identity_link_failure_keeps_results(self):
+        files = {'proof0': SimpleUploadedFile('p0.png', self._png())}
+        with self.assertLogs(level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, {'applications': json.dumps([self._row(0, 'proof0')]), **files})
+
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        self.assertEqual(results[0]['status'], 'created')
+        # Left for manage.py link_identities
+        self.assertIsNone(Application.objects.get(pk=results[0]['id']).identity_cluster)
+
+    def test_rejects_malformed_batch_and_non_staff(self):
+        response = self.client.post(self.url, {'applications': '{"not": "a list"}'})
+        self.assertEqual(response.status_code, 400)
+
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.post(self.url, {'applications': '[]'})
+        self.assertEqual(response.status_code, 403)
+
+
+class ApplicationSubmissionTestCase(IntakeDataMixin, TestCase):
+    """Tests for the single submission and acknowledgement PDF endpoints"""
+
+    def test_submit_then_fetch_pdf(self):
+        row = self._row(0, SimpleUploadedFile('proof.png', self._png()))
+        del row['payment_status']
+
+        response = self.client.post('/scheme/api/application/', row)
+
+        self.assertEqual(response.status_code, 201)
+        submitted = response.json()
+        pdf = base64.b64decode(submitted['pdf_bytes'])
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'Batch Applicant 0', pdf)
+
+        response = self.client.post('/scheme/api/application/pdf', {
+            'application_number': submitted['application_number'], 'mobile_number': row['mobile_number'],
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(str(submitted['application_number']).encode(), base64.b64decode(response.json()['pdf_bytes']))
+
+    def test_pdf_text_is_escaped(self):
+        # Parentheses and backslashes delimit PDF strings; Devanagari is not in the base fonts
+        self.assertEqual(escape_text('A (B) \\ Ç ग'), 'A \\(B\\) \\\\ Ç ?')
+
+
+class ApplicationImportTestCase(ApplicationDataMixin, TestCase):
+    """Tests for the offline CSV import of applications"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Import Scheme", company="riyasat-infra")
+        self.existing = self._create_application(50, annual_income='3L_6L')
+        self.path = os.path.join(tempfile.mkdtemp(), 'legacy.csv')
+
+    def _row(self, index, **overrides):
+        row = {
+            'application_number': '',
+            'scheme_name': 'Ignored',
+            'mobile_number': f'96000000{index:02d}',
+            'applicant_name': f'Legacy Applicant {index}',
+            'father_or_husband_name': 'Father',
+            'dob': '01-01-1990',
+            'id_type': 'VOTER_ID',
+            'id_number': 'ABC1234567',
+            'aadhar_number': f'6234567890{index:02d}',
+            'permanent_address': 'Address',
+            'permanent_address_pincode': '302001',
+            'postal_address': 'Address',
+            'postal_address_pincode': '302001',
+            'email': f'legacy{index}@example.com',
+            'annual_income': '0L_3L',
+            'sub_category': 'un-reserved',
+            'payment_mode': 'UPI',
+            'dd_id_or_transaction_id': f'LEGACY{index}',
+            'dd_date_or_transaction_date': '2024-03-15',
+            'dd_amount_or_transaction_amount': '10,500.00',
+            'payer_account_holder_name': 'Applicant',
+            'payer_bank_name': 'Bank',
+            'applicant_account_holder_name': 'Applicant',
+            'applicant_account_number': f'ACCL{index}',
+            'applicant_bank_name': 'Bank',
+            'applicant_bank_branch_address': 'Branch',
+            'applicant_bank_ifsc': 'SBIN0001234',
+            'payment_status': '',
+            'application_status': '',
+            'rejection_remark': '',
+        }
+        row.update(overrides)
+        return row
+
+    def _write(self, rows):
+        with open(self.path, 'w', newline='') as fh:
+            writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def test_import_csv(self):
+        self._write([
+            self._row(0),
+            self._row(1, mobile_number='123', dob='31-02-1990'),
+            self._row(2, aadhar_number=f'6234567890{0:02d}'),
+            self._row(3, mobile_number=self.existing.mobile_number),
+            self._row(4, payment_status='VERIFIED', application_status='ACCEPTED'),
+            self._row(5, id_type='PAN_CARD'),
+        ])
+        first = Scheme.objects.get(pk=self.scheme.pk).next_application_number
+        rejected = io.StringIO()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_csv(self.path, self.scheme, rejected=rejected, workers=1, chunk_size=2)
+
+        self.assertEqual((result.total, result.created, result.rejected), (6, 2, 4))
+        imported = Application.objects.filter(scheme=self.scheme).exclude(pk=self.existing.pk).order_by('application_number')
+        self.assertEqual([a.application_number for a in imported], [first, first + 1])
+        self.assertEqual(Scheme.objects.get(pk=self.scheme.pk).next_application_number, first + 2)
+
+        application = imported[0]
+        self.assertEqual(application.dob, date(1990, 1, 1))
+        self.assertEqual(application.plot_category, 'EWS')
+        self.assertEqual(application.total_payable_amount, Decimal('10500.00'))
+        self.assertEqual(application.transaction_reference, 'LEGACY0')
+        self.assertEqual(application.identity_cluster, application.pk)
+        self.assertEqual(imported[1].payment_status, 'VERIFIED')
+        self.assertEqual(
+            StatusCount.objects.get(scheme=self.scheme, field='payment_status', value='PENDING').count, 1
+        )
+
+        rejected.seek(0)
+        errors = {row['line']: row['errors'] for row in csv.DictReader(rejected)}
+        self.assertEqual(set(errors), {'3', '4', '5', '7'})
+        self.assertIn('mobile_number', errors['3'])
+        self.assertIn('dob', errors['3'])
+        self.assertIn('Same as line 2', errors['4'])
+        self.assertIn('already exists', errors['5'])
+        self.assertIn('id_number', errors['7'])
+
+    @override_settings(IDENTITY_HASH_KEY=None)
+    def test_identity_link_failure_does_not_abort_import(self):
+        self._write([self._row(0), self._row(1), self._row(2, mobile_number='123')])
+        rejected = io.StringIO()
+
+        with self.assertLogs(level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                result = import_csv(self.path, self.scheme, rejected=rejected, workers=1, chunk_size=1)
+
+        self.assertEqual((result.total, result.created, result.rejected), (3, 2, 1))
+        self.assertIn('mobile_number', rejected.getvalue())
+        # Left for manage.py link_identities
+        self.assertFalse(
+            Application.objects.filter(scheme=self.scheme, identity_cluster__isnull=False)
+            .exclude(pk=self.existing.pk).exists()
+        )
+
+    def test_dry_run_inserts_nothing(self):
+        self._write([self._row(0), self._row(1)])
+        before = Scheme.objects.get(pk=self.scheme.pk).next_application_number
+
+        result = import_csv(self.path, self.scheme, workers=1, dry_run=True)
+
+        self.assertEqual((result.created, result.rejected), (2, 0))
+        self.assertEqual(Application.objects.filter(scheme=self.scheme).count(), 1)
+        self.assertEqual(Scheme.objects.get(pk=self.scheme.pk).next_application_number, before)
+
+    def test_command_validates_in_worker_processes(self):
+        self._write([self._row(index) for index in range(4)] + [self._row(9, email='not-an-email')])
+        out = StringIO()
+
+        call_command('import_applications', self.path, scheme=self.scheme.pk, workers=2, stdout=out)
+
+        self.assertIn('4 application(s) imported', out.getvalue())
+        self.assertIn('1 row(s) rejected', out.getvalue())
+        self.assertEqual(Application.objects.filter(scheme=self.scheme).count(), 5)
+
+    def test_import_fields_skip_derived_columns(self):
+        self.assertNotIn('plot_category', IMPORT_FIELDS)
+        self.assertNotIn('application_number', IMPORT_FIELDS)
+        self.assertIn('annual_income', IMPORT_FIELDS)
+
+
+class RequestMetricsTestCase(TestCase):
+    """Tests for the per-request instrumentation and the metrics endpoint"""
+
+    url = '/scheme/internal/metrics/'
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Metrics Scheme", company="riyasat-infra")
+        metrics.REGISTRY.reset()
+        cache.clear()
+
+    def _scrape(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            return self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+    def test_records_queries_and_cache_per_view(self):
+        seats = f'/scheme/api/schemes/{self.scheme.pk}/seats/'
+        self.client.get(seats)
+        self.client.get(seats)
+
+        body = self._scrape()
+
+        self.assertIn('portal_requests_total{view="scheme-seats",method="GET",status="200"} 2', body)
+        self.assertIn('portal_request_duration_seconds_count{view="scheme-seats",method="GET"} 2', body)
+        self.assertIn('portal_cache_requests_total{view="scheme-seats",result="hit"} 1', body)
+        self.assertIn('portal_cache_requests_total{view="scheme-seats",result="miss"} 1', body)
+        # The cached request runs no query, the other at least one
+        self.assertIn('portal_request_db_queries_bucket{view="scheme-seats",le="0"} 1', body)
+        self.assertIn('portal_request_db_queries_bucket{view="scheme-seats",le="+Inf"} 2', body)
+        self.assertIn('# TYPE portal_request_db_seconds histogram', body)
+
+    async def test_counts_queries_of_requests_served_async(self):
+        # Under ASGI the sync view runs on another thread than the middleware
+        await self.async_client.get(f'/scheme/api/schemes/{self.scheme.pk}/seats/')
+
+        body = metrics.REGISTRY.render()
+        self.assertIn('portal_requests_total{view="scheme-seats",method="GET",status="200"} 1', body)
+        self.assertIn('portal_request_db_queries_bucket{view="scheme-seats",le="0"} 0', body)
+
+    def test_collecting_counts_storage_calls_and_pdf_renders(self):
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        metrics.instrument_storage(FileSystemStorage)
+
+        with metrics.collecting() as stats:
+            name = storage.save('proof.txt', ContentFile(b'proof'))
+            storage.exists(name)
+            with metrics.pdf_render():
+                pass
+            Scheme.objects.count()
+
+        # save() also checks for a free name
+        self.assertGreaterEqual(stats.storage_calls, 3)
+        self.assertEqual(stats.pdf_renders, 1)
+        self.assertEqual(stats.db_queries, 1)
+        calls = stats.storage_calls
+        storage.exists(name)
+        self.assertEqual(stats.storage_calls, calls)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Test', ('view',), (0.1, 1))
+        histogram.observe(('a',), 0.05)
+        histogram.observe(('a',), 0.5)
+        histogram.observe(('a',), 5)
+
+        samples = {(name, labels.get('le')): value for name, labels, value in histogram.samples()}
+
+        self.assertEqual(samples[('test_seconds_bucket', '0.1')], 1)
+        self.assertEqual(samples[('test_seconds_bucket', '1')], 2)
+        self.assertEqual(samples[('test_seconds_bucket', '+Inf')], 3)
+        self.assertEqual(samples[('test_seconds_count', None)], 3)
+        self.assertAlmostEqual(samples[('test_seconds_sum', None)], 5.55)
+
+    def test_endpoint_access(self):
+        # Without a token not even the private network may scrape: behind the
+        # load balancer every request comes from it
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+            self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get(self.url, REMOTE_ADDR='8.8.8.8', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+    def test_reports_connection_pool_state(self):
+        body = self._scrape()
+        # SQLite has no pool: the metrics are declared, without series
+        self.assertIn('# TYPE portal_db_pool gauge', body)
+        self.assertNotIn('portal_db_pool{', body)
+
+        class Pool:
+            def get_stats(self):
+                return {'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1, 'requests_num': 7}
+
+        connections['default'].pool = Pool()
+        try:
+            body = self._scrape()
+        finally:
+            del connections['default'].pool
+
+        self.assertIn('portal_db_pool{database="default",stat="pool_size"} 4', body)
+        self.assertIn('portal_db_pool{database="default",stat="requests_waiting"} 0', body)
+        self.assertIn('# TYPE portal_db_pool_events_total counter', body)
+        self.assertIn('portal_db_pool_events_total{database="default",stat="requests_num"} 7', body)
+
+class QueryBudgetTestCase(ApplicationDataMixin, TestCase):
+    """Query budgets of the list views, admin changelists and exports"""
+
+    def setUp(self):
+        self.scheme = SchemeFactory.create(name="Budget Scheme", company="riyasat-infra")
+        SchemeFactory.create(name="Budget Scheme 2", company="riyasat-infra")
+        for index in range(6):
+            self._create_application(index, annual_income='3L_6L')
+        self.admin_user = User.objects.create_superuser('budget', 'budget@example.com', 'password')
+
+    def test_query_shape_folds_literals(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE id = 12 AND name = 'a''b' AND x IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND x IN (...)",
+        )
+
+    def test_exceeded_budget_reports_repeated_shapes(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(2, label='Per-row lookups'):
+                for application in Application.objects.all():
+                    Scheme.objects.get(pk=application.scheme_id)
+
+        message = str(raised.exception)
+        self.assertIn('Per-row lookups ran 7 queries, budget 2', message)
+        self.assertIn('6x SELECT', message)
+
+    def test_budget_as_decorator(self):
+        @query_budget(1)
+        def count():
+            return Scheme.objects.count()
+
+        self.assertEqual(count(), 2)
+
+    def test_scheme_list_view(self):
+        with query_budget(1, label='SchemeListView'):
+            response = self.client.get('/scheme/api/schemes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['status'], 'Coming Soon')
+
+    def test_application_changelist(self):
+        self.client.force_login(self.admin_user)
+        # session, user, scheme filter, count, rows, date hierarchy (2)
+        with query_budget(7, label='Application changelist'):
+            response = self.client.get('/admin/scheme/application/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_scheme_changelist(self):
+        self.client.force_login(self.admin_user)
+        with query_budget(7, label='Scheme changelist'):
+            response = self.client.get('/admin/scheme/scheme/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_application_export(self):
+        from .admin import ApplicationResource
+
+        with query_budget(1, label='Application export'):
+            rows = list(export_rows(ApplicationResource(), Application.objects.all()))
+        self.assertEqual(len(rows), 7)
+
+
+from OTP.models import OTP
+from .models import SchemeStatusCount
+from .synthetic import application_rows, generate, verhoeff_digit
+
+
+class SyntheticDataTestCase(TestCase):
+    """Tests for the synthetic dataset generator"""
+
+    def test_generated_applications_are_valid(self):
+        result = generate(60, scheme_count=2, seed=1, chunk_size=25)
+
+        self.assertEqual(result.applications, 60)
+        self.assertEqual(Application.objects.count(), 60)
+        for application in Application.objects.all():
+            application.full_clean(exclude=['payment_proof', 'application_pdf'])
+            self.assertEqual(verhoeff_digit(application.aadhar_number[:-1]), application.aadhar_number[-1])
+            self.assertTrue(OTP.objects.filter(mobile_number=application.mobile_number, is_used=True).exists())
+        for scheme in result.schemes:
+            scheme.refresh_from_db()
+            self.assertEqual(scheme.next_application_number, scheme.application_number_start + 30)
+            counted = SchemeStatusCount.objects.filter(scheme=scheme, field='application_status')
+            self.assertEqual(sum(counted.values_list('count', flat=True)), 30)
+
+    def test_same_seed_gives_same_rows(self):
+        scheme = SchemeFactory.create(name="Synthetic Scheme", company="riyasat-infra")
+        # Submission times fall in the scheme's (closed) application window
+        scheme.application_open_date = timezone.now() - timedelta(days=90)
+        scheme.application_close_date = scheme.application_open_date + timedelta(days=30)
+        first = application_rows(random.Random(5), scheme, 0, 1, 20)
+        self.assertEqual(first, application_rows(random.Random(5), scheme, 0, 1, 20))
+        self.assertNotEqual(first, application_rows(random.Random(6), scheme, 0, 1, 20))
+        self.assertEqual(verhoeff_digit('236'), '3')
+
+    def test_command_adds_to_existing_scheme(self):
+        scheme = SchemeFactory.create(name="Synthetic Scheme", company="riyasat-infra")
+        call_command('generate_fixtures', applications=10, scheme=[scheme.pk], stdout=StringIO())
+        call_command('generate_fixtures', applications=10, scheme=[scheme.pk], seed=1, stdout=StringIO())
+
+        numbers = sorted(scheme.applications.values_list('application_number', flat=True))
+        self.assertEqual(numbers, list(range(scheme.application_number_start, scheme.application_number_start + 20)))
+        self.assertEqual(scheme.applications.values('mobile_number').distinct().count(), 20)
+
+
+import sqlite3
+from django.http import HttpResponse
+from django.test import TransactionTestCase
+from .routing import REPLICA, PIN_COOKIE, ReplicaRoutingMiddleware, primary
+
+
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """
+    Routing between the test database and a replica in a second SQLite file.
+
+    The replica is a snapshot of the primary taken by _sync(); rows written
+    after it exist only on the primary, so each read shows where it went.
+    """
+
+    # Resolved in setUpClass, after the replica alias is registered; the
+    # test runner itself only sees (and creates) the default database
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Stand in for a replica from the settings (a test mirror) if any
+        cls.configured = connections.settings.get(REPLICA)
+        cls.configured_connection = connections[REPLICA] if cls.configured else None
+        cls.replica_path = os.path.join(tempfile.mkdtemp(), 'replica.sqlite3')
+        connections.settings[REPLICA] = dict(connections.settings['default'], NAME=cls.replica_path)
+        if cls.configured:
+            del connections[REPLICA]
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        if cls.configured:
+            connections.settings[REPLICA] = cls.configured
+            connections[REPLICA] = cls.configured_connection
+        else:
+            del connections.settings[REPLICA]
+
+    def setUp(self):
+        # Copy the schema first; validation in save() already reads
+        self._sync()
+        self.scheme = SchemeFactory.create(name="Replicated Scheme", company="riyasat-infra")
+        self._sync()
+        self.unreplicated = SchemeFactory.create(name="Unreplicated Scheme", company="riyasat-infra")
+
+    def _sync(self):
+        connections[REPLICA].close()
+        connections['default'].ensure_connection()
+        with sqlite3.connect(self.replica_path) as target:
+            connections['default'].connection.backup(target)
+
+    def test_reads_go_to_replica_unless_pinned(self):
+        self.assertEqual(Scheme.objects.count(), 1)
+        with primary():
+            self.assertEqual(Scheme.objects.count(), 2)
+        with transaction.atomic():
+            self.assertEqual(Scheme.objects.count(), 2)
+
+    def test_request_reads_its_writes_and_pins_the_client(self):
+        counts = []
+
+        def view(request):
+            counts.append(Scheme.objects.count())
+            if request.method == 'POST':
+                SchemeFactory.create(name="Submitted Scheme", company="riyasat-infra")
+                counts.append(Scheme.objects.count())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        # A POST reads the primary from the start, before its first write
+        response = middleware(RequestFactory().post('/'))
+        self.assertEqual(counts, [2, 3])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        pinned = RequestFactory().get('/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        self.assertNotIn(PIN_COOKIE, middleware(pinned).cookies)
+        middleware(RequestFactory().get('/'))
+        self.assertEqual(counts[2:], [3, 1])
+
+    def test_admin_changelist_reads_replica_and_change_view_primary(self):
+        # The user and session must reach the replica before the admin reads them
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self._sync()
+        self.client.login(username='admin', password='password')
+        self._sync()
+        later = SchemeFactory.create(name="Later Scheme", company="riyasat-infra")
+
+        response = self.client.get('/admin/scheme/scheme/')
+        self.assertContains(response, 'Unreplicated Scheme')
+        self.assertNotContains(response, 'Later Scheme')
+
+        response = self.client.get(f'/admin/scheme/scheme/{later.pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Later Scheme')
@@ -1,11 +1,24 @@
+from django.conf import settings
 from django.urls import path
-from .views import SchemeListView, SchemeDetailView
+from .views import SchemeListView, SchemeDetailView, SchemeSeatsView
 from .views import ApplicationAPIView, ApplicationPDFGetter
+from .views import ApplicationStatusView, ApplicationResultsView, ApplicationBatchView
+from .metrics import metrics_view
+
+# Under ASGI the async versions serve the same URLs
+if getattr(settings, 'ASYNC_VIEWS', False):
+    from .async_views import AsyncApplicationPDFGetter as ApplicationPDFGetter
+    from .async_views import AsyncApplicationStatusView as ApplicationStatusView
 
 urlpatterns = [
     path("api/schemes/", SchemeListView.as_view(), name="scheme-list"),
     path("api/schemes/<int:pk>/", SchemeDetailView.as_view(), name="scheme-detail"),
+    path("api/schemes/<int:pk>/seats/", SchemeSeatsView.as_view(), name="scheme-seats"),
     path("api/application/", ApplicationAPIView.as_view(), name='application-api-create'),
+    path("api/applications/batch/", ApplicationBatchView.as_view(), name='application-api-batch'),
     path("api/application/pdf", ApplicationPDFGetter.as_view(), name='application-api-pdf'),
+    path("api/application/status/", ApplicationStatusView.as_view(), name='application-api-status'),
+    path("api/schemes/<int:pk>/results/", ApplicationResultsView.as_view(), name='scheme-results'),
+    path("internal/metrics/", metrics_view, name='metrics'),
 
 ]
@@ -0,0 +1,162 @@
+"""
+Field validation rules shared by the Application model and its serializer.
+
+Every rule is compiled once at import. The model fields use RuleValidator,
+ModelSerializer copies those validators onto its fields and
+Application.clean / ApplicationSerializer.validate_id_number both call
+validate_id_number, so the API and the admin apply the same checks.
+
+Inside ``validation_scope()`` (entered per request by
+ValidationScopeMiddleware and by ApplicationSerializer.is_valid) the result
+of each (rule, value) check is remembered, so a value checked by a form or
+serializer field is not checked again by the model's full_clean.
+"""
+
+import contextvars
+import re
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import ValidationError
+from django.utils.deconstruct import deconstructible
+
+
+class Rule:
+    """
+    A compiled check of a single value.
+
+    Attributes:
+        name: Registry key
+        message: Error message when the value does not match
+        pattern: Compiled regex the whole value must match, or None
+        min_length, max_length: Length bounds for free-form values
+    """
+
+    def __init__(self, name, message, pattern=None, min_length=None, max_length=None):
+        self.name = name
+        self.message = message
+        self.pattern = re.compile(pattern) if pattern else None
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def matches(self, value):
+        if self.pattern is not None and not self.pattern.fullmatch(value):
+            return False
+        if self.min_length is not None and len(value) < self.min_length:
+            return False
+        if self.max_length is not None and len(value) > self.max_length:
+            return False
+        return True
+
+
+RULES = {
+    rule.name: rule for rule in (
+        Rule('mobile_number', 'Enter a valid 10-digit mobile number', r'\d{10}'),
+        Rule('aadhar_number', 'Enter a valid Aadhar number (12 digits)', r'\d{12}'),
+        Rule('pincode', 'Enter a valid 6-digit pincode', r'\d{6}'),
+        Rule('ifsc', 'Enter a valid IFSC code', r'[A-Z]{4}0[A-Z0-9]{6}'),
+        Rule('pan', 'Enter a valid PAN number (e.g., ABCDE1234F)', r'[A-Z]{5}[0-9]{4}[A-Z]'),
+        Rule('voter_id', 'Enter a valid VOTER ID number (e.g., ABC1234567)', r'[A-Z]{3}[0-9]{7}'),
+        Rule('ration_card', 'Ration card number must be between 8-15 characters', min_length=8, max_length=15),
+        Rule('jan_aadhar', 'Jan Aadhar number must be 10 digits', r'\d{10}'),
+    )
+}
+
+# Rule for id_number by id_type; types not listed are not checked
+ID_NUMBER_RULES = {
+    'PAN_CARD': 'pan',
+    'VOTER_ID': 'voter_id',
+    'RATION_CARD': 'ration_card',
+    'JAN_AADHAR': 'jan_aadhar',
+    'AADHAR': 'aadhar_number',
+}
+
+
+_results = contextvars.ContextVar('validation_results', default=None)
+
+
+@contextmanager
+def validation_scope():
+    """
+    Remember rule results until the block exits.
+
+    Nested scopes share the outer scope's results.
+    """
+    if _results.get() is not None:
+        yield
+        return
+    token = _results.set({})
+    try:
+        yield
+    finally:
+        _results.reset(token)
+
+
+def check(rule_name, value):
+    """
+    Validate a value against a registered rule.
+
+    Raises:
+        ValidationError: If the value does not match
+    """
+    results = _results.get()
+    key = (rule_name, value)
+    if results is not None and key in results:
+        valid = results[key]
+    else:
+        valid = RULES[rule_name].matches(value)
+        if results is not None:
+            results[key] = valid
+    if not valid:
+        raise ValidationError(RULES[rule_name].message, code='invalid')
+
+
+def validate_id_number(id_type, value):
+    """
+    Validate an ID number for its ID type.
+
+    Raises:
+        ValidationError: If the number does not fit the type
+    """
+    rule_name = ID_NUMBER_RULES.get(id_type)
+    if rule_name and value is not None:
+        check(rule_name, value)
+
+
+@deconstructible
+class RuleValidator:
+    """Model field validator running a registered rule"""
+
+    def __init__(self, rule_name):
+        if rule_name not in RULES:
+            raise ValueError(f"Unknown validation rule {rule_name}")
+        self.rule_name = rule_name
+
+    def __call__(self, value):
+        check(self.rule_name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, RuleValidator) and other.rule_name == self.rule_name
+
+
+class ValidationScopeMiddleware:
+    """Validate each value once per request, across forms, serializers and models"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        with validation_scope():
+            return self.get_response(request)
+
+    async def _acall(self, request):
+        with validation_scope():
+            return await self.get_response(request)
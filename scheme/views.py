@@ -9,11 +9,24 @@ from rest_framework import status
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from .models import Application
-from .serializers import PDFRequestSerializer
+from .serializers import PDFRequestSerializer, ApplicationStatusRequestSerializer, ApplicationResultSerializer
 
 from rest_framework.parsers import MultiPartParser, FormParser
 from .serializers import ApplicationSerializer
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from .allocation import quota_table, seat_summary
+from rest_framework.permissions import IsAdminUser
+from .intake import BatchError, read_multipart, read_zip, submit_batch
+from .metrics import pdf_render
+from .pdf_generator import ApplicationPDFGenerator
+import base64
+
 class SchemeListView(generics.ListAPIView):
     queryset = Scheme.objects.all().order_by("application_open_date")
     serializer_class = SchemeSerializer
@@ -24,6 +37,43 @@ class SchemeDetailView(generics.RetrieveAPIView):
     serializer_class = SchemeSerializer
 
 
+class SchemeSeatsView(APIView):
+    """
+    Seats per reserved quota of a scheme and how many are still unfilled.
+
+    GET /scheme/api/schemes/<pk>/seats/
+
+    Counts eligible applications (accepted, payment verified) with one grouped
+    query and runs them through the same quota/spillover rules as the lottery.
+    Responses are cached for SEATS_CACHE_SECONDS.
+    """
+    SEATS_CACHE_SECONDS = 60
+
+    def get(self, request, pk):
+        cache_key = f"scheme:seats:{pk}"
+        data = cache.get(cache_key)
+        if data is None:
+            scheme = get_object_or_404(Scheme, pk=pk)
+            data = {'scheme': scheme.pk, 'plot_categories': self._summarise(scheme)}
+            cache.set(cache_key, data, self.SEATS_CACHE_SECONDS)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def _summarise(self, scheme):
+        demand = {}
+        rows = Application.objects.filter(
+            scheme=scheme,
+            application_status=Application.APPLICATION_STATUS_CHOICES.ACCEPTED,
+            payment_status=Application.PAYMENT_STATUS_CHOICES.VERIFIED,
+        ).values('plot_category', 'sub_category').annotate(applicants=Count('id')).order_by()
+        for row in rows:
+            demand.setdefault(row['plot_category'], {})[row['sub_category']] = row['applicants']
+
+        return {
+            plot_category: seat_summary(quotas, demand.get(plot_category, {}))
+            for plot_category, quotas in quota_table(scheme).items()
+        }
+
+
 
 class ApplicationAPIView(APIView):
     """
@@ -47,8 +97,7 @@ class ApplicationAPIView(APIView):
         if serializer.is_valid():
             application = serializer.save()
             # genrate the pdf bytes and return the pdf 
-            pdf_bytes = application_pdf_generator.create_pdf(application)
-            
+            pdf_bytes = application_pdf_bytes(application)
 
             return Response(
                 {
@@ -69,6 +118,56 @@ class ApplicationAPIView(APIView):
         )
     
     
+class ApplicationBatchView(APIView):
+    """
+    Batch submission for assisted-submission centres (staff accounts only).
+
+    POST /scheme/api/applications/batch/ as multipart, either
+        applications: JSON list of applications, each "payment_proof" naming
+                      a file part of the request
+        <file parts>: the payment proofs
+    or
+        archive:      zip with applications.json and the proof files it names
+
+    Returns 207 with one result per application, in order:
+        {"index": 0, "status": "created", "id": 812, "application_number": 4000101}
+        {"index": 1, "status": "invalid", "errors": {...}}
+    Applications are validated like single submissions; valid ones are
+    created even when others in the batch are not.
+    """
+    parser_classes = [MultiPartParser, FormParser]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        try:
+            if 'archive' in request.FILES:
+                rows = read_zip(request.FILES['archive'])
+            else:
+                rows = read_multipart(request.data, request.FILES)
+        except BatchError as e:
+            return Response(
+                {'message': 'Batch submission failed', 'errors': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = submit_batch(rows)
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response(
+            {
+                'message': f'{created} of {len(results)} application(s) submitted',
+                'results': results,
+            },
+            status=status.HTTP_207_MULTI_STATUS
+        )
+
+
+def application_pdf_bytes(application):
+    """Acknowledgement PDF of an application, base64 encoded for JSON responses"""
+    with pdf_render():
+        pdf = ApplicationPDFGenerator(application).create_pdf()
+    return base64.b64encode(pdf).decode('ascii')
+
+
 class ApplicationPDFGetter(APIView): 
     def post(self, request):
         """
@@ -122,8 +221,7 @@ class ApplicationPDFGetter(APIView):
 
         print('now genrate the pdf bytes')
         # genrate the pdf bytes and return the pdf 
-        pdf_genrator = application_pdf_generator(application)
-        pdf_bytes = pdf_genrator.create_pdf()
+        pdf_bytes = application_pdf_bytes(application)
         return Response(
             {
                 'message': 'Application retrieved successfully',
@@ -131,6 +229,116 @@ class ApplicationPDFGetter(APIView):
             },
             status=status.HTTP_200_OK
         )
-    
 
-        
\ No newline at end of file
+
+class ApplicationStatusView(APIView):
+    """
+    Status lookup for applicants.
+
+    POST /scheme/api/application/status/
+    Body: {
+        "scheme": 3,
+        "application_number": 4000012,
+        "mobile_number": "9876543210"
+    }
+
+    The lookup has no ORDER BY, so PostgreSQL can serve it with an
+    index-only scan of the idx_app_status_lookup covering index (SQLite's
+    planner prefers a one-row probe of the scheme/mobile unique index).
+    Results, including misses, are cached per key for
+    APPLICATION_STATUS_CACHE_SECONDS, so statuses can lag by that much.
+    """
+    STATUS_FIELDS = ('application_status', 'payment_status', 'lottery_status')
+    NOT_FOUND = 'not-found'
+
+    def post(self, request):
+        serializer = ApplicationStatusRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {"error": "Invalid input", "details": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        key = serializer.validated_data
+
+        cache_key = self.cache_key(key)
+        statuses = cache.get(cache_key)
+        if statuses is None:
+            statuses = next(iter(self.lookup(key)), None) or self.NOT_FOUND
+            cache.set(cache_key, statuses, self.cache_seconds())
+
+        if statuses == self.NOT_FOUND:
+            return Response(
+                {"error": "Application not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(self.payload(key, statuses), status=status.HTTP_200_OK)
+
+    @staticmethod
+    def cache_key(key):
+        return f"application:status:{key['scheme']}:{key['application_number']}:{key['mobile_number']}"
+
+    @staticmethod
+    def cache_seconds():
+        return getattr(settings, 'APPLICATION_STATUS_CACHE_SECONDS', 30)
+
+    @classmethod
+    def lookup(cls, key):
+        """
+        Statuses of the application matching a validated request, as a
+        values() queryset of at most one row.
+
+        Meta.ordering is cleared: sorting by submission date keeps the
+        planner off the covering index.
+        """
+        return Application.objects.filter(
+            scheme_id=key['scheme'],
+            application_number=key['application_number'],
+            mobile_number=key['mobile_number'],
+        ).order_by().values(*cls.STATUS_FIELDS)[:1]
+
+    @staticmethod
+    def payload(key, statuses):
+        return {
+            'application_number': key['application_number'],
+            'application_status': statuses['application_status'],
+            'application_status_display': Application.APPLICATION_STATUS_CHOICES(statuses['application_status']).label,
+            'payment_status': statuses['payment_status'],
+            'payment_status_display': Application.PAYMENT_STATUS_CHOICES(statuses['payment_status']).label,
+            'lottery_status': statuses['lottery_status'],
+            'lottery_status_display': Application.LOTTERY_STATUS_CHOICES(statuses['lottery_status']).label,
+        }
+
+
+class ResultsCursorPagination(CursorPagination):
+    """Keyset pagination on application_number; pages stay O(page_size) at any depth"""
+    ordering = 'application_number'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class ApplicationResultsView(generics.ListAPIView):
+    """
+    Published lottery results of a scheme (selected and waitlisted applications).
+
+    GET /scheme/api/schemes/<pk>/results/?cursor=<next cursor>
+
+    Only available once the scheme's lottery_result_date has passed.
+    """
+    serializer_class = ApplicationResultSerializer
+    pagination_class = ResultsCursorPagination
+
+    def get_queryset(self):
+        scheme = get_object_or_404(Scheme, pk=self.kwargs['pk'])
+        if not scheme.lottery_result_date or scheme.lottery_result_date > timezone.now():
+            raise NotFound("Lottery results have not been published yet")
+
+        return Application.objects.filter(
+            scheme=scheme,
+            lottery_status__in=[
+                Application.LOTTERY_STATUS_CHOICES.SELECTED,
+                Application.LOTTERY_STATUS_CHOICES.WAITLISTED,
+            ],
+        ).only(*ApplicationResultSerializer.Meta.fields)
+
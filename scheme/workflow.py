@@ -0,0 +1,281 @@
+"""
+Bulk status transitions for applications.
+
+A transition moves one status column to a new value, but only for rows that
+are in one of its allowed states. The allowed states are part of the UPDATE's
+WHERE clause, so rows that changed since they were selected are skipped
+rather than overwritten. Rows are processed in chunks of CHUNK_SIZE, each in
+its own transaction. Each chunk adjusts the per-scheme SchemeStatusCount
+rows and, in the same transaction, adds its counts to the run's
+StatusTransitionBatch and records the updated applications as
+StatusTransitionChunk rows, one per scheme.
+"""
+
+import base64
+import zlib
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Application, SchemeStatusCount, StatusTransitionBatch, StatusTransitionChunk
+
+
+CHUNK_SIZE = 1000
+
+APPLICATION_STATUS = Application.APPLICATION_STATUS_CHOICES
+PAYMENT_STATUS = Application.PAYMENT_STATUS_CHOICES
+
+
+class Transition:
+    """
+    A permitted status change.
+
+    Attributes:
+        name: Identifier used by admin actions and uploads
+        label: Human readable name
+        field: Status column that changes
+        to_value: New value
+        allowed_from: Values the column may have before the change
+        conditions: Extra filter kwargs a row must satisfy
+        requires_remark: Whether a remark must be given (stored as the
+            rejection remark)
+        also_set: Other columns the change resets
+    """
+
+    def __init__(self, name, label, field, to_value, allowed_from, conditions=None, requires_remark=False,
+                 also_set=None):
+        self.name = name
+        self.label = label
+        self.field = field
+        self.to_value = to_value
+        self.allowed_from = tuple(allowed_from)
+        self.conditions = conditions or {}
+        self.requires_remark = requires_remark
+        self.also_set = also_set or {}
+
+    def allowed(self):
+        """Filter kwargs for the rows this transition may change"""
+        return {f'{self.field}__in': self.allowed_from, **self.conditions}
+
+
+NOT_DRAWN = {'lottery_status': Application.LOTTERY_STATUS_CHOICES.NOT_CONDUCTED}
+
+TRANSITIONS = {
+    transition.name: transition for transition in (
+        Transition(
+            'verify_payment', 'Mark payment as verified', 'payment_status', PAYMENT_STATUS.VERIFIED,
+            allowed_from=(PAYMENT_STATUS.PENDING, PAYMENT_STATUS.FAILED), conditions=NOT_DRAWN,
+        ),
+        Transition(
+            'fail_payment', 'Mark payment as failed', 'payment_status', PAYMENT_STATUS.FAILED,
+            allowed_from=(PAYMENT_STATUS.PENDING,), conditions=NOT_DRAWN,
+        ),
+        Transition(
+            'accept', 'Mark application as accepted', 'application_status', APPLICATION_STATUS.ACCEPTED,
+            allowed_from=(APPLICATION_STATUS.PENDING, APPLICATION_STATUS.REJECTED), conditions=NOT_DRAWN,
+            also_set={'rejection_remark': ''},
+        ),
+        Transition(
+            'reject', 'Mark application as rejected', 'application_status', APPLICATION_STATUS.REJECTED,
+            allowed_from=(APPLICATION_STATUS.PENDING, APPLICATION_STATUS.ACCEPTED), conditions=NOT_DRAWN,
+            requires_remark=True,
+        ),
+    )
+}
+
+
+def pack_numbers(numbers):
+    """Compress sorted application numbers as zlib'd deltas in base64"""
+    if not numbers:
+        return ''
+    previous = 0
+    deltas = []
+    for number in sorted(numbers):
+        deltas.append(str(number - previous))
+        previous = number
+    return base64.b64encode(zlib.compress(','.join(deltas).encode(), 9)).decode()
+
+
+def unpack_numbers(packed):
+    """Inverse of pack_numbers"""
+    if not packed:
+        return []
+    numbers = []
+    total = 0
+    for delta in zlib.decompress(base64.b64decode(packed)).decode().split(','):
+        total += int(delta)
+        numbers.append(total)
+    return numbers
+
+
+def adjust_status_counts(deltas):
+    """
+    Apply count changes to SchemeStatusCount.
+
+    Args:
+        deltas: Mapping of (scheme_id, field, value) -> change
+    """
+    for (scheme_id, field, value), delta in deltas.items():
+        if not delta:
+            continue
+        updated = SchemeStatusCount.objects.filter(scheme_id=scheme_id, field=field, value=value).update(
+            count=F('count') + delta
+        )
+        # A missing row is only created for increments; decrements without a
+        # row happen when the scheme itself is being deleted
+        if not updated and delta > 0:
+            counter, created = SchemeStatusCount.objects.get_or_create(
+                scheme_id=scheme_id, field=field, value=value, defaults={'count': delta}
+            )
+            if not created:
+                SchemeStatusCount.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+
+
+def rebuild_status_counts(scheme_ids=None):
+    """
+    Recompute SchemeStatusCount from the applications table.
+
+    Args:
+        scheme_ids: Limit to these schemes (default: all)
+    """
+    applications = Application.objects.all()
+    counters = SchemeStatusCount.objects.all()
+    if scheme_ids is not None:
+        applications = applications.filter(scheme_id__in=scheme_ids)
+        counters = counters.filter(scheme_id__in=scheme_ids)
+
+    with transaction.atomic():
+        counters.delete()
+        rows = []
+        for field in Application.COUNTED_STATUS_FIELDS:
+            for row in applications.order_by().values('scheme_id', field).annotate(n=Count('id')):
+                rows.append(SchemeStatusCount(scheme_id=row['scheme_id'], field=field, value=row[field], count=row['n']))
+        SchemeStatusCount.objects.bulk_create(rows)
+    return len(rows)
+
+
+def chunked(iterable, size):
+    """Lists of up to ``size`` consecutive items"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def apply_transition(name, queryset=None, remark='', user=None, source='admin action', chunk_size=CHUNK_SIZE,
+                     pks=None):
+    """
+    Apply a transition to every application of a queryset.
+
+    Args:
+        name: Key of TRANSITIONS
+        queryset: Applications to change
+        pks: Primary keys to change, instead of a queryset (avoids one huge
+            ``pk__in`` when the caller already has the keys)
+        remark: Remark for the audit row (and rejection remark)
+        user: User performing the change
+        source: Where the request came from, for the audit row
+        chunk_size: Rows per UPDATE
+
+    Returns:
+        The StatusTransitionBatch audit row
+
+    Raises:
+        ValidationError: If the transition is unknown or needs a remark
+    """
+    transition = TRANSITIONS.get(name)
+    if transition is None:
+        raise ValidationError(f"Unknown transition {name}")
+    remark = remark.strip()
+    if transition.requires_remark and not remark:
+        raise ValidationError(f"{transition.label} requires a remark")
+
+    values = {transition.field: transition.to_value, **transition.also_set}
+    if transition.requires_remark:
+        values['rejection_remark'] = remark
+
+    batch = StatusTransitionBatch.objects.create(
+        transition=transition.name,
+        field=transition.field,
+        to_value=transition.to_value,
+        remark=remark,
+        source=source,
+        performed_by=user,
+    )
+    if pks is not None:
+        pks = sorted(pks)
+    else:
+        pks = queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    for chunk in chunked(pks, chunk_size):
+        with transaction.atomic():
+            rows = list(
+                Application.objects.select_for_update()
+                .filter(pk__in=chunk, **transition.allowed())
+                .values_list('pk', 'application_number', 'scheme_id', transition.field)
+            )
+            if rows:
+                Application.objects.filter(pk__in=[row[0] for row in rows], **transition.allowed()).update(
+                    updated_at=timezone.now(), **values
+                )
+
+            deltas = Counter()
+            numbers = defaultdict(list)
+            for _, application_number, scheme_id, old_value in rows:
+                deltas[(scheme_id, transition.field, old_value)] -= 1
+                deltas[(scheme_id, transition.field, transition.to_value)] += 1
+                numbers[scheme_id].append(application_number)
+            adjust_status_counts(deltas)
+
+            # The audit rows commit (or roll back) with the status changes
+            StatusTransitionChunk.objects.bulk_create(
+                StatusTransitionChunk(batch=batch, scheme_id=scheme_id, application_numbers=pack_numbers(scheme_numbers))
+                for scheme_id, scheme_numbers in numbers.items()
+            )
+            StatusTransitionBatch.objects.filter(pk=batch.pk).update(
+                requested=F('requested') + len(chunk),
+                updated=F('updated') + len(rows),
+                skipped=F('skipped') + len(chunk) - len(rows),
+            )
+
+    batch.refresh_from_db()
+    return batch
+
+
+def updated_numbers(batch):
+    """
+    Application numbers a StatusTransitionBatch changed.
+
+    Returns:
+        Mapping of scheme_id -> sorted application numbers (scheme_id is None
+        for batches recorded before chunks kept their scheme)
+    """
+    numbers = defaultdict(list)
+    for scheme_id, packed in batch.chunks.values_list('scheme_id', 'application_numbers'):
+        numbers[scheme_id].extend(unpack_numbers(packed))
+    return {scheme_id: sorted(scheme_numbers) for scheme_id, scheme_numbers in numbers.items()}
+
+
+def parse_application_numbers(text):
+    """
+    Application numbers from an uploaded file or pasted text.
+
+    Accepts numbers separated by commas, whitespace or new lines (a single
+    column CSV works); anything that is not a number is reported.
+
+    Returns:
+        Tuple of (set of numbers, list of invalid tokens)
+    """
+    numbers, invalid = set(), []
+    for token in text.replace(',', ' ').split():
+        if token.isdigit():
+            numbers.add(int(token))
+        else:
+            invalid.append(token)
+    return numbers, invalid
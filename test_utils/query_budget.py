@@ -0,0 +1,96 @@
+"""
+Query budgets for tests.
+
+``query_budget(n)`` is a context manager and decorator that fails when the
+block runs more than ``n`` SQL queries. The failure message groups the
+queries by shape (the SQL with its literals replaced by ``?``), most
+repeated first, so an N+1 shows up as one shape run once per row:
+
+    with query_budget(6):
+        self.client.get('/admin/scheme/application/')
+
+Budgets are upper bounds for a fixed number of rows; the tests that use them
+create more rows than one, so a per-row query breaks the budget.
+"""
+
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\?|%s)(?:, (?:\?|%s))*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+REPORTED_SHAPES = 10
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more queries than its budget"""
+
+
+def query_shape(sql):
+    """SQL with literals and IN lists folded, so repeats compare equal"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def repeated_shapes(queries):
+    """
+    Shapes run more than once, most repeated first.
+
+    Args:
+        queries: Dicts with a 'sql' key, as in connection.queries
+
+    Returns:
+        List of (count, shape)
+    """
+    counts = Counter(query_shape(query['sql']) for query in queries)
+    return sorted(((count, shape) for shape, count in counts.items() if count > 1), reverse=True)
+
+
+def budget_report(label, budget, queries):
+    lines = [f"{label} ran {len(queries)} queries, budget {budget}"]
+    repeated = repeated_shapes(queries)
+    if repeated:
+        lines.append("Repeated query shapes (likely N+1):")
+        lines.extend(f"  {count}x {shape}" for count, shape in repeated[:REPORTED_SHAPES])
+    lines.append("Queries:")
+    lines.extend(f"  {index}. {query['sql']}" for index, query in enumerate(queries, 1))
+    return '\n'.join(lines)
+
+
+class query_budget(ContextDecorator):
+    """
+    Fail a block that runs more than ``max_queries`` queries.
+
+    Args:
+        max_queries: Query budget
+        using: Database alias to watch
+        label: Name of the block in the failure message
+
+    Raises:
+        QueryBudgetExceeded: On exit, if the budget is exceeded
+    """
+
+    def __init__(self, max_queries, using=DEFAULT_DB_ALIAS, label='Block'):
+        self.max_queries = max_queries
+        self.using = using
+        self.label = label
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.context) > self.max_queries:
+            raise QueryBudgetExceeded(budget_report(self.label, self.max_queries, self.context.captured_queries))
+        return False